@@ -1,95 +1,230 @@
-import os
-import requests
-from flask import Flask, jsonify, request 
+import gzip
+from functools import wraps
+from flask import Flask, g, jsonify, make_response, request 
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from dotenv import load_dotenv
-from constants import STATE_FULL
 from database.queries import (
-    fetch_election_state, fetch_election_county, 
-    fetch_health_state, fetch_health_county, 
-    fetch_demographics_state, fetch_demographics_county,
-    fetch_education_state, fetch_education_county,
-    fetch_economy_state, fetch_economy_county
+    invalidate_rpc_cache, rpc_cache_stats, resolve_county_fips,
+    fetch_category_batch, state_fips_key, US_FIPS, DATA_BACKEND, RPCError
 )
+from database.local_engine import start_local_engine
+from functions.snapshot_store import brotli, get_snapshot, read_snapshot
+from functions.percentiles import percentiles_for
+from functions.geocode import geocode_lookup
+from functions.http_client import redact
+from functions.district_resolver import start_district_resolver
+from functions.state_legislators import start_state_legislators
 from functions.fec_finance import (
     fetch_fec_totals, fetch_fec_state_totals, 
     fetch_member_primary_committee,
-    fetch_fec_top_contributors, get_member_fec
+    fetch_fec_top_contributors, get_member_fec, legislators_loaded,
+    start_legislators_refresh, current_cycle
 )
+from payloads import (
+    CACHE_ADMIN_TOKEN, CATEGORY_TIMEOUT, FINANCE_TIMEOUT, MAX_BATCH_GEOGRAPHIES,
+    CENSUS_HTTP_MAX_AGE, CENSUS_HTTP_STALE, FEC_HTTP_MAX_AGE, FEC_HTTP_STALE, FEC_CLOSED_HTTP_MAX_AGE,
+    MEMBER_HTTP_MAX_AGE, GEOCODE_HTTP_MAX_AGE, COMPRESS_MIN_SIZE, COMPRESS_LEVEL, JSON_ENCODER, orjson,
+    LEGISLATORS_LOADING, VALID_CATEGORIES, executor, get_state_full_name, geography_levels, parse_row_filters,
+    build_state_payload, build_county_payload, county_fips_or_none, aggregate_fec_totals, encode_json, encoded_etag,
+    gather, is_fec_error, is_fec_failure
+)
+
+class PayloadJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes with payloads.encode_json(), the
+    serializer asgi.py and the snapshots use, so responses are the same bytes
+    whichever serves them. That is orjson when installed, several times faster
+    on the wide numeric rows the category endpoints return.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return encode_json(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        if JSON_ENCODER == "orjson" and orjson:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
 
-# Load environment variables from .env
-load_dotenv()
-GEOCODIO_KEY = os.getenv("GEOCODIO_KEY")
 
 app = Flask(__name__)
+app.json = PayloadJSONProvider(app)
 CORS(app)
 
-# Mapping of category names to fetch functions
-STATE_FETCHERS = {
-    "civics": fetch_election_state,  
-    "health": fetch_health_state,
-    "demographics": fetch_demographics_state,
-    "education": fetch_education_state,
-    "economy": fetch_economy_state
-}
+# Load the legislators snapshot now and keep it fresh in the background
+start_legislators_refresh()
+# Load local district boundaries and state legislators for offline reverse geocoding, if present
+start_district_resolver()
+start_state_legislators()
+# Load the in-process data tables when they replace Supabase
+if DATA_BACKEND == "local":
+    start_local_engine()
 
-COUNTY_FETCHERS = {
-    "civics": fetch_election_county,  
-    "health": fetch_health_county,
-    "demographics": fetch_demographics_county,
-    "education": fetch_education_county,
-    "economy": fetch_economy_county
-}
 
-VALID_CATEGORIES = ["civics", "health", "demographics", "education", "economy"]
+def snapshot_response(key: str):
+    """
+    Serve a precomputed payload from functions/build_snapshots.py, if one exists.
+    
+    Picks the best precompressed encoding the client accepts and answers
+    If-None-Match with 304. Returns None when there is no snapshot for key,
+    so the caller falls back to building the payload live.
+    """
+    entry = get_snapshot(key)
+    if not entry:
+        return None
+    
+    encoding = request.accept_encodings.best_match(entry["encodings"])
+    etag = encoded_etag(entry["hash"], encoding)
+    
+    matched = matching_etag(entry["hash"])
+    if matched:
+        response = app.response_class(status=304)
+        etag = matched
+    else:
+        body = read_snapshot(key, entry, encoding)
+        if body is None:
+            return None
+        response = app.response_class(body, mimetype="application/json")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    return response
 
 
-def get_state_full_name(state_abbr: str) -> str:
-    """Get full state name from abbreviation"""
-    return STATE_FULL.get(state_abbr, state_abbr)
+def matching_etag(etag: str):
+    """
+    Return the entity tag from If-None-Match that matches any encoding of
+    this body, or None. A client that cached the gzip copy revalidates
+    just as well as one holding the plain JSON.
+    """
+    for encoding in (None, "gzip", "br"):
+        tag = encoded_etag(etag, encoding)
+        if request.if_none_match.contains_weak(tag):
+            return tag
+    return None
 
 
-def fetch_category_data(category: str, geography_type: str, state_abbr: str, county: str = None):
+def http_cache(max_age, stale_while_revalidate=0, private=False):
     """
-    Fetch data for a specific category and geography.
+    Decorator adding HTTP caching to a GET route.
     
-    NOTE: Database structure quirk - state-level rows use the 'county' column 
-    to store the full state name (e.g., state=ME, county=Maine).
-    County-level rows use it normally (e.g., state=ME, county=Cumberland).
+    Successful responses get a strong ETag (a hash of the body, unless the
+    route already set one), Cache-Control with max-age and
+    stale-while-revalidate, and a 304 when If-None-Match matches. Responses
+    the view marked partial with mark_partial() are sent with no-store, so
+    neither browsers nor shared caches keep an outage response around.
+    Errors pass through untouched.
     
     Args:
-        category: Data category (health, demographics, etc.)
-        geography_type: "state" or "county"
-        state_abbr: State abbreviation (e.g., "ME")
-        county: County name (for county requests) or full state name (for state requests)
+        max_age: Seconds, or a callable returning (max_age, stale_while_revalidate)
+                 for routes whose lifetime depends on the request
+        stale_while_revalidate: Seconds a stale copy may be served while revalidating
+        private: Only let the browser cache it, not shared caches (for user input like addresses)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            # 304s from snapshot_response() still carry the caching headers
+            if response.status_code not in (200, 304):
+                return response
+            
+            if g.get("partial_response"):
+                response.cache_control.no_store = True
+                return response
+            
+            fresh, stale = max_age() if callable(max_age) else (max_age, stale_while_revalidate)
+            response.cache_control.max_age = fresh
+            if stale:
+                response.cache_control.stale_while_revalidate = stale
+            if private:
+                response.cache_control.private = True
+            else:
+                response.cache_control.public = True
+            
+            if response.status_code == 304:
+                return response
+            response.add_etag(overwrite=False)
+            matched = matching_etag(response.get_etag()[0])
+            if matched:
+                # Keep the Vary the 200 would carry (see compress_response), so shared caches key it the same way
+                if (response.content_length or 0) >= COMPRESS_MIN_SIZE:
+                    response.vary.add("Accept-Encoding")
+                response.status_code = 304
+                response.set_data(b"")
+                response.set_etag(matched)
+            return response
+        return wrapper
+    return decorator
+
+
+def mark_partial(errors):
+    """Flag the current response as partial (some upstream calls failed) so it isn't cached"""
+    if errors:
+        g.partial_response = True
+
+
+def fec_cache_lifetime():
+    """Current-cycle FEC data is short-lived; closed cycles no longer change"""
+    cycle = request.args.get("cycle", 2024, type=int)
+    if cycle < current_cycle():
+        return FEC_CLOSED_HTTP_MAX_AGE, FEC_CLOSED_HTTP_MAX_AGE
+    return FEC_HTTP_MAX_AGE, FEC_HTTP_STALE
+
+
+def fetch_top_contributors_for(fec_id: str, cycle: int):
+    """
+    Resolve an FEC id's principal committee, then fetch its top employers.
     
     Returns:
-        List of results or empty list on error
+        Dict with committee_id, cycle and top_contributors, None if either step
+        has no data, or the FEC error dict if either step failed
     """
-    fetchers = STATE_FETCHERS if geography_type == "state" else COUNTY_FETCHERS
-    fetch_func = fetchers.get(category)
-    
-    if not fetch_func:
-        return []
+    committee_id = fetch_member_primary_committee(fec_id, cycle)
+    if is_fec_failure(committee_id):
+        return committee_id
+    if is_fec_error(committee_id) or not committee_id:
+        return None
     
-    try:
-        state_full = get_state_full_name(state_abbr)
-        
-        if geography_type == "state":
-            # State-level queries need different params based on category
-            if category in ["civics"]:
-                results = fetch_func(state_abbr)
-            else:
-                results = fetch_func(state_abbr, state_full)
-        else:
-            # County-level queries
-            results = fetch_func(state_abbr, county)
-        
+    results = fetch_fec_top_contributors(committee_id, cycle)
+    if is_fec_error(results):
         return results
+    if not results:
+        return None
     
-    except Exception as e:
-        print(f"Error fetching {category} data: {e}")
-        return []
+    return {"committee_id": committee_id, "cycle": cycle, "top_contributors": results}
+
+
+@app.after_request
+def compress_response(response):
+    """
+    Compress large JSON responses with brotli or gzip, whichever the client
+    prefers (brotli only when the package is installed). Responses that are
+    already encoded, e.g. snapshots, are left alone.
+    """
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype != "application/json" or "Content-Encoding" in response.headers):
+        return response
+    if (response.content_length or 0) < COMPRESS_MIN_SIZE:
+        return response
+    
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(["br", "gzip"] if brotli else ["gzip"])
+    if not encoding:
+        return response
+    
+    body = response.get_data()
+    if encoding == "br":
+        response.set_data(brotli.compress(body, quality=min(COMPRESS_LEVEL, 11)))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0))
+    response.headers["Content-Encoding"] = encoding
+    
+    etag, _ = response.get_etag()
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding))
+    return response
 
 
 # ============================================
@@ -97,6 +232,7 @@ def fetch_category_data(category: str, geography_type: str, state_abbr: str, cou
 # ============================================
 
 @app.route("/api/state/<state_abbr>")
+@http_cache(CENSUS_HTTP_MAX_AGE, CENSUS_HTTP_STALE)
 def get_state_data(state_abbr):
     """
     Get state-level data for one or more categories.
@@ -104,11 +240,15 @@ def get_state_data(state_abbr):
     Query params:
         category: Specific category (health, demographics, etc.) or "all"
         categories: Comma-separated list (health,demographics,economy)
+        fields: Comma-separated columns to return, optionally category-qualified
+        years: Comma-separated years to return
+        since: Only return rows from this year on
     
     Examples:
         /api/state/ME?category=health
         /api/state/ME?category=all
         /api/state/ME?categories=health,demographics
+        /api/state/ME?category=economy&fields=year,unemployment_rate&since=2020
     """
     state_abbr = state_abbr.upper()
     
@@ -134,20 +274,24 @@ def get_state_data(state_abbr):
             "valid_categories": VALID_CATEGORIES
         }), 400
     
-    # Fetch data for each category
-    data = {}
-    for category in categories_to_fetch:
-        result = fetch_category_data(category, "state", state_abbr)
-        data[category] = result
+    filters, error = parse_row_filters(categories_to_fetch, request.args, ["state"])
+    if error:
+        return jsonify({"error": error}), 400
     
-    return jsonify({
-        "state": state_abbr,
-        "state_full": get_state_full_name(state_abbr),
-        "data": data
-    })
+    # Whole-state requests are served from the precomputed snapshot when there is one
+    if set(categories_to_fetch) == set(VALID_CATEGORIES) and not filters:
+        response = snapshot_response(f"state/{state_abbr}")
+        if response:
+            return response
+    
+    # Fetch all categories in parallel
+    payload = build_state_payload(state_abbr, categories_to_fetch, filters)
+    mark_partial(payload["errors"])
+    return jsonify(payload)
 
 
 @app.route("/api/county/<state_abbr>/<county>")
+@http_cache(CENSUS_HTTP_MAX_AGE, CENSUS_HTTP_STALE)
 def get_county_data(state_abbr, county):
     """
     Get county-level data for one or more categories.
@@ -155,11 +299,15 @@ def get_county_data(state_abbr, county):
     Query params:
         category: Specific category or "all"
         categories: Comma-separated list
+        fields: Comma-separated columns to return, optionally category-qualified
+        years: Comma-separated years to return
+        since: Only return rows from this year on
     
     Examples:
         /api/county/ME/York?category=health
         /api/county/ME/York?category=all
         /api/county/ME/York?categories=health,demographics
+        /api/county/ME/York?categories=health,economy&fields=year,health.premature_death,economy.gini_index&years=2023
     """
     state_abbr = state_abbr.upper()
     
@@ -185,23 +333,122 @@ def get_county_data(state_abbr, county):
             "valid_categories": VALID_CATEGORIES
         }), 400
     
-    # Fetch data for each category
-    data = {}
-    for category in categories_to_fetch:
-        result = fetch_category_data(category, "county", state_abbr, county)
-        data[category] = result
+    filters, error = parse_row_filters(categories_to_fetch, request.args, ["county"])
+    if error:
+        return jsonify({"error": error}), 400
+    
+    # Whole-county requests are served from the precomputed snapshot when there is one
+    if set(categories_to_fetch) == set(VALID_CATEGORIES) and not filters:
+        fips = county_fips_or_none(state_abbr, county)
+        response = snapshot_response(f"county/{fips}") if fips else None
+        if response:
+            return response
+    
+    # Fetch all categories in parallel
+    payload = build_county_payload(state_abbr, county, categories_to_fetch, filters)
+    mark_partial(payload["errors"])
+    return jsonify(payload)
+
+
+@app.route("/api/batch", methods=["POST"])
+def get_batch_data():
+    """
+    Get categories for many states and counties in one call.
+    
+    Each category is fetched with one set-based RPC covering every requested
+    place, instead of one RPC per place.
+    
+    JSON body:
+        geographies: List of {"state": "ME"} or {"state": "ME", "county": "York"}
+        categories: List of categories (default: all)
+    
+    Query params:
+        fields, years, since: Same as /api/state
+    
+    Returns:
+        results keyed by geography ("ME", "ME/York"), each with its data per
+        category; national rows once under "national"; places that couldn't be
+        resolved under "unknown"; and per-category "errors"
+    """
+    payload = request.get_json(silent=True) or {}
+    geographies = payload.get("geographies")
+    categories = payload.get("categories") or VALID_CATEGORIES
+    
+    if not isinstance(geographies, list) or not geographies:
+        return jsonify({"error": "No geographies provided"}), 400
+    if len(geographies) > MAX_BATCH_GEOGRAPHIES:
+        return jsonify({"error": f"At most {MAX_BATCH_GEOGRAPHIES} geographies per request"}), 400
+    invalid = [c for c in categories if c not in VALID_CATEGORIES]
+    if invalid:
+        return jsonify({
+            "error": f"Invalid categories: {', '.join(map(str, invalid))}",
+            "valid_categories": VALID_CATEGORIES
+        }), 400
+    filters, error = parse_row_filters(categories, request.args, geography_levels(geographies))
+    if error:
+        return jsonify({"error": error}), 400
+    
+    # Resolve every place to the county_fips its rows are stored under
+    results = {}
+    unknown = []
+    for geography in geographies:
+        if not isinstance(geography, dict):
+            return jsonify({"error": "Each geography must be an object with a state and optional county"}), 400
+        state_abbr = str(geography.get("state") or "").strip().upper()
+        county = geography.get("county")
+        key = f"{state_abbr}/{county}" if county else state_abbr
+        try:
+            fips = resolve_county_fips(state_abbr, county) if county else state_fips_key(state_abbr)
+        except RPCError as e:
+            return jsonify({"error": f"County lookup unavailable: {e}"}), 503
+        if fips is None:
+            unknown.append(key)
+            continue
+        results[key] = {
+            "state": state_abbr,
+            "state_full": get_state_full_name(state_abbr),
+            "county": county,
+            "county_fips": fips,
+            "data": {}
+        }
+    
+    county_codes = sorted({r["county_fips"] for r in results.values() if r["county"]})
+    state_codes = sorted({r["county_fips"] for r in results.values() if not r["county"]})
+    states = sorted({r["state"] for r in results.values() if not r["county"]})
+    
+    futures = {}
+    if results:
+        for category in categories:
+            category_filters = filters.get(category, {})
+            if category == "civics":
+                futures[category] = executor.submit(fetch_category_batch, category, county_codes, states, **category_filters)
+            else:
+                futures[category] = executor.submit(fetch_category_batch, category, county_codes + state_codes, **category_filters)
+    rows, errors = gather(futures, CATEGORY_TIMEOUT)
+    
+    for result in results.values():
+        for category in categories:
+            by_key = rows.get(category, {})
+            lookup = result["state"] if category == "civics" and not result["county"] else result["county_fips"]
+            result["data"][category] = by_key.get(lookup, [])
+        result["percentiles"] = percentiles_for(result["county_fips"], result["data"])
+    
+    national = {category: rows.get(category, {}).get(US_FIPS, []) for category in categories if category != "civics"}
     
     return jsonify({
-        "state": state_abbr,
-        "state_full": get_state_full_name(state_abbr),
-        "county": county,
-        "data": data
+        "results": results,
+        "national": national,
+        "unknown": unknown,
+        "errors": errors
     })
 
 
 # Endpoint to see if member has FEC data and to get fec ids
 @app.route("/api/member/<bio_id>")
+@http_cache(MEMBER_HTTP_MAX_AGE, MEMBER_HTTP_MAX_AGE)
 def api_member_fec_id(bio_id):
+    if not legislators_loaded():
+        return jsonify(LEGISLATORS_LOADING), 503
     fec_ids = get_member_fec(bio_id)
     return jsonify(fec_ids)
 
@@ -214,24 +461,9 @@ def api_member_fec():
     if not fec_ids:
         return jsonify({"error": "No FEC IDs provided"}), 400
     
-    out = {"by_fec_id": [], "aggregated": {"cash_on_hand": 0, "debts": 0, "receipts": 0, "disbursements": 0, "large_contributions": 0, "small_contributions": 0, 
-                                           "PAC_contributions": 0, "candidate_contributions": 0, "other_contributions": 0}}
-    for fid in fec_ids:
-        fid = fid.strip()
-        if not fid:
-            continue
-        res = fetch_fec_totals(fid, cycle)
-        out["by_fec_id"].append(res)
-        if "error" not in res:
-            out["aggregated"]["cash_on_hand"] += res["cash_on_hand"]
-            out["aggregated"]["debts"] += res["debts"]
-            out["aggregated"]["receipts"] += res["receipts"]
-            out["aggregated"]["disbursements"] += res["disbursements"]
-            out["aggregated"]["large_contributions"] += res["large_contributions"]
-            out["aggregated"]["small_contributions"] += res["small_contributions"]
-            out["aggregated"]["PAC_contributions"] += res["PAC_contributions"]
-            out["aggregated"]["candidate_contributions"] += res["candidate_contributions"]
-            out["aggregated"]["other_contributions"] += res["other_contributions"]
+    fec_ids = [fid.strip() for fid in fec_ids if fid.strip()]
+    # Fetch every id at once; map() yields results in input order
+    out = aggregate_fec_totals(executor.map(lambda fid: fetch_fec_totals(fid, cycle), fec_ids))
     
     return jsonify(out)
 
@@ -252,7 +484,7 @@ def api_member_fec_state_top5():
 
         results = fetch_fec_state_totals(fid, cycle)
 
-        if isinstance(results, dict) and "error" in results:
+        if is_fec_error(results):
             continue
         if not results:
             continue
@@ -276,115 +508,115 @@ def api_top_contributors():
         if not fid:
             continue
         
-        committee_id = fetch_member_primary_committee(fid, cycle)
-       
-        if isinstance(committee_id, dict) and "error" in committee_id:
-            continue
-        if not committee_id:
-            continue
-        
-        results = fetch_fec_top_contributors(committee_id, cycle)
-        
-        if isinstance(results, dict) and "error" in results:
-            continue
-        if not results:
-            continue
-        
-        return jsonify({"committee_id": committee_id, "cycle": cycle, "top_contributors": results})
+        result = fetch_top_contributors_for(fid, cycle)
+        if result and not is_fec_error(result):
+            return jsonify(result)
 
     return jsonify({"error": "No valid FEC results found for provided IDs"}), 404
 
+# Endpoint to return totals, top states and top contributors for a member in one call
+@app.route("/api/member/<bio_id>/finance")
+@http_cache(fec_cache_lifetime)
+def api_member_finance(bio_id):
+    """
+    Get all campaign finance data for a member in one round trip.
+    
+    Looks up the member's FEC ids once, then fetches totals, state breakdown
+    and principal committee + employer breakdown for every id concurrently.
+    Sections that fail or time out are null and explained in "errors".
+    
+    Query params:
+        cycle: Election cycle (default 2024)
+    
+    Examples:
+        /api/member/C001035/finance
+        /api/member/C001035/finance?cycle=2022
+    """
+    cycle = request.args.get("cycle", 2024, type=int)
+    if not legislators_loaded():
+        return jsonify(LEGISLATORS_LOADING), 503
+    fec_ids = get_member_fec(bio_id)
+    out = {"bio_id": bio_id, "cycle": cycle, "fec_ids": fec_ids,
+           "totals": None, "state_totals": None, "top_contributors": None, "errors": {}}
+    if not fec_ids:
+        return jsonify(out)
+    
+    futures = {}
+    for fid in fec_ids:
+        futures[("totals", fid)] = executor.submit(fetch_fec_totals, fid, cycle)
+        futures[("state_totals", fid)] = executor.submit(fetch_fec_state_totals, fid, cycle)
+        futures[("top_contributors", fid)] = executor.submit(fetch_top_contributors_for, fid, cycle)
+    results, errors = gather(futures, FINANCE_TIMEOUT)
+    out["errors"] = {f"{section}:{fid}": error for (section, fid), error in errors.items()}
+    out["errors"].update({f"{section}:{fid}": result["error"] for (section, fid), result in results.items()
+                          if is_fec_error(result)})
+    # Timeouts and upstream failures may succeed on the next try; "no data" below is a real answer
+    mark_partial(out["errors"])
+    
+    out["totals"] = aggregate_fec_totals([results[("totals", fid)] for fid in fec_ids if ("totals", fid) in results])
+    
+    # Same precedence as the single-purpose endpoints: first id with data wins
+    for fid in fec_ids:
+        state_totals = results.get(("state_totals", fid))
+        if state_totals and not is_fec_error(state_totals):
+            out["state_totals"] = {"fec_id": fid, "cycle": cycle, "state_totals": state_totals}
+            break
+    else:
+        out["errors"]["state_totals"] = "No valid FEC results found for provided IDs"
+    
+    for fid in fec_ids:
+        top_contributors = results.get(("top_contributors", fid))
+        if top_contributors and not is_fec_error(top_contributors):
+            out["top_contributors"] = top_contributors
+            break
+    else:
+        out["errors"]["top_contributors"] = "No valid FEC results found for provided IDs"
+    
+    return jsonify(out)
+
 @app.route("/api/geocode")
+@http_cache(GEOCODE_HTTP_MAX_AGE, private=True)
 def geocode():
-    """Geocode address/ZIP or reverse geocode lat/lng using Geocodio"""
+    """Geocode address/ZIP or reverse geocode lat/lng using Geocodio (cached, see functions/geocode.py)"""
     query = request.args.get("q")
     lat = request.args.get("lat")
     lng = request.args.get("lng")
     
     if not query and not (lat and lng):
         return jsonify({"error": "Missing query or lat/lng parameters"}), 400
+    if not query:
+        try:
+            lat, lng = float(lat), float(lng)
+        except ValueError:
+            return jsonify({"error": "lat and lng must be numbers"}), 400
     
     try:
-        if query:
-            url = f"https://api.geocod.io/v1.9/geocode?q={query}&fields=cd,stateleg,school&api_key={GEOCODIO_KEY}"
-        else:
-            url = f"https://api.geocod.io/v1.9/reverse?q={lat},{lng}&fields=cd,stateleg,school&api_key={GEOCODIO_KEY}"
-        
-        resp = requests.get(url, timeout=10)
-        data = resp.json()
-        
-        if data.get("results"):
-            result = data["results"][0]
-            location = result["location"]
-            components = result["address_components"]
-            cd_fields = result.get("fields", {}).get("congressional_districts", [])
-            state_house_fields = result.get("fields", {}).get("state_legislative_districts", {}).get("house", [])
-            state_senate_fields = result.get("fields", {}).get("state_legislative_districts", {}).get("senate", [])
-            sd_fields = result.get("fields", {}).get("school_districts", {}).get("unified", {})
-            
-            fed_legislators = []
-            if cd_fields:
-                for leg in cd_fields[0].get("current_legislators", []):
-                    fed_legislators.append({
-                        "name": f"{leg['bio']['first_name']} {leg['bio']['last_name']}",
-                        "role": "sen" if leg["type"] == "senator" else "rep",
-                        "party": leg["bio"]["party"],
-                        "bio_id": leg["references"]["bioguide_id"],
-                        "photo_url": leg["bio"]["photo_url"],
-                        "district": cd_fields[0].get("district_number") if leg["type"] == "representative" else None,
-                        "phone": leg["contact"]["phone"],
-                        "website": leg["contact"]["url"]
-                    })
-            state_house_legislators = []
-            if state_house_fields:
-                for leg in state_house_fields[0].get("current_legislators", []):
-                    state_house_legislators.append({
-                        "name": f"{leg['bio']['first_name']} {leg['bio']['last_name']}",
-                        "role": "rep" if leg["type"] == "representative" else "tribal_rep",
-                        "party": leg["bio"]["party"],
-                        "openstates_id": leg["references"]["openstates_id"],
-                        "photo_url": leg["bio"]["photo_url"],
-                        "district": state_house_fields[0].get("name"),
-                        "phone": leg["contact"]["phone"],
-                        "email": leg["contact"].get("email"),
-                        "website": leg["contact"]["url"]
-                    })
-
-            state_senate_legislators = []
-            if state_senate_fields:
-                for leg in state_senate_fields[0].get("current_legislators", []):
-                    state_senate_legislators.append({
-                        "name": f"{leg['bio']['first_name']} {leg['bio']['last_name']}",
-                        "role": "sen" if leg["type"] == "senator" else "unknown",
-                        "party": leg["bio"]["party"],
-                        "openstates_id": leg["references"]["openstates_id"],
-                        "photo_url": leg["bio"]["photo_url"],
-                        "district": state_senate_fields[0].get("name"),
-                        "phone": leg["contact"]["phone"],
-                        "email": leg["contact"].get("email"),
-                        "website": leg["contact"]["url"]
-                    })
-            
-            return jsonify({
-                "lat": location["lat"],
-                "lng": location["lng"],
-                "state": components["state"],
-                "state_full": STATE_FULL.get(components["state"], components["state"]),
-                "zip": components.get("zip"),
-                "county": components.get("county"),
-                "city": components.get("city"),
-                "fed_legislators": fed_legislators,
-                "state_house_legislators": state_house_legislators,
-                "state_senate_legislators": state_senate_legislators,
-                "school_district": sd_fields.get("name") if sd_fields else None
-            })
+        result = geocode_lookup(query=query, lat=lat, lng=lng)
+        if result:
+            return jsonify(result)
         
         return jsonify({"error": "No results found"}), 404
     except Exception as e:
-        print(f"Error in /api/geocode: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+        # Geocodio errors carry the request URL, api_key included
+        print(f"Error in /api/geocode: {redact(e)}")
+        return jsonify({"error": "Geocoding failed"}), 500
+
+@app.route("/api/cache/invalidate", methods=["POST"])
+def invalidate_cache():
+    """
+    Drop cached Supabase RPC results after a data upload.
+    
+    Requires the X-Cache-Token header to match CACHE_ADMIN_TOKEN.
+    
+    JSON body (optional):
+        function: Only invalidate results for this RPC (e.g. "fetch_health_county")
+    """
+    if not CACHE_ADMIN_TOKEN or request.headers.get("X-Cache-Token") != CACHE_ADMIN_TOKEN:
+        return jsonify({"error": "Unauthorized"}), 403
+    
+    payload = request.get_json(silent=True) or {}
+    removed = invalidate_rpc_cache(payload.get("function"))
+    return jsonify({"removed": removed, "stats": rpc_cache_stats()})
 
 if __name__ == "__main__":
     app.run(debug=True, port=5002)
@@ -0,0 +1,545 @@
+"""
+Async (ASGI) serving path for the API in app.py.
+
+Same routes, parameters and responses as the Flask app, but every upstream
+call (Supabase RPCs, FEC, Geocodio) is awaited on an async client instead of
+holding a thread, so one worker keeps hundreds of them in flight. Work that
+blocks (SQLite cache reads, the legislators snapshot, local data files) runs
+in a worker thread. Configuration and query parsing come from payloads.py;
+caches, snapshots and percentiles are shared with app.py.
+
+Run from the backend directory:
+
+    uvicorn asgi:app --port 5002 --workers 4
+"""
+import asyncio
+import gzip
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
+from werkzeug.http import generate_etag, parse_accept_header, parse_etags, quote_etag
+from database.local_engine import start_local_engine
+from database.queries import (
+    fetch_state_category_async, fetch_county_category_async, fetch_category_batch_async,
+    resolve_county_fips_async, county_name, invalidate_rpc_cache, rpc_cache_stats, state_fips_key, US_FIPS,
+    RPCError, DATA_BACKEND
+)
+from functions import http_client
+from functions.district_resolver import start_district_resolver
+from functions.state_legislators import start_state_legislators
+from functions.fec_finance import (
+    fetch_fec_totals_async, fetch_fec_state_totals_async,
+    fetch_member_primary_committee_async, fetch_fec_top_contributors_async,
+    get_member_fec, legislators_loaded, start_legislators_refresh, current_cycle
+)
+from functions.geocode import geocode_lookup_async
+from functions.percentiles import percentiles_for
+from functions.snapshot_store import brotli, get_snapshot, read_snapshot
+from payloads import (
+    CACHE_ADMIN_TOKEN, CATEGORY_TIMEOUT, FINANCE_TIMEOUT, MAX_BATCH_GEOGRAPHIES,
+    CENSUS_HTTP_MAX_AGE, CENSUS_HTTP_STALE, FEC_HTTP_MAX_AGE, FEC_HTTP_STALE, FEC_CLOSED_HTTP_MAX_AGE,
+    MEMBER_HTTP_MAX_AGE, GEOCODE_HTTP_MAX_AGE, COMPRESS_MIN_SIZE, COMPRESS_LEVEL,
+    LEGISLATORS_LOADING, VALID_CATEGORIES, get_state_full_name, geography_levels, parse_row_filters,
+    aggregate_fec_totals, encode_json, encoded_etag, is_fec_error, is_fec_failure
+)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # The same background loaders app.py starts at import
+    start_legislators_refresh()
+    start_district_resolver()
+    start_state_legislators()
+    if DATA_BACKEND == "local":
+        start_local_engine()
+    yield
+    await http_client.aclose()
+
+
+app = FastAPI(title="District Insights API", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+## Responses
+# Same bytes, ETags, Cache-Control and compression as the Flask app
+
+def _accepted_encoding(request: Request, offered):
+    return parse_accept_header(request.headers.get("accept-encoding")).best_match(offered)
+
+
+def _matching_etag(request: Request, etag: str):
+    """Entity tag from If-None-Match that matches any encoding of this body, or None"""
+    if_none_match = parse_etags(request.headers.get("if-none-match"))
+    for encoding in (None, "gzip", "br"):
+        tag = encoded_etag(etag, encoding)
+        if if_none_match.contains_weak(tag):
+            return tag
+    return None
+
+
+def _cache_control(max_age: int, stale: int = 0, private: bool = False) -> str:
+    directives = ["private" if private else "public", f"max-age={max_age}"]
+    if stale:
+        directives.append(f"stale-while-revalidate={stale}")
+    return ", ".join(directives)
+
+
+def respond(request: Request, payload, status_code: int = 200, cache=None, partial: bool = False) -> Response:
+    """
+    Encode payload as a JSON response.
+
+    Successful responses with cache=(max_age, stale_while_revalidate, private)
+    get Cache-Control, a strong ETag and a 304 when If-None-Match matches, like
+    http_cache() in app.py; partial ones get no-store. Large bodies are compressed like compress_response().
+    """
+    # Trailing newline like jsonify, so the bytes and ETag match app.py and the snapshots
+    body = encode_json(payload) + b"\n"
+    headers = {}
+    if status_code != 200:
+        return Response(body, status_code=status_code, media_type="application/json")
+
+    compress = len(body) >= COMPRESS_MIN_SIZE
+    if compress:
+        # Also on the 304, so shared caches key the revalidated entry the same way
+        headers["Vary"] = "Accept-Encoding"
+
+    etag = None
+    if cache and partial:
+        # Partial (some upstream calls failed): never store it, so the next request retries
+        headers["Cache-Control"] = "no-store"
+    elif cache:
+        max_age, stale, private = cache
+        headers["Cache-Control"] = _cache_control(max_age, stale, private)
+        etag = generate_etag(body)
+        matched = _matching_etag(request, etag)
+        if matched:
+            headers["ETag"] = quote_etag(matched)
+            return Response(status_code=304, headers=headers)
+
+    if compress:
+        encoding = _accepted_encoding(request, ["br", "gzip"] if brotli else ["gzip"])
+        if encoding == "br":
+            body = brotli.compress(body, quality=min(COMPRESS_LEVEL, 11))
+        elif encoding == "gzip":
+            body = gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            etag = encoded_etag(etag, encoding) if etag else None
+
+    if etag:
+        headers["ETag"] = quote_etag(etag)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+async def snapshot_response(request: Request, key: str):
+    """Serve a precomputed payload (see snapshot_response() in app.py), or None if there isn't one"""
+    # The manifest and blob reads are file I/O, so they run in worker threads
+    entry = await asyncio.to_thread(get_snapshot, key)
+    if not entry:
+        return None
+
+    encoding = _accepted_encoding(request, entry["encodings"])
+    headers = {
+        "Cache-Control": _cache_control(CENSUS_HTTP_MAX_AGE, CENSUS_HTTP_STALE),
+        "Vary": "Accept-Encoding"
+    }
+    matched = _matching_etag(request, entry["hash"])
+    if matched:
+        headers["ETag"] = quote_etag(matched)
+        return Response(status_code=304, headers=headers)
+
+    body = await asyncio.to_thread(read_snapshot, key, entry, encoding)
+    if body is None:
+        return None
+    headers["ETag"] = quote_etag(encoded_etag(entry["hash"], encoding))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+## Fetching
+
+async def gather_async(coroutines: dict, timeout: float):
+    """
+    Run a dict of coroutines concurrently with one shared deadline, like payloads.gather().
+
+    Returns:
+        Tuple of (results dict, errors dict), both keyed like coroutines
+    """
+    tasks = {key: asyncio.ensure_future(coroutine) for key, coroutine in coroutines.items()}
+    if tasks:
+        await asyncio.wait(tasks.values(), timeout=timeout)
+
+    results = {}
+    errors = {}
+    for key, task in tasks.items():
+        if not task.done():
+            task.cancel()
+            print(f"Timed out fetching {key} after {timeout}s")
+            errors[key] = "timeout"
+        elif task.exception() is not None:
+            print(f"Error fetching {key}: {task.exception()}")
+            errors[key] = str(task.exception())
+        else:
+            results[key] = task.result()
+    return results, errors
+
+
+async def fetch_categories_async(categories, geography_type: str, state_abbr: str, county: str = None,
+                                 filters: dict = None):
+    """Fetch several categories concurrently, each within CATEGORY_TIMEOUT (see fetch_categories)"""
+    filters = filters or {}
+    state_full = get_state_full_name(state_abbr)
+    coroutines = {}
+    for category in categories:
+        category_filters = filters.get(category) or {}
+        if geography_type == "state":
+            coroutines[category] = fetch_state_category_async(category, state_abbr, state_full, **category_filters)
+        else:
+            coroutines[category] = fetch_county_category_async(category, state_abbr, county, **category_filters)
+    results, errors = await gather_async(coroutines, CATEGORY_TIMEOUT)
+    data = {category: results.get(category, []) for category in categories}
+    return data, errors
+
+
+async def county_fips_or_none_async(state_abbr: str, county: str):
+    """resolve_county_fips_async(), or None while the county lookup can't be loaded"""
+    try:
+        return await resolve_county_fips_async(state_abbr, county)
+    except RPCError:
+        return None
+
+
+async def build_state_payload_async(state_abbr: str, categories, filters: dict = None):
+    data, errors = await fetch_categories_async(categories, "state", state_abbr, filters=filters)
+    return {
+        "state": state_abbr,
+        "state_full": get_state_full_name(state_abbr),
+        "data": data,
+        "percentiles": await asyncio.to_thread(percentiles_for, state_fips_key(state_abbr), data),
+        "errors": errors
+    }
+
+
+async def build_county_payload_async(state_abbr: str, county: str, categories, filters: dict = None):
+    data, errors = await fetch_categories_async(categories, "county", state_abbr, county, filters)
+    fips = await county_fips_or_none_async(state_abbr, county)
+    return {
+        "state": state_abbr,
+        "state_full": get_state_full_name(state_abbr),
+        "county": county_name(fips) or county,
+        "data": data,
+        "percentiles": await asyncio.to_thread(percentiles_for, fips, data),
+        "errors": errors
+    }
+
+
+def requested_categories(args):
+    """category= / categories= query params -> (categories, error response body)"""
+    single_category = args.get("category")
+    multiple_categories = args.get("categories")
+    if not single_category and not multiple_categories or single_category == "all":
+        categories = VALID_CATEGORIES
+    elif multiple_categories:
+        categories = [c.strip() for c in multiple_categories.split(",")]
+    else:
+        categories = [single_category]
+
+    invalid = [c for c in categories if c not in VALID_CATEGORIES]
+    if invalid:
+        return None, {"error": f"Invalid categories: {', '.join(map(str, invalid))}", "valid_categories": VALID_CATEGORIES}
+    return categories, None
+
+
+async def fetch_top_contributors_for_async(fec_id: str, cycle: int):
+    """Async fetch_top_contributors_for() from app.py"""
+    committee_id = await fetch_member_primary_committee_async(fec_id, cycle)
+    if is_fec_failure(committee_id):
+        return committee_id
+    if is_fec_error(committee_id) or not committee_id:
+        return None
+
+    results = await fetch_fec_top_contributors_async(committee_id, cycle)
+    if is_fec_error(results):
+        return results
+    if not results:
+        return None
+
+    return {"committee_id": committee_id, "cycle": cycle, "top_contributors": results}
+
+
+async def _json_body(request: Request) -> dict:
+    try:
+        payload = await request.json()
+    except ValueError:
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+def _cycle(request: Request) -> int:
+    try:
+        return int(request.query_params.get("cycle", 2024))
+    except ValueError:
+        return 2024
+
+
+# ============================================
+# RESTFUL ENDPOINTS (see app.py for parameters)
+# ============================================
+
+@app.get("/api/state/{state_abbr}")
+async def get_state_data(state_abbr: str, request: Request):
+    state_abbr = state_abbr.upper()
+    categories, error = requested_categories(request.query_params)
+    if error:
+        return respond(request, error, 400)
+    filters, error = parse_row_filters(categories, request.query_params, ["state"])
+    if error:
+        return respond(request, {"error": error}, 400)
+
+    if set(categories) == set(VALID_CATEGORIES) and not filters:
+        response = await snapshot_response(request, f"state/{state_abbr}")
+        if response:
+            return response
+
+    payload = await build_state_payload_async(state_abbr, categories, filters)
+    return respond(request, payload, cache=(CENSUS_HTTP_MAX_AGE, CENSUS_HTTP_STALE, False), partial=bool(payload["errors"]))
+
+
+@app.get("/api/county/{state_abbr}/{county}")
+async def get_county_data(state_abbr: str, county: str, request: Request):
+    state_abbr = state_abbr.upper()
+    categories, error = requested_categories(request.query_params)
+    if error:
+        return respond(request, error, 400)
+    filters, error = parse_row_filters(categories, request.query_params, ["county"])
+    if error:
+        return respond(request, {"error": error}, 400)
+
+    if set(categories) == set(VALID_CATEGORIES) and not filters:
+        fips = await county_fips_or_none_async(state_abbr, county)
+        response = await snapshot_response(request, f"county/{fips}") if fips else None
+        if response:
+            return response
+
+    payload = await build_county_payload_async(state_abbr, county, categories, filters)
+    return respond(request, payload, cache=(CENSUS_HTTP_MAX_AGE, CENSUS_HTTP_STALE, False), partial=bool(payload["errors"]))
+
+
+@app.post("/api/batch")
+async def get_batch_data(request: Request):
+    payload = await _json_body(request)
+    geographies = payload.get("geographies")
+    categories = payload.get("categories") or VALID_CATEGORIES
+
+    if not isinstance(geographies, list) or not geographies:
+        return respond(request, {"error": "No geographies provided"}, 400)
+    if len(geographies) > MAX_BATCH_GEOGRAPHIES:
+        return respond(request, {"error": f"At most {MAX_BATCH_GEOGRAPHIES} geographies per request"}, 400)
+    invalid = [c for c in categories if c not in VALID_CATEGORIES]
+    if invalid:
+        return respond(request, {"error": f"Invalid categories: {', '.join(map(str, invalid))}",
+                                 "valid_categories": VALID_CATEGORIES}, 400)
+    filters, error = parse_row_filters(categories, request.query_params, geography_levels(geographies))
+    if error:
+        return respond(request, {"error": error}, 400)
+
+    results = {}
+    unknown = []
+    for geography in geographies:
+        if not isinstance(geography, dict):
+            return respond(request, {"error": "Each geography must be an object with a state and optional county"}, 400)
+        state_abbr = str(geography.get("state") or "").strip().upper()
+        county = geography.get("county")
+        key = f"{state_abbr}/{county}" if county else state_abbr
+        try:
+            fips = await resolve_county_fips_async(state_abbr, county) if county else state_fips_key(state_abbr)
+        except RPCError as e:
+            return respond(request, {"error": f"County lookup unavailable: {e}"}, 503)
+        if fips is None:
+            unknown.append(key)
+            continue
+        results[key] = {
+            "state": state_abbr,
+            "state_full": get_state_full_name(state_abbr),
+            "county": county,
+            "county_fips": fips,
+            "data": {}
+        }
+
+    county_codes = sorted({r["county_fips"] for r in results.values() if r["county"]})
+    state_codes = sorted({r["county_fips"] for r in results.values() if not r["county"]})
+    states = sorted({r["state"] for r in results.values() if not r["county"]})
+
+    coroutines = {}
+    if results:
+        for category in categories:
+            category_filters = filters.get(category, {})
+            if category == "civics":
+                coroutines[category] = fetch_category_batch_async(category, county_codes, states, **category_filters)
+            else:
+                coroutines[category] = fetch_category_batch_async(category, county_codes + state_codes, **category_filters)
+    rows, errors = await gather_async(coroutines, CATEGORY_TIMEOUT)
+
+    for result in results.values():
+        for category in categories:
+            by_key = rows.get(category, {})
+            lookup = result["state"] if category == "civics" and not result["county"] else result["county_fips"]
+            result["data"][category] = by_key.get(lookup, [])
+
+    def rank_all():
+        # The ranks are read from the percentiles file, so they're looked up together in one worker thread
+        for result in results.values():
+            result["percentiles"] = percentiles_for(result["county_fips"], result["data"])
+    await asyncio.to_thread(rank_all)
+
+    national = {category: rows.get(category, {}).get(US_FIPS, []) for category in categories if category != "civics"}
+    return respond(request, {"results": results, "national": national, "unknown": unknown, "errors": errors})
+
+
+@app.get("/api/member/{bio_id}")
+async def api_member_fec_id(bio_id: str, request: Request):
+    if not legislators_loaded():
+        return respond(request, LEGISLATORS_LOADING, 503)
+    fec_ids = await asyncio.to_thread(get_member_fec, bio_id)
+    return respond(request, fec_ids, cache=(MEMBER_HTTP_MAX_AGE, MEMBER_HTTP_MAX_AGE, False))
+
+
+@app.post("/api/member/fec_totals")
+async def api_member_fec(request: Request):
+    payload = await _json_body(request)
+    fec_ids = payload.get("fec_ids", [])
+    cycle = payload.get("cycle", 2024)
+    if not fec_ids:
+        return respond(request, {"error": "No FEC IDs provided"}, 400)
+
+    fec_ids = [fid.strip() for fid in fec_ids if fid.strip()]
+    results = await asyncio.gather(*(fetch_fec_totals_async(fid, cycle) for fid in fec_ids))
+    return respond(request, aggregate_fec_totals(results))
+
+
+@app.post("/api/member/fec_state_top5")
+async def api_member_fec_state_top5(request: Request):
+    payload = await _json_body(request)
+    fec_ids = payload.get("fec_ids", [])
+    cycle = payload.get("cycle", 2024)
+    if not fec_ids:
+        return respond(request, {"error": "No FEC IDs provided"}, 400)
+
+    for fid in fec_ids:
+        fid = fid.strip()
+        if not fid:
+            continue
+        results = await fetch_fec_state_totals_async(fid, cycle)
+        if is_fec_error(results) or not results:
+            continue
+        return respond(request, {"fec_id": fid, "cycle": cycle, "state_totals": results})
+
+    return respond(request, {"error": "No valid FEC results found for provided IDs"}, 404)
+
+
+@app.post("/api/member/top_contributors")
+async def api_top_contributors(request: Request):
+    payload = await _json_body(request)
+    fec_ids = payload.get("fec_ids", [])
+    cycle = payload.get("cycle", 2024)
+    if not fec_ids:
+        return respond(request, {"error": "No FEC IDs provided"}, 400)
+
+    for fid in fec_ids:
+        fid = fid.strip()
+        if not fid:
+            continue
+        result = await fetch_top_contributors_for_async(fid, cycle)
+        if result and not is_fec_error(result):
+            return respond(request, result)
+
+    return respond(request, {"error": "No valid FEC results found for provided IDs"}, 404)
+
+
+@app.get("/api/member/{bio_id}/finance")
+async def api_member_finance(bio_id: str, request: Request):
+    cycle = _cycle(request)
+    if cycle < current_cycle():
+        lifetime = (FEC_CLOSED_HTTP_MAX_AGE, FEC_CLOSED_HTTP_MAX_AGE, False)
+    else:
+        lifetime = (FEC_HTTP_MAX_AGE, FEC_HTTP_STALE, False)
+
+    if not legislators_loaded():
+        return respond(request, LEGISLATORS_LOADING, 503)
+    fec_ids = await asyncio.to_thread(get_member_fec, bio_id)
+    out = {"bio_id": bio_id, "cycle": cycle, "fec_ids": fec_ids,
+           "totals": None, "state_totals": None, "top_contributors": None, "errors": {}}
+    if not fec_ids:
+        return respond(request, out, cache=lifetime)
+
+    coroutines = {}
+    for fid in fec_ids:
+        coroutines[("totals", fid)] = fetch_fec_totals_async(fid, cycle)
+        coroutines[("state_totals", fid)] = fetch_fec_state_totals_async(fid, cycle)
+        coroutines[("top_contributors", fid)] = fetch_top_contributors_for_async(fid, cycle)
+    results, errors = await gather_async(coroutines, FINANCE_TIMEOUT)
+    out["errors"] = {f"{section}:{fid}": error for (section, fid), error in errors.items()}
+    out["errors"].update({f"{section}:{fid}": result["error"] for (section, fid), result in results.items()
+                          if is_fec_error(result)})
+    partial = bool(out["errors"])
+
+    out["totals"] = aggregate_fec_totals([results[("totals", fid)] for fid in fec_ids if ("totals", fid) in results])
+
+    for fid in fec_ids:
+        state_totals = results.get(("state_totals", fid))
+        if state_totals and not is_fec_error(state_totals):
+            out["state_totals"] = {"fec_id": fid, "cycle": cycle, "state_totals": state_totals}
+            break
+    else:
+        out["errors"]["state_totals"] = "No valid FEC results found for provided IDs"
+
+    for fid in fec_ids:
+        top_contributors = results.get(("top_contributors", fid))
+        if top_contributors and not is_fec_error(top_contributors):
+            out["top_contributors"] = top_contributors
+            break
+    else:
+        out["errors"]["top_contributors"] = "No valid FEC results found for provided IDs"
+
+    return respond(request, out, cache=lifetime, partial=partial)
+
+
+@app.get("/api/geocode")
+async def geocode(request: Request):
+    query = request.query_params.get("q")
+    lat = request.query_params.get("lat")
+    lng = request.query_params.get("lng")
+
+    if not query and not (lat and lng):
+        return respond(request, {"error": "Missing query or lat/lng parameters"}, 400)
+    if not query:
+        try:
+            lat, lng = float(lat), float(lng)
+        except ValueError:
+            return respond(request, {"error": "lat and lng must be numbers"}, 400)
+
+    try:
+        result = await geocode_lookup_async(query=query, lat=lat, lng=lng)
+        if result:
+            return respond(request, result, cache=(GEOCODE_HTTP_MAX_AGE, 0, True))
+        return respond(request, {"error": "No results found"}, 404)
+    except Exception as e:
+        # Geocodio errors carry the request URL, api_key included
+        print(f"Error in /api/geocode: {http_client.redact(e)}")
+        return respond(request, {"error": "Geocoding failed"}, 500)
+
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(request: Request):
+    if not CACHE_ADMIN_TOKEN or request.headers.get("X-Cache-Token") != CACHE_ADMIN_TOKEN:
+        return respond(request, {"error": "Unauthorized"}, 403)
+
+    payload = await _json_body(request)
+
+    def invalidate():
+        return invalidate_rpc_cache(payload.get("function")), rpc_cache_stats()
+    # Deletes from (and counts) the shared SQLite cache, and may reset the local engine: keep it off the event loop
+    removed, stats = await asyncio.to_thread(invalidate)
+    return respond(request, {"removed": removed, "stats": stats})
@@ -0,0 +1,457 @@
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from time import monotonic, sleep, time
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+# Which backend get_cache() builds: "memory" (per process) or "sqlite" (shared
+# by every worker on the host through one database file)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "cache.sqlite3"))
+# Seconds a worker may hold the fill lease for a key before others take over
+CACHE_LEASE_SECONDS = float(os.getenv("CACHE_LEASE_SECONDS", "30"))
+# Fraction of the TTL a SQLite entry's last-access time may lag before a hit
+# writes it again, so most reads stay read-only
+CACHE_TOUCH_FRACTION = float(os.getenv("CACHE_TOUCH_FRACTION", "0.1"))
+
+# Sentinel so callers can tell "not cached" apart from a cached None
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process cache with per-entry expiry and LRU eviction.
+
+    Entries expire `ttl` seconds after they are set. Once the cache holds
+    `maxsize` entries, the least recently used one is evicted to make room.
+    All operations are guarded by a lock so the cache can be shared by the
+    request threads of one worker.
+
+    Args:
+        maxsize: Maximum number of entries kept in memory
+        ttl: Seconds an entry stays fresh after being set
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._fill_locks = {}
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value for key, or MISSING if absent or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+
+            expires_at, value = entry
+            if expires_at <= monotonic():
+                del self._data[key]
+                self.misses += 1
+                return MISSING
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store value under key, evicting the least recently used entries if full"""
+        expires_at = monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    async def get_async(self, key: Hashable) -> Any:
+        """get() for coroutines; in memory, so it runs inline"""
+        return self.get(key)
+
+    async def set_async(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """set() for coroutines; in memory, so it runs inline"""
+        self.set(key, value, ttl)
+
+    def get_or_set(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """
+        Return the cached value for key, calling loader() to fill it on a miss.
+
+        Concurrent misses on the same key wait for a single loader call instead
+        of all hitting the upstream. Exceptions from loader propagate and
+        nothing is cached.
+        """
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+
+        with self._lock:
+            fill_lock = self._fill_locks.setdefault(key, threading.Lock())
+
+        with fill_lock:
+            try:
+                value = self.get(key)
+                if value is MISSING:
+                    value = loader()
+                    self.set(key, value, ttl)
+                return value
+            finally:
+                with self._lock:
+                    self._fill_locks.pop(key, None)
+
+    def invalidate(self, predicate=None) -> int:
+        """
+        Drop cached entries.
+
+        Args:
+            predicate: Optional callable taking a key; only matching keys are dropped.
+                       Drops everything when omitted.
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            if predicate is None:
+                removed = len(self._data)
+                self._data.clear()
+                return removed
+
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def stats(self) -> dict:
+        """Return size and hit/miss counters"""
+        with self._lock:
+            return {
+                "backend": "memory",
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class SQLiteCache:
+    """
+    Cache stored in a local SQLite file so every worker on a host shares it.
+
+    Has the same interface as TTLCache. Values are pickled, expiry uses wall
+    clock time so it means the same thing in every process, and LRU order is
+    tracked through a last-access column. Hit/miss counters are per process.
+
+    A hit only rewrites the last-access time once it is `touch_interval`
+    seconds old, so repeated reads of a hot key don't each take the database
+    write lock; LRU order is approximate to within that interval.
+
+    get_or_set() takes a lease row before calling the loader, so when several
+    workers miss the same key at once (e.g. right after they start) only one of
+    them fills it and the rest wait for the result.
+
+    Args:
+        namespace: Keeps separate caches in the same database file apart
+        maxsize: Maximum number of entries kept for this namespace
+        ttl: Seconds an entry stays fresh after being set
+        path: SQLite database file
+        touch_interval: Seconds before a hit updates the last-access time
+            (defaults to CACHE_TOUCH_FRACTION of the TTL)
+    """
+
+    def __init__(self, namespace: str, maxsize: int = 1024, ttl: float = 3600, path: str = CACHE_PATH,
+                 touch_interval: Optional[float] = None):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.touch_interval = ttl * CACHE_TOUCH_FRACTION if touch_interval is None else touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._memory_locks = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                create table if not exists cache_entries (
+                  namespace text not null,
+                  key text not null,
+                  key_blob blob not null,
+                  value blob not null,
+                  expires_at real not null,
+                  accessed_at real not null,
+                  primary key (namespace, key)
+                )
+            """)
+            conn.execute("create index if not exists cache_entries_lru on cache_entries (namespace, accessed_at)")
+            conn.execute("""
+                create table if not exists cache_leases (
+                  namespace text not null,
+                  key text not null,
+                  expires_at real not null,
+                  primary key (namespace, key)
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(key: Hashable) -> str:
+        """Stable text form of a key (keys are tuples of strings and numbers)"""
+        return repr(key)
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value for key, or MISSING if absent or expired"""
+        now = time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "select value, expires_at, accessed_at from cache_entries where namespace = ? and key = ?",
+                (self.namespace, self._key(key))
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self._count(hit=False)
+                return MISSING
+
+            if now - row[2] >= self.touch_interval:
+                conn.execute(
+                    "update cache_entries set accessed_at = ? where namespace = ? and key = ?",
+                    (now, self.namespace, self._key(key))
+                )
+        self._count(hit=True)
+        return pickle.loads(row[0])
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store value under key, evicting the least recently used entries if full"""
+        now = time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._connect() as conn:
+            conn.execute(
+                "insert or replace into cache_entries values (?, ?, ?, ?, ?, ?)",
+                (self.namespace, self._key(key), pickle.dumps(key), pickle.dumps(value), expires_at, now)
+            )
+            conn.execute("delete from cache_entries where namespace = ? and expires_at <= ?", (self.namespace, now))
+            conn.execute("""
+                delete from cache_entries
+                where namespace = ? and key in (
+                  select key from cache_entries where namespace = ?
+                  order by accessed_at desc limit -1 offset ?
+                )
+            """, (self.namespace, self.namespace, self.maxsize))
+
+    async def get_async(self, key: Hashable) -> Any:
+        """get() for coroutines, run in a thread so a busy database file doesn't stall the event loop"""
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """set() for coroutines, run in a thread like get_async()"""
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    def _acquire_lease(self, key: Hashable) -> bool:
+        now = time()
+        with self._connect() as conn:
+            conn.execute("delete from cache_leases where namespace = ? and key = ? and expires_at <= ?",
+                         (self.namespace, self._key(key), now))
+            cursor = conn.execute("insert or ignore into cache_leases values (?, ?, ?)",
+                                  (self.namespace, self._key(key), now + CACHE_LEASE_SECONDS))
+            return cursor.rowcount == 1
+
+    def _release_lease(self, key: Hashable):
+        with self._connect() as conn:
+            conn.execute("delete from cache_leases where namespace = ? and key = ?", (self.namespace, self._key(key)))
+
+    def get_or_set(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """
+        Return the cached value for key, calling loader() to fill it on a miss.
+
+        Only the worker holding the key's lease calls loader(); other workers
+        poll until the value appears or the lease expires. Exceptions from
+        loader propagate and nothing is cached.
+        """
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+
+        with self._lock:
+            fill_lock = self._memory_locks.setdefault(key, threading.Lock())
+
+        with fill_lock:
+            try:
+                while True:
+                    value = self.get(key)
+                    if value is not MISSING:
+                        return value
+                    if self._acquire_lease(key):
+                        break
+                    sleep(0.05)
+
+                try:
+                    value = loader()
+                    self.set(key, value, ttl)
+                    return value
+                finally:
+                    self._release_lease(key)
+            finally:
+                with self._lock:
+                    self._memory_locks.pop(key, None)
+
+    def invalidate(self, predicate=None) -> int:
+        """
+        Drop cached entries in this namespace.
+
+        Args:
+            predicate: Optional callable taking a key; only matching keys are dropped.
+                       Drops everything when omitted.
+
+        Returns:
+            Number of entries removed
+        """
+        with self._connect() as conn:
+            if predicate is None:
+                return conn.execute("delete from cache_entries where namespace = ?", (self.namespace,)).rowcount
+
+            rows = conn.execute("select key, key_blob from cache_entries where namespace = ?", (self.namespace,)).fetchall()
+            stale = [(self.namespace, key) for key, key_blob in rows if predicate(pickle.loads(key_blob))]
+            conn.executemany("delete from cache_entries where namespace = ? and key = ?", stale)
+            return len(stale)
+
+    def stats(self) -> dict:
+        """Return size and hit/miss counters"""
+        with self._connect() as conn:
+            size = conn.execute("select count(*) from cache_entries where namespace = ?", (self.namespace,)).fetchone()[0]
+        with self._lock:
+            return {
+                "backend": "sqlite",
+                "size": size,
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical upstream calls into one.
+
+    The first caller for a key runs the call; callers arriving with the same
+    key while it is in flight wait and receive its result, or its exception.
+    Nothing is kept once the call finishes, so this caps upstream load during
+    spikes without caching anything (pair it with a cache for that).
+
+    do() is for threads, do_async() for coroutines on one event loop.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Return fn(), or the result of the identical call already in flight"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fn()
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await fn(), or the identical call already in flight.
+
+        The shared call is shielded, so a caller that gives up (e.g. on a
+        timeout) doesn't cancel it for the others.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finish_task(key, done))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish_task(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark the exception retrieved; every waiter may have given up already
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """Return upstream calls made and calls that joined one already in flight"""
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced}
+
+
+def get_cache(namespace: str, maxsize: int = 1024, ttl: float = 3600, backend: Optional[str] = None):
+    """
+    Build a cache using the configured backend.
+
+    Args:
+        namespace: Name for this cache; keeps entries apart in the shared backend
+        maxsize: Maximum number of entries
+        ttl: Default seconds an entry stays fresh
+        backend: "memory" or "sqlite"; defaults to CACHE_BACKEND
+
+    Returns:
+        TTLCache or SQLiteCache
+    """
+    backend = backend or CACHE_BACKEND
+    if backend == "sqlite":
+        return SQLiteCache(namespace, maxsize=maxsize, ttl=ttl)
+    if backend == "memory":
+        return TTLCache(maxsize=maxsize, ttl=ttl)
+    raise ValueError(f"Unknown cache backend: {backend}")
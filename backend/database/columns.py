@@ -0,0 +1,26 @@
+# Output columns of each SQL function family in database_sql_functions.sql
+# (lowercased, as Postgres returns them). local_engine.py builds its tables
+# from these and payloads.py checks fields= against them; this module has no
+# heavy imports so the apps can use it without loading numpy or pandas.
+
+ELECTION_STATE_COLUMNS = ["state_po", "year", "party", "candidate", "candidatevotes"]
+ELECTION_COUNTY_COLUMNS = ["state_po", "county_name", "year", "party", "candidate", "candidatevotes"]
+DEMOGRAPHICS_COLUMNS = [
+    "state", "county", "geography", "year", "total_pop", "pct_female", "pct_male", "pct_white", "pct_black",
+    "pct_am_indian", "pct_asian", "pct_pacifici", "pct_other", "pct_two_or_more", "pct_hispanic",
+    "pct_not_hispanic", "pct_divorced", "pct_hs_or_higher", "pct_doctorate", "pct_uninsured", "med_household_income"
+]
+HEALTH_COLUMNS = [
+    "state", "county", "year", "pct_uninsured", "premature_death", "prim_care_physicians", "dentists",
+    "mammography_screening", "flu_vaccinations", "alcohol_deaths", "sexually_transmitted_infections",
+    "preventable_hospital_stays", "school_funding"
+]
+EDUCATION_COLUMNS = [
+    "state", "county", "year", "pct_hs_or_higher", "pct_ba_or_higher", "pct_doctorate", "pct_enrolled",
+    "pct_public_school", "pct_private_school", "school_funding"
+]
+ECONOMY_COLUMNS = [
+    "state", "county", "geography", "year", "poverty_pop", "med_household_income", "gini_index",
+    "labor_force_rate", "unemployment_rate", "med_gross_rent", "med_home_value", "pct_renters",
+    "pct_homeowners", "pct_renters_cost_burdened", "pct_homeowners_cost_burdened"
+]
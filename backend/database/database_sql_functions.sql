@@ -1,6 +1,77 @@
 -- All database functions for easy replication and documentation
 -- Refer to data processing files to see how raw datasets were cleaned and imported to database
 
+-- Natural keys: upload_to_supabase.py upserts on these columns (NATURAL_KEYS there),
+-- and PostgREST's on_conflict needs a unique index on exactly the same columns
+-- (the census tables are keyed by GEOID, unique within a geography level; drop
+-- first so databases with the earlier (geography, state, county, year) key move over)
+drop index if exists census_data_natural_key;
+create unique index census_data_natural_key
+  on census_data ("GEOID", geography, year) nulls not distinct;
+drop index if exists census_economic_data_natural_key;
+create unique index census_economic_data_natural_key
+  on census_economic_data ("GEOID", geography, year) nulls not distinct;
+create unique index if not exists county_health_ratings_trends_natural_key
+  on county_health_ratings_trends (state, county, year_numeric) nulls not distinct;
+create unique index if not exists election_results_by_county_natural_key
+  on election_results_by_county (year, state_po, county_name, mode, party, candidate) nulls not distinct;
+
+-- Canonical county key: 5-digit county FIPS, filled in by upload_to_supabase.py
+-- (state rows use the state FIPS + '000', the national row '00000').
+-- County lookups are plain equality matches on it, served by these indexes.
+alter table census_data add column if not exists county_fips text;
+alter table census_economic_data add column if not exists county_fips text;
+alter table county_health_ratings_trends add column if not exists county_fips text;
+-- MIT's county_fips comes in numeric, so store it as zero-padded text like the others
+alter table election_results_by_county
+  alter column county_fips type text using lpad(round(county_fips::numeric)::text, 5, '0');
+
+create index if not exists census_data_county_fips on census_data (county_fips, year);
+create index if not exists census_economic_data_county_fips on census_economic_data (county_fips, year);
+create index if not exists county_health_ratings_trends_county_fips on county_health_ratings_trends (county_fips, year_numeric);
+create index if not exists election_results_by_county_county_fips on election_results_by_county (county_fips, year);
+
+-- Function: List counties and their FIPS codes (the backend loads this to resolve county names).
+-- About 3,200 rows, more than one PostgREST response holds, so the stable order
+-- lets the backend page through it with offset/limit.
+create or replace function fetch_counties()
+returns table (
+  state text,
+  county text,
+  county_fips text
+)
+language sql
+as $$
+  select distinct state, county, county_fips
+  from census_data
+  where geography = 'county' and county_fips is not null
+  order by county_fips, county;
+$$;
+
+-- Materialized view: statewide votes per candidate and year, summed once from the county rows
+create materialized view if not exists election_results_by_state as
+  select state_po, year, party, candidate, sum(candidatevotes)::bigint as candidatevotes
+  from election_results_by_county
+  group by state_po, year, party, candidate;
+
+-- Unique index so the view can be refreshed concurrently, and state lookups are index scans
+create unique index if not exists election_results_by_state_key
+  on election_results_by_state (state_po, year, party, candidate) nulls not distinct;
+
+-- Function: Rebuild election_results_by_state (upload_to_supabase.py calls this after election uploads).
+-- It runs as its owner, so pin search_path and only let the service role call it.
+create or replace function refresh_election_results_by_state()
+returns void
+language sql
+security definer
+set search_path = public, pg_temp
+as $$
+  refresh materialized view concurrently public.election_results_by_state;
+$$;
+
+revoke execute on function refresh_election_results_by_state() from public, anon, authenticated;
+grant execute on function refresh_election_results_by_state() to service_role;
+
 -- Function: Get election results for state
 create or replace function fetch_election_state(state_name text)
 returns table (
@@ -12,15 +83,15 @@ returns table (
 )
 language sql
 as $$
-  select state_po, year, party, candidate, sum(candidatevotes) as votes
-  from election_results_by_county
+  select state_po, year, party, candidate, candidatevotes
+  from election_results_by_state
   where state_po = state_name
-  group by state_po, year, party, candidate
-  order by year, votes desc;
+  order by year, candidatevotes desc;
 $$;
 
 -- Function: Get election results for county
-create or replace function fetch_election_county(state_name text, county text)
+drop function if exists fetch_election_county(text, text);
+create or replace function fetch_election_county(fips text)
 returns table (
   state_po varchar,
   county_name varchar,
@@ -33,12 +104,7 @@ language sql
 as $$
   select state_po, county_name, year, party, candidate, candidatevotes
   from election_results_by_county
-  where state_po = state_name
-    and UPPER(county_name) = UPPER(
-      TRIM(
-        REGEXP_REPLACE(county, '\s*County\s*', '', 'gi')
-      )
-    )
+  where county_fips = fips
   order by year, candidatevotes desc;
 $$;
 
@@ -98,7 +164,8 @@ as $$
 $$;
 
 -- Function: Get demographics results for county
-create or replace function fetch_demographics_county(state_param text, county_param text)
+drop function if exists fetch_demographics_county(text, text);
+create or replace function fetch_demographics_county(fips_param text)
 returns table (
   state text,
   county text,
@@ -147,12 +214,7 @@ as $$
     pct_uninsured, 
     med_household_income
   from census_data
-  where (state = state_param
-    and county = case 
-      when $2 ilike '%county%' then $2
-      else $2 || ' County'
-    end)
-    or (state = 'US' and county = 'United States')
+  where county_fips in (fips_param, '00000')
   order by year desc;
 $$;
 
@@ -200,7 +262,8 @@ as $$
 $$;
 
 -- Function: Get health results for county
-create or replace function fetch_health_county(state_param text, county_param text)
+drop function if exists fetch_health_county(text, text);
+create or replace function fetch_health_county(fips_param text)
 returns table (
   state text,
   county text,
@@ -234,15 +297,9 @@ as $$
     h.school_funding
   from census_data c
   left join county_health_ratings_trends h
-    on c.state = h.state 
-    and c.county = h.county 
+    on c.county_fips = h.county_fips
     and c.year = h.year_numeric
-  where (c.state = state_param
-    and c.county = case 
-      when county_param ilike '%county%' then county_param
-      else county_param || ' County'
-    end)
-    or (c.state = 'US' and c.county = 'United States')
+  where c.county_fips in (fips_param, '00000')
   order by c.year desc;
 $$;
 
@@ -284,7 +341,8 @@ as $$
 $$;
 
 -- Function: Get Education results for county
-create or replace function fetch_education_county(state_param text, county_param text)
+drop function if exists fetch_education_county(text, text);
+create or replace function fetch_education_county(fips_param text)
 returns table (
   state text,
   county text,
@@ -312,15 +370,9 @@ as $$
     h.school_funding float4
   from census_data c
   left join county_health_ratings_trends h
-    on c.state = h.state 
-    and c.county = h.county 
+    on c.county_fips = h.county_fips
     and c.year = h.year_numeric
-  where (c.state = state_param
-    and c.county = case 
-      when county_param ilike '%county%' then county_param
-      else county_param || ' County'
-    end)
-    or (c.state = 'US' and c.county = 'United States')
+  where c.county_fips in (fips_param, '00000')
   order by c.year desc;
 $$;
 
@@ -368,7 +420,8 @@ as $$
 $$;
 
 -- Function: Get Economy results for county
-create or replace function fetch_economy_county(state_param text, county_param text)
+drop function if exists fetch_economy_county(text, text);
+create or replace function fetch_economy_county(fips_param text)
 returns table (
   state text,
   county text,
@@ -405,11 +458,228 @@ as $$
     pct_renters_cost_burdened,
     pct_homeowners_cost_burdened
   from census_economic_data
-  where (state = state_param
-    and county = case 
-      when $2 ilike '%county%' then $2
-      else $2 || ' County'
-    end)
-    or (state = 'US' and county = 'United States')
+  where county_fips in (fips_param, '00000')
   order by year desc;
-$$;
\ No newline at end of file
+$$;
+
+-- Batch functions: one call for many geographies (POST /api/batch).
+-- fips_list holds county FIPS codes and/or state codes (state FIPS + '000');
+-- include '00000' for the national row. Rows carry county_fips so the backend
+-- can key them by geography. Results can exceed one PostgREST response, so each
+-- function has a total order and the backend pages through it.
+
+-- Function: Get election results for many counties
+create or replace function fetch_election_county_batch(fips_list text[])
+returns table (
+  county_fips text,
+  state_po varchar,
+  county_name varchar,
+  year int,
+  party varchar,
+  candidate varchar,
+  candidatevotes bigint
+)
+language sql
+as $$
+  select county_fips, state_po, county_name, year, party, candidate, candidatevotes
+  from election_results_by_county
+  where county_fips = any(fips_list)
+  order by county_fips, year, candidatevotes desc, candidate;
+$$;
+
+-- Function: Get election results for many states
+create or replace function fetch_election_state_batch(state_list text[])
+returns table (
+  state_po varchar,
+  year int,
+  party varchar,
+  candidate varchar,
+  candidatevotes bigint
+)
+language sql
+as $$
+  select state_po, year, party, candidate, candidatevotes
+  from election_results_by_state
+  where state_po = any(state_list)
+  order by state_po, year, candidatevotes desc, candidate;
+$$;
+
+-- Function: Get demographics results for many geographies
+create or replace function fetch_demographics_batch(fips_list text[])
+returns table (
+  county_fips text,
+  state text,
+  county text,
+  geography text,
+  year numeric,
+  total_pop numeric,
+  pct_female numeric,
+  pct_male numeric,
+  pct_white numeric,
+  pct_black numeric,
+  pct_am_indian numeric,
+  pct_asian numeric,
+  pct_pacificI numeric,
+  pct_other numeric,
+  pct_two_or_more numeric,
+  pct_hispanic numeric,
+  pct_not_hispanic numeric,
+  pct_divorced numeric,
+  pct_hs_or_higher numeric,
+  pct_doctorate numeric,
+  pct_uninsured numeric,
+  med_household_income numeric
+)
+language sql
+as $$
+  select 
+    county_fips,
+    state, 
+    county, 
+    geography, 
+    year, 
+    total_pop, 
+    pct_female, 
+    pct_male, 
+    pct_white, 
+    pct_black, 
+    pct_am_indian, 
+    pct_asian, 
+    "pct_pacificI", 
+    pct_other, 
+    pct_two_or_more, 
+    pct_hispanic, 
+    pct_not_hispanic, 
+    pct_divorced, 
+    pct_hs_or_higher, 
+    pct_doctorate, 
+    pct_uninsured, 
+    med_household_income
+  from census_data
+  where county_fips = any(fips_list)
+  order by county_fips, year desc;
+$$;
+
+-- Function: Get health results for many geographies
+create or replace function fetch_health_batch(fips_list text[])
+returns table (
+  county_fips text,
+  state text,
+  county text,
+  year numeric,
+  pct_uninsured numeric,
+  premature_death float4,
+  prim_care_physicians float4,
+  dentists float4,
+  mammography_screening float4,
+  flu_vaccinations float4,
+  alcohol_deaths float4,
+  sexually_transmitted_infections float4,
+  preventable_hospital_stays float4,
+  school_funding float4
+)
+language sql
+as $$
+  select 
+    c.county_fips,
+    c.state, 
+    c.county,
+    c.year, 
+    c.pct_uninsured,
+    h.premature_death,
+    h.prim_care_physicians,
+    h.dentists,
+    h.mammography_screening,
+    h.flu_vaccinations,
+    h.alcohol_impaired_driving_deaths,
+    h.sexually_transmitted_infections,
+    h.preventable_hospital_stays,
+    h.school_funding
+  from census_data c
+  left join county_health_ratings_trends h
+    on c.county_fips = h.county_fips
+    and c.year = h.year_numeric
+  where c.county_fips = any(fips_list)
+  order by c.county_fips, c.year desc;
+$$;
+
+-- Function: Get Education results for many geographies
+create or replace function fetch_education_batch(fips_list text[])
+returns table (
+  county_fips text,
+  state text,
+  county text,
+  year numeric,
+  pct_hs_or_higher numeric,
+  pct_ba_or_higher numeric,
+  pct_doctorate numeric,
+  pct_enrolled numeric,
+  pct_public_school numeric,
+  pct_private_school numeric,
+  school_funding float4
+)
+language sql
+as $$
+  select 
+    c.county_fips,
+    c.state, 
+    c.county,
+    c.year, 
+    c.pct_hs_or_higher,
+    c.pct_ba_or_higher,
+    c.pct_doctorate,
+    c.pct_enrolled,
+    c.pct_public_school,
+    c.pct_private_school,
+    h.school_funding
+  from census_data c
+  left join county_health_ratings_trends h
+    on c.county_fips = h.county_fips
+    and c.year = h.year_numeric
+  where c.county_fips = any(fips_list)
+  order by c.county_fips, c.year desc;
+$$;
+
+-- Function: Get Economy results for many geographies
+create or replace function fetch_economy_batch(fips_list text[])
+returns table (
+  county_fips text,
+  state text,
+  county text,
+  geography text,
+  year numeric,
+  poverty_pop numeric,
+  med_household_income numeric,
+  gini_index numeric,
+  labor_force_rate numeric,
+  unemployment_rate numeric,
+  med_gross_rent numeric,
+  med_home_value numeric,
+  pct_renters numeric,
+  pct_homeowners numeric,
+  pct_renters_cost_burdened numeric,
+  pct_homeowners_cost_burdened numeric
+)
+language sql
+as $$
+  select 
+    county_fips,
+    state, 
+    county, 
+    geography, 
+    year, 
+    poverty_pop,
+    med_household_income,
+    gini_index,
+    labor_force_rate,
+    unemployment_rate,
+    med_gross_rent,
+    med_home_value,
+    pct_renters,
+    pct_homeowners,
+    pct_renters_cost_burdened,
+    pct_homeowners_cost_burdened
+  from census_economic_data
+  where county_fips = any(fips_list)
+  order by county_fips, year desc;
+$$;
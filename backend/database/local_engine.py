@@ -0,0 +1,391 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from constants import STATE_FIPS
+from .columns import (
+    ELECTION_STATE_COLUMNS, ELECTION_COUNTY_COLUMNS, DEMOGRAPHICS_COLUMNS,
+    HEALTH_COLUMNS, EDUCATION_COLUMNS, ECONOMY_COLUMNS
+)
+
+# In-process alternative to the Supabase RPCs (DATA_BACKEND=local).
+#
+# The cleaned CSVs from data_processing/ are loaded once into column arrays,
+# each table sorted by its lookup key (county_fips, or state_po for state
+# election totals) so a lookup is a dict hit plus an array slice. The arrays
+# are saved as .npy files and memory-mapped on later starts, so every worker on
+# a host shares one copy in the page cache and startup skips the CSV parse.
+#
+# Files other processes may have mapped are never rewritten: each rebuild goes
+# into a new version directory and current.json is atomically switched to it.
+#
+# call() implements the SQL functions in database_sql_functions.sql by name,
+# with the same parameters and output columns.
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLEANED_DATA_DIR = os.getenv(
+    "CLEANED_DATA_DIR", os.path.join(os.path.dirname(_BACKEND_DIR), "data_processing", "cleaned_data")
+)
+LOCAL_ENGINE_CACHE_DIR = os.getenv("LOCAL_ENGINE_CACHE_DIR", os.path.join(_BACKEND_DIR, ".cache", "local_engine"))
+# Names the version directory in use, with the CSV fingerprint it was built from
+POINTER_FILE = "current.json"
+# Unfinished builds older than this (seconds) were abandoned and are removed
+STALE_BUILD_SECONDS = 3600
+
+CSV_FILES = {
+    "census": "census_data.csv",
+    "economic": "census_economic_data.csv",
+    "health": "chr_trends_cleaned.csv",
+    "election": "cleaned_countypres_2000-2024.csv"
+}
+
+US_FIPS = "00000"
+STATE_BY_FIPS = {fips: abbr for abbr, fips in STATE_FIPS.items()}
+
+YEAR_DESC = [("year", True)]
+YEAR_ASC = [("year", False)]
+ELECTION_ORDER = [("year", False), ("candidatevotes", True)]
+
+
+def _state_key(state_abbr):
+    state_fips = STATE_FIPS.get((state_abbr or "").strip().upper())
+    return state_fips + "000" if state_fips else None
+
+
+# SQL function -> (table, keys from params, output columns, order by [(column, descending)])
+FUNCTIONS = {
+    "fetch_election_state": ("election_state", lambda p: [p["state_name"].strip()], ELECTION_STATE_COLUMNS, ELECTION_ORDER),
+    "fetch_election_county": ("election", lambda p: [p["fips"]], ELECTION_COUNTY_COLUMNS, ELECTION_ORDER),
+    "fetch_demographics_state": ("census", lambda p: [_state_key(p["state_param"]), US_FIPS], DEMOGRAPHICS_COLUMNS, YEAR_DESC),
+    "fetch_demographics_county": ("census", lambda p: [p["fips_param"], US_FIPS], DEMOGRAPHICS_COLUMNS, YEAR_DESC),
+    "fetch_health_state": ("health", lambda p: [_state_key(p["state_param"]), US_FIPS], HEALTH_COLUMNS, YEAR_DESC),
+    "fetch_health_county": ("health", lambda p: [p["fips_param"], US_FIPS], HEALTH_COLUMNS, YEAR_DESC),
+    "fetch_education_state": ("health", lambda p: [_state_key(p["state_param"]), US_FIPS], EDUCATION_COLUMNS, YEAR_ASC),
+    "fetch_education_county": ("health", lambda p: [p["fips_param"], US_FIPS], EDUCATION_COLUMNS, YEAR_DESC),
+    "fetch_economy_state": ("economic", lambda p: [_state_key(p["state_param"]), US_FIPS], ECONOMY_COLUMNS, YEAR_DESC),
+    "fetch_economy_county": ("economic", lambda p: [p["fips_param"], US_FIPS], ECONOMY_COLUMNS, YEAR_DESC),
+    "fetch_election_county_batch": ("election", lambda p: p["fips_list"], ["county_fips"] + ELECTION_COUNTY_COLUMNS,
+                                    [("county_fips", False)] + ELECTION_ORDER),
+    "fetch_election_state_batch": ("election_state", lambda p: p["state_list"], ELECTION_STATE_COLUMNS,
+                                   [("state_po", False)] + ELECTION_ORDER),
+    "fetch_demographics_batch": ("census", lambda p: p["fips_list"], ["county_fips"] + DEMOGRAPHICS_COLUMNS,
+                                 [("county_fips", False)] + YEAR_DESC),
+    "fetch_health_batch": ("health", lambda p: p["fips_list"], ["county_fips"] + HEALTH_COLUMNS,
+                           [("county_fips", False)] + YEAR_DESC),
+    "fetch_education_batch": ("health", lambda p: p["fips_list"], ["county_fips"] + EDUCATION_COLUMNS,
+                              [("county_fips", False)] + YEAR_DESC),
+    "fetch_economy_batch": ("economic", lambda p: p["fips_list"], ["county_fips"] + ECONOMY_COLUMNS,
+                            [("county_fips", False)] + YEAR_DESC),
+}
+
+
+## Building tables from the cleaned CSVs
+
+def _census_frame(path):
+    """census_data / census_economic_data CSV with the state, county and county_fips columns the tables have"""
+    frame = pd.read_csv(path, dtype={"GEOID": str})
+    frame = frame[frame["geography"].isin(["us", "state", "county"])].copy()
+    geoid = frame["GEOID"].str.zfill(2)
+    name = frame["NAME"] if "NAME" in frame else frame["state_name"]
+
+    frame["county_fips"] = np.select(
+        [frame["geography"] == "us", frame["geography"] == "state"],
+        [US_FIPS, geoid.str[:2] + "000"],
+        geoid.str.zfill(5)
+    )
+    frame["state"] = np.where(frame["geography"] == "us", "US", geoid.str[:2].map(STATE_BY_FIPS))
+    # County rows are "York County, Maine"; state and national rows are just the name
+    frame["county"] = name.str.split(", ").str[0]
+    return frame.rename(columns={"pct_pacificI": "pct_pacifici"})
+
+
+def _health_frame(census, path):
+    """Census rows left-joined to County Health Rankings on (county_fips, year), like fetch_health_*"""
+    chr_data = pd.read_csv(path)
+    state_fips = chr_data["statecode"].fillna(0).astype(int).astype(str).str.zfill(2)
+    county_code = chr_data["countycode"].fillna(0).astype(int).astype(str).str.zfill(3)
+    chr_data["county_fips"] = np.where(chr_data["state"] == "US", US_FIPS, state_fips + county_code)
+    chr_data = chr_data.rename(columns={"year_numeric": "year", "alcohol_impaired_driving_deaths": "alcohol_deaths"})
+
+    measures = [c for c in dict.fromkeys(HEALTH_COLUMNS + EDUCATION_COLUMNS) if c in chr_data and c not in census]
+    chr_data = chr_data[["county_fips", "year"] + measures].drop_duplicates(["county_fips", "year"])
+    return census.merge(chr_data, on=["county_fips", "year"], how="left")
+
+
+def _election_frames(path):
+    """County election rows with zero-padded county_fips, plus the statewide rollup"""
+    frame = pd.read_csv(path, dtype={"county_fips": "float"})
+    known = frame.dropna(subset=["county_fips"]).drop_duplicates(["state_po", "county_name"])
+    known = known.set_index(["state_po", "county_name"])["county_fips"]
+    fips = frame["county_fips"].fillna(pd.Series(list(zip(frame["state_po"], frame["county_name"]))).map(known))
+    frame["county_fips"] = fips.map(lambda v: None if pd.isna(v) else str(int(v)).zfill(5))
+
+    rollup = (frame.groupby(["state_po", "year", "party", "candidate"], dropna=False)["candidatevotes"]
+              .sum().reset_index())
+    return frame, rollup
+
+
+def _build_frames(data_dir):
+    census = _census_frame(os.path.join(data_dir, CSV_FILES["census"]))
+    election, election_state = _election_frames(os.path.join(data_dir, CSV_FILES["election"]))
+    return {
+        "census": (census, "county_fips"),
+        "economic": (_census_frame(os.path.join(data_dir, CSV_FILES["economic"])), "county_fips"),
+        "health": (_health_frame(census, os.path.join(data_dir, CSV_FILES["health"])), "county_fips"),
+        "election": (election, "county_fips"),
+        "election_state": (election_state, "state_po")
+    }
+
+
+## Column storage
+
+class ColumnTable:
+    """
+    One table as a dict of equal-length column arrays, sorted by its key column.
+
+    Args:
+        columns: Column name -> array (all rows in key order)
+        key: Column rows are looked up by
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], key: str):
+        self.columns = columns
+        self.key = key
+        keys, starts, counts = np.unique(columns[key], return_index=True, return_counts=True)
+        self.slices = {k: (int(s), int(s + c)) for k, s, c in zip(keys.tolist(), starts.tolist(), counts.tolist())}
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, key: str):
+        frame = frame[frame[key].notna()].sort_values(key, kind="stable")
+        columns = {}
+        for name in frame.columns:
+            series = frame[name]
+            if pd.api.types.is_numeric_dtype(series):
+                columns[name] = series.to_numpy(dtype=np.float64)
+            else:
+                # Fixed-width strings so the column can be memory-mapped
+                columns[name] = series.fillna("").astype(str).to_numpy(dtype=str)
+        return cls(columns, key)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        for name, array in self.columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+
+    @classmethod
+    def load(cls, directory: str, key: str):
+        columns = {
+            filename[:-4]: np.load(os.path.join(directory, filename), mmap_mode="r", allow_pickle=False)
+            for filename in os.listdir(directory) if filename.endswith(".npy")
+        }
+        return cls(columns, key)
+
+    def select(self, keys: List[str], output: List[str], order, fields=None, years=None, since=None) -> List[Dict]:
+        """
+        Rows for the given keys, projected to output (or fields) and filtered by year.
+
+        Raises:
+            ValueError: fields names a column the function doesn't return
+        """
+        if fields:
+            unknown = [f for f in fields if f not in output]
+            if unknown:
+                raise ValueError(f"column {', '.join(unknown)} does not exist")
+            output = list(fields)
+
+        spans = [self.slices[k] for k in dict.fromkeys(keys) if k in self.slices]
+        if not spans:
+            return []
+        idx = np.concatenate([np.arange(start, stop) for start, stop in spans])
+
+        if "year" in self.columns and (years or since is not None):
+            year = self.columns["year"][idx]
+            mask = np.ones(len(idx), dtype=bool)
+            if years:
+                mask &= np.isin(year, years)
+            if since is not None:
+                mask &= year >= since
+            idx = idx[mask]
+
+        # np.lexsort sorts by the last key first
+        sort_keys = []
+        for column, descending in reversed(order):
+            values = self.columns[column][idx]
+            if descending:
+                values = -values if values.dtype.kind == "f" else values
+            sort_keys.append(values)
+        idx = idx[np.lexsort(sort_keys)] if sort_keys else idx
+
+        values = {name: self._values(name, idx) for name in output}
+        return [dict(zip(output, row)) for row in zip(*(values[name] for name in output))]
+
+    def _values(self, name, idx):
+        """Python values for one column, with NaN / empty strings as None and whole numbers as ints"""
+        array = self.columns.get(name)
+        if array is None:
+            return [None] * len(idx)
+        values = array[idx]
+        if values.dtype.kind == "f":
+            if name in ("year", "candidatevotes"):
+                return [None if v != v else int(v) for v in values.tolist()]
+            return [None if v != v else v for v in values.tolist()]
+        return [v or None for v in values.tolist()]
+
+
+## Engine
+
+class LocalEngine:
+    """
+    Loads the cleaned CSVs into ColumnTables, using the memory-mapped cache
+    when it was built from the same CSV files.
+    """
+
+    def __init__(self, data_dir: str = CLEANED_DATA_DIR, cache_dir: str = LOCAL_ENGINE_CACHE_DIR):
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir
+        self.tables = {}
+
+    def _fingerprint(self):
+        out = {}
+        for name, filename in CSV_FILES.items():
+            stat = os.stat(os.path.join(self.data_dir, filename))
+            out[name] = [stat.st_size, stat.st_mtime]
+        return out
+
+    def _read_pointer(self) -> dict:
+        try:
+            with open(os.path.join(self.cache_dir, POINTER_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _open(self, current: dict):
+        directory = os.path.join(self.cache_dir, current["version"])
+        self.tables = {
+            name: ColumnTable.load(os.path.join(directory, name), key)
+            for name, key in current["keys"].items()
+        }
+        return self
+
+    def load(self):
+        fingerprint = self._fingerprint()
+        current = self._read_pointer()
+        if current.get("fingerprint") == fingerprint:
+            try:
+                return self._open(current)
+            except OSError as e:
+                # Removed by another process's rebuild in the meantime; build a fresh copy
+                print(f"Local data cache {current['version']} is unavailable ({e}), rebuilding")
+
+        self._build(fingerprint)
+        return self
+
+    def _build(self, fingerprint):
+        """
+        Write every table into a new version directory, open it, then point current.json at it.
+
+        Tables are written under a build-* directory that is renamed to v-*
+        once complete, so a half-written build is never opened. Older
+        versions are deleted afterwards; processes that still have them
+        mapped keep reading them (an unlinked file stays readable while mapped).
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix="build-", dir=self.cache_dir)
+        try:
+            frames = _build_frames(self.data_dir)
+            for name, (frame, key) in frames.items():
+                ColumnTable.from_frame(frame, key).save(os.path.join(staging, name))
+            version = "v-" + os.path.basename(staging)[len("build-"):]
+            os.rename(staging, os.path.join(self.cache_dir, version))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        current = {"version": version, "fingerprint": fingerprint,
+                   "keys": {name: key for name, (_, key) in frames.items()}}
+        # Map this process's copy before publishing it, so a concurrent rebuild can't remove it first
+        self._open(current)
+        pointer_path = os.path.join(self.cache_dir, POINTER_FILE)
+        with open(f"{pointer_path}.{os.getpid()}.tmp", "w") as f:
+            json.dump(current, f)
+        os.replace(f"{pointer_path}.{os.getpid()}.tmp", pointer_path)
+        self._remove_old_versions(keep=version)
+
+    def _remove_old_versions(self, keep: str):
+        """Delete versions other than keep (and the one current.json names), and abandoned builds"""
+        in_use = {keep, self._read_pointer().get("version")}
+        for entry in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, entry)
+            try:
+                abandoned = entry.startswith("build-") and time.time() - os.stat(path).st_mtime > STALE_BUILD_SECONDS
+            except OSError:
+                continue
+            if (entry.startswith("v-") and entry not in in_use) or abandoned:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def counties(self) -> List[Dict]:
+        """fetch_counties: every county's state, name and FIPS"""
+        census = self.tables["census"]
+        is_county = census.columns["geography"] == "county"
+        rows = {
+            (state, county, fips)
+            for state, county, fips in zip(census.columns["state"][is_county].tolist(),
+                                           census.columns["county"][is_county].tolist(),
+                                           census.columns["county_fips"][is_county].tolist())
+        }
+        return [{"state": state, "county": county, "county_fips": fips}
+                for state, county, fips in sorted(rows, key=lambda row: (row[2], row[1]))]
+
+    def call(self, function_name: str, params: Dict[str, Any], fields: Optional[List[str]] = None,
+             years: Optional[List[int]] = None, since: Optional[int] = None) -> List[Dict]:
+        """Run one of the SQL functions locally; same params and output as the Supabase RPC"""
+        if function_name == "fetch_counties":
+            return self.counties()
+        if function_name not in FUNCTIONS:
+            raise ValueError(f"{function_name} is not available with DATA_BACKEND=local")
+        table, keys, output, order = FUNCTIONS[function_name]
+        return self.tables[table].select(keys(params), output, order, fields, years, since)
+
+
+_engine = {"engine": None, "started": False}
+_lock = threading.Lock()
+
+
+def get_engine() -> LocalEngine:
+    """Load the engine on first use (building the column cache if the CSVs changed)"""
+    if _engine["engine"] is None:
+        with _lock:
+            if _engine["engine"] is None:
+                engine = LocalEngine().load()
+                print(f"Loaded local data engine: {', '.join(engine.tables)}")
+                _engine["engine"] = engine
+    return _engine["engine"]
+
+
+def _warm():
+    try:
+        get_engine()
+    except Exception as e:
+        print(f"Error loading local data engine: {e}")
+
+# Load the tables in a background thread at startup (safe to call repeatedly)
+def start_local_engine():
+    with _lock:
+        if _engine["started"]:
+            return
+        _engine["started"] = True
+    threading.Thread(target=_warm, name="local-engine", daemon=True).start()
+
+def reset_engine():
+    """Drop the loaded tables; the next call reloads (and rebuilds the cache if the CSVs changed)"""
+    with _lock:
+        _engine["engine"] = None
+
+
+def call(function_name: str, params: Dict[str, Any], **filters) -> List[Dict]:
+    return get_engine().call(function_name, params, **filters)
@@ -1,42 +1,292 @@
-from .supabase_client import supabase
-from typing import List, Dict, Any
+import asyncio
+import os
+import re
+import threading
+import time
+from cache import get_cache, MISSING, SingleFlight
+from constants import STATE_FIPS
+from typing import List, Dict, Any, Optional
 
 #### Supabase functions can be found in ./database_sql_functions.sql
 
-def _safe_rpc_call(function_name: str, params: Dict[str, Any]) -> List[Dict]:
+# "supabase" (default) calls the SQL functions over PostgREST; "local" runs the
+# same functions in-process over the cleaned CSVs (see local_engine.py)
+DATA_BACKEND = os.getenv("DATA_BACKEND", "supabase").strip().lower()
+if DATA_BACKEND == "local":
+    from . import local_engine
+else:
+    from .supabase_client import supabase, async_supabase
+
+# Census, health, economy and election tables only change when
+# data_processing/scripts/upload_to_supabase.py runs, so RPC results are
+# cached and served locally on repeat views (see cache.py for backends).
+RPC_CACHE_TTL = float(os.getenv("RPC_CACHE_TTL", "86400"))
+RPC_CACHE_SIZE = int(os.getenv("RPC_CACHE_SIZE", "2048"))
+
+# PostgREST returns at most this many rows per request (Supabase's "Max rows" setting)
+POSTGREST_MAX_ROWS = int(os.getenv("POSTGREST_MAX_ROWS", "1000"))
+
+_rpc_cache = get_cache("rpc", maxsize=RPC_CACHE_SIZE, ttl=RPC_CACHE_TTL)
+# Identical RPCs already in flight in this process are joined rather than repeated
+_rpc_flights = SingleFlight()
+
+
+class RPCError(Exception):
+    """An RPC failed (Supabase unreachable, SQL error, ...); details are logged, not carried in the message"""
+
+
+def _normalize_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (list, tuple)):
+        # Array params are sets of keys; order and duplicates don't change the result
+        return sorted({_normalize_value(v) for v in value})
+    return value
+
+
+def _normalize_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Trim string params and sort array params so equivalent requests share a cache entry"""
+    return {k: _normalize_value(v) for k, v in params.items()}
+
+
+def _safe_rpc_call(function_name: str, params: Dict[str, Any], fields: Optional[List[str]] = None,
+                   years: Optional[List[int]] = None, since: Optional[int] = None,
+                   paginate: bool = False) -> List[Dict]:
     """
-    Generic helper to safely execute Supabase RPC calls with error handling.
+    Generic helper to execute Supabase RPC calls with error handling.
+    
+    Column projection and year filters are sent to PostgREST with the call
+    (select=, year=in.(), year=gte.), so only the requested columns and rows
+    come back from Supabase.
+    
+    Successful results are cached on (function_name, normalized params,
+    fields, years, since). Errors are never cached so the next request retries.
+    Concurrent calls with the same key share one RPC and its result or error.
+    
+    With DATA_BACKEND=local the function runs in the local engine instead,
+    with the same params and filters, and results aren't cached.
     
     Args:
         function_name: Name of the Supabase RPC function
         params: Parameters dictionary
+        fields: Only return these columns (all when omitted). The census
+                functions also always return state and county (see
+                _with_place_columns)
+        years: Only return rows for these years
+        since: Only return rows from this year on
+        paginate: Fetch POSTGREST_MAX_ROWS at a time until a short page comes
+                  back, for functions whose result can exceed that limit (the
+                  function must return rows in a stable order). Unpaged calls
+                  that come back with exactly that many rows were truncated
+                  and raise RPCError.
     
     Returns:
-        List of results, or empty list if error/no data
+        List of results, or empty list if there is no data
+    
+    Raises:
+        RPCError: The call failed, so callers can report the category as
+                  missing instead of serving an empty result as if it were real
     """
+    params = _normalize_params(params)
+    fields = _with_place_columns(function_name, fields)
+    if DATA_BACKEND == "local":
+        try:
+            return local_engine.call(function_name, params, fields=fields, years=years, since=since)
+        except Exception as e:
+            print(f"Error in {function_name}: {e}")
+            raise RPCError(f"{function_name} failed") from e
+
+    cache_key = _rpc_cache_key(function_name, params, fields, years, since)
+    
+    def call_rpc():
+        if paginate:
+            return _paged(lambda start, end: _rpc_query(supabase, function_name, params, fields, years, since)
+                          .range(start, end).execute())
+        response = _rpc_query(supabase, function_name, params, fields, years, since).execute()
+        return _complete_rows(function_name, response.data)
+    
     try:
-        response = supabase.rpc(function_name, params).execute()
-        return response.data if response.data else []
+        return _rpc_flights.do(cache_key, lambda: _rpc_cache.get_or_set(cache_key, call_rpc))
     except Exception as e:
         print(f"Error in {function_name}: {e}")
+        raise RPCError(f"{function_name} failed") from e
+
+
+# Columns that say which place a row is for. The census functions return the
+# national ("00000") rows alongside the requested place's, so they're never projected away.
+PLACE_COLUMNS = ["state", "county"]
+
+
+def _with_place_columns(function_name: str, fields: Optional[List[str]]) -> Optional[List[str]]:
+    """Put PLACE_COLUMNS in front of a census function's projection (election functions have no national rows)"""
+    if not fields or function_name.startswith("fetch_election"):
+        return fields
+    return list(dict.fromkeys(PLACE_COLUMNS + list(fields)))
+
+
+def _rpc_cache_key(function_name, params, fields, years, since) -> tuple:
+    fields = tuple(fields or ())
+    years = tuple(sorted(set(years or ())))
+    hashable_params = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in params.items()))
+    return (function_name, hashable_params, fields, years, since)
+
+
+def _rpc_query(client, function_name, params, fields, years, since):
+    """Build the PostgREST RPC request, with projection and year filters, on a sync or async client"""
+    query = client.rpc(function_name, params)
+    if fields:
+        query = query.select(*fields)
+    if years:
+        query = query.in_("year", sorted(set(years)))
+    if since is not None:
+        query = query.gte("year", since)
+    return query
+
+
+def _complete_rows(function_name: str, rows) -> List[Dict]:
+    """Rows of an unpaged call; exactly POSTGREST_MAX_ROWS of them means PostgREST cut the result off"""
+    rows = rows or []
+    if len(rows) >= POSTGREST_MAX_ROWS:
+        raise RuntimeError(f"{function_name} returned {len(rows)} rows, the PostgREST limit; result is truncated")
+    return rows
+
+
+def _paged(fetch_page) -> List[Dict]:
+    """Call fetch_page(start, end) for successive row ranges until one comes back short"""
+    rows = []
+    while True:
+        page = fetch_page(len(rows), len(rows) + POSTGREST_MAX_ROWS - 1).data or []
+        rows.extend(page)
+        if len(page) < POSTGREST_MAX_ROWS:
+            return rows
+
+
+async def _paged_async(fetch_page) -> List[Dict]:
+    """_paged() for coroutines"""
+    rows = []
+    while True:
+        page = (await fetch_page(len(rows), len(rows) + POSTGREST_MAX_ROWS - 1)).data or []
+        rows.extend(page)
+        if len(page) < POSTGREST_MAX_ROWS:
+            return rows
+
+
+def invalidate_rpc_cache(function_name: Optional[str] = None) -> int:
+    """
+    Drop cached RPC results, e.g. after new data is uploaded to Supabase.
+    
+    Args:
+        function_name: Only drop results for this RPC. Drops everything when omitted.
+    
+    Returns:
+        Number of cache entries removed
+    """
+    if function_name in (None, "fetch_counties"):
+        _county_lookup["index"] = None
+    if DATA_BACKEND == "local" and function_name is None:
+        # Reload so rebuilt CSVs are picked up
+        local_engine.reset_engine()
+    if function_name is None:
+        return _rpc_cache.invalidate()
+    return _rpc_cache.invalidate(lambda key: key[0] == function_name)
+
+
+def rpc_cache_stats() -> Dict[str, Any]:
+    """Return size and hit/miss counters for the RPC cache, and how many calls were coalesced"""
+    return {**_rpc_cache.stats(), "single_flight": _rpc_flights.stats()}
+
+
+## County lookup
+# County RPCs match on the 5-digit county FIPS (an indexed column), so names
+# are resolved to FIPS here, against a lookup loaded from fetch_counties and
+# reloaded every COUNTY_INDEX_TTL seconds.
+
+COUNTY_INDEX_TTL = float(os.getenv("COUNTY_INDEX_TTL", str(RPC_CACHE_TTL)))
+
+_county_lookup = {"index": None, "names": {}, "loaded_at": 0.0}
+_county_lookup_lock = threading.Lock()
+
+
+def normalize_county_name(county: str) -> str:
+    """Uppercase, drop the word "County" and collapse spaces ("York County " -> "YORK")"""
+    return " ".join(re.sub(r"\bCOUNTY\b", " ", county.upper()).split())
+
+
+def _county_index_expired() -> bool:
+    return _county_lookup["index"] is None or time.monotonic() - _county_lookup["loaded_at"] > COUNTY_INDEX_TTL
+
+
+def _load_county_index() -> Dict[tuple, str]:
+    if not _county_index_expired():
+        return _county_lookup["index"]
+
+    with _county_lookup_lock:
+        if _county_index_expired():
+            try:
+                _install_county_index(list_counties())
+            except RPCError:
+                # Keep answering from the previous lookup, if there is one, until a reload succeeds
+                if _county_lookup["index"] is None:
+                    raise
+        return _county_lookup["index"] or {}
+
+
+def _install_county_index(rows: List[Dict]):
+    index = {
+        (row["state"], normalize_county_name(row["county"])): row["county_fips"]
+        for row in rows
+    }
+    # Leave it unset after an empty load so the next request retries
+    if index:
+        _county_lookup["names"] = {row["county_fips"]: row["county"] for row in rows}
+        _county_lookup["index"] = index
+        _county_lookup["loaded_at"] = time.monotonic()
+
+
+def list_counties() -> List[Dict]:
+    """Every county as {"state", "county", "county_fips"} rows; raises RPCError if they can't be loaded"""
+    # About 3,200 rows, more than PostgREST returns in one response
+    return _safe_rpc_call("fetch_counties", {}, paginate=True)
+
+
+def resolve_county_fips(state_abbr: str, county: str) -> Optional[str]:
+    """
+    Return the 5-digit FIPS code for a county name, or None if it isn't known.
+    
+    Accepts names with or without "County" in any case (e.g. "York", "york county").
+    Raises RPCError when the county lookup can't be loaded.
+    """
+    if not state_abbr or not county:
+        return None
+    return _load_county_index().get((state_abbr.strip().upper(), normalize_county_name(county)))
+
+
+def county_name(fips: Optional[str]) -> Optional[str]:
+    """Stored name of a county already resolved with resolve_county_fips (e.g. "23031" -> "York County")"""
+    return _county_lookup["names"].get(fips)
+
+
+def _safe_county_rpc_call(function_name: str, state_abbr: str, county: str, param: str, **filters) -> List[Dict]:
+    """Resolve the county to its FIPS code and call a county RPC with it"""
+    fips = resolve_county_fips(state_abbr, county)
+    if fips is None:
+        print(f"Error in {function_name}: unknown county {county!r} in {state_abbr}")
         return []
+    return _safe_rpc_call(function_name, {param: fips}, **filters)
 
 
 ## Supabase queries for Civics Data
-def fetch_election_state(state_abbr: str) -> List[Dict]:
+def fetch_election_state(state_abbr: str, **filters) -> List[Dict]:
     """Fetch state-level election results"""
-    return _safe_rpc_call("fetch_election_state", {"state_name": state_abbr})
+    return _safe_rpc_call("fetch_election_state", {"state_name": state_abbr}, **filters)
 
-def fetch_election_county(state_abbr: str, county: str) -> List[Dict]:
+def fetch_election_county(state_abbr: str, county: str, **filters) -> List[Dict]:
     """Fetch county-level election results"""
-    return _safe_rpc_call("fetch_election_county", {
-        "state_name": state_abbr,
-        "county": county
-    })
+    return _safe_county_rpc_call("fetch_election_county", state_abbr, county, "fips", **filters)
 
 
 ## Supabase queries for Demographics Data
-def fetch_demographics_state(state_abbr: str, state_full_name: str) -> List[Dict]:
+def fetch_demographics_state(state_abbr: str, state_full_name: str, **filters) -> List[Dict]:
     """
     Fetch state-level demographics data.
     
@@ -46,22 +296,20 @@ def fetch_demographics_state(state_abbr: str, state_full_name: str) -> List[Dict
     Args:
         state_abbr: State abbreviation (e.g., "ME")
         state_full_name: Full state name (e.g., "Maine") - stored in county column
+        filters: fields / years / since, passed to _safe_rpc_call
     """
     return _safe_rpc_call("fetch_demographics_state", {
         "state_param": state_abbr,
         "county_param": state_full_name  # Full state name goes to county_param
-    })
+    }, **filters)
 
-def fetch_demographics_county(state_abbr: str, county: str) -> List[Dict]:
+def fetch_demographics_county(state_abbr: str, county: str, **filters) -> List[Dict]:
     """Fetch county-level demographics data"""
-    return _safe_rpc_call("fetch_demographics_county", {
-        "state_param": state_abbr,
-        "county_param": county
-    })
+    return _safe_county_rpc_call("fetch_demographics_county", state_abbr, county, "fips_param", **filters)
 
 
 ## Supabase queries for Health Data
-def fetch_health_state(state_abbr: str, state_full_name: str) -> List[Dict]:
+def fetch_health_state(state_abbr: str, state_full_name: str, **filters) -> List[Dict]:
     """
     Fetch state-level health data.
     
@@ -71,22 +319,20 @@ def fetch_health_state(state_abbr: str, state_full_name: str) -> List[Dict]:
     Args:
         state_abbr: State abbreviation (e.g., "ME")
         state_full_name: Full state name (e.g., "Maine") - stored in county column
+        filters: fields / years / since, passed to _safe_rpc_call
     """
     return _safe_rpc_call("fetch_health_state", {
         "state_param": state_abbr,
         "county_param": state_full_name  # Full state name goes to county_param
-    })
+    }, **filters)
 
-def fetch_health_county(state_abbr: str, county: str) -> List[Dict]:
+def fetch_health_county(state_abbr: str, county: str, **filters) -> List[Dict]:
     """Fetch county-level health data"""
-    return _safe_rpc_call("fetch_health_county", {
-        "state_param": state_abbr,
-        "county_param": county
-    })
+    return _safe_county_rpc_call("fetch_health_county", state_abbr, county, "fips_param", **filters)
 
 
 ## Supabase queries for Education Data
-def fetch_education_state(state_abbr: str, state_full_name: str) -> List[Dict]:
+def fetch_education_state(state_abbr: str, state_full_name: str, **filters) -> List[Dict]:
     """
     Fetch state-level education data.
     
@@ -96,22 +342,20 @@ def fetch_education_state(state_abbr: str, state_full_name: str) -> List[Dict]:
     Args:
         state_abbr: State abbreviation (e.g., "ME")
         state_full_name: Full state name (e.g., "Maine") - stored in county column
+        filters: fields / years / since, passed to _safe_rpc_call
     """
     return _safe_rpc_call("fetch_education_state", {
         "state_param": state_abbr,
         "county_param": state_full_name  # Full state name goes to county_param
-    })
+    }, **filters)
 
-def fetch_education_county(state_abbr: str, county: str) -> List[Dict]:
+def fetch_education_county(state_abbr: str, county: str, **filters) -> List[Dict]:
     """Fetch county-level education data"""
-    return _safe_rpc_call("fetch_education_county", {
-        "state_param": state_abbr,
-        "county_param": county
-    })
+    return _safe_county_rpc_call("fetch_education_county", state_abbr, county, "fips_param", **filters)
 
 
 ## Supabase queries for Economic Data
-def fetch_economy_state(state_abbr: str, state_full_name: str) -> List[Dict]:
+def fetch_economy_state(state_abbr: str, state_full_name: str, **filters) -> List[Dict]:
     """
     Fetch state-level economy data.
     
@@ -121,15 +365,193 @@ def fetch_economy_state(state_abbr: str, state_full_name: str) -> List[Dict]:
     Args:
         state_abbr: State abbreviation (e.g., "ME")
         state_full_name: Full state name (e.g., "Maine") - stored in county column
+        filters: fields / years / since, passed to _safe_rpc_call
     """
     return _safe_rpc_call("fetch_economy_state", {
         "state_param": state_abbr,
         "county_param": state_full_name  # Full state name goes to county_param
-    })
+    }, **filters)
 
-def fetch_economy_county(state_abbr: str, county: str) -> List[Dict]:
+def fetch_economy_county(state_abbr: str, county: str, **filters) -> List[Dict]:
     """Fetch county-level economy data"""
-    return _safe_rpc_call("fetch_economy_county", {
-        "state_param": state_abbr,
-        "county_param": county
-    })
\ No newline at end of file
+    return _safe_county_rpc_call("fetch_economy_county", state_abbr, county, "fips_param", **filters)
+
+
+## Batch queries for many geographies at once
+# One set-based RPC per category (county_fips = any(...)) instead of one call per place.
+# A batch can return more rows than PostgREST sends at once, so it is paged.
+
+US_FIPS = "00000"
+
+BATCH_FUNCTIONS = {
+    "health": "fetch_health_batch",
+    "demographics": "fetch_demographics_batch",
+    "education": "fetch_education_batch",
+    "economy": "fetch_economy_batch"
+}
+
+
+def state_fips_key(state_abbr: str) -> Optional[str]:
+    """county_fips value of a state's own rows (state FIPS + "000")"""
+    state_fips = STATE_FIPS.get(state_abbr)
+    return state_fips + "000" if state_fips else None
+
+
+def _with_column(fields: Optional[List[str]], column: str) -> Optional[List[str]]:
+    """Keep the column results are grouped by when the caller projected fields"""
+    if fields and column not in fields:
+        return list(fields) + [column]
+    return fields
+
+
+def _group_rows(rows: List[Dict], column: str) -> Dict[str, List[Dict]]:
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.get(column), []).append(row)
+    return grouped
+
+
+def fetch_category_batch(category: str, fips_codes: List[str], state_abbrs: List[str] = None,
+                         fields: Optional[List[str]] = None, **filters) -> Dict[str, List[Dict]]:
+    """
+    Fetch one category for many geographies in a single RPC.
+    
+    Args:
+        category: civics, health, demographics, education or economy
+        fips_codes: county FIPS codes and/or state codes (see state_fips_key)
+        state_abbrs: States to fetch (civics only; state election results come
+                     from the state rollup, keyed by abbreviation)
+        fields / filters: Same as _safe_rpc_call
+    
+    Returns:
+        Dict of FIPS code (or state abbreviation for civics states) -> rows.
+        Other categories also return the national rows under "00000".
+    """
+    if category == "civics":
+        results = {}
+        if fips_codes:
+            rows = _safe_rpc_call("fetch_election_county_batch", {"fips_list": fips_codes},
+                                  fields=_with_column(fields, "county_fips"), paginate=True, **filters)
+            results.update(_group_rows(rows, "county_fips"))
+        if state_abbrs:
+            rows = _safe_rpc_call("fetch_election_state_batch", {"state_list": state_abbrs},
+                                  fields=_with_column(fields, "state_po"), paginate=True, **filters)
+            results.update(_group_rows(rows, "state_po"))
+        return results
+    
+    rows = _safe_rpc_call(BATCH_FUNCTIONS[category], {"fips_list": list(fips_codes) + [US_FIPS]},
+                          fields=_with_column(fields, "county_fips"), paginate=True, **filters)
+    return _group_rows(rows, "county_fips")
+
+
+## Async queries for the ASGI app (asgi.py)
+# The same SQL functions, params, filters and cache as above, awaited on the
+# async Supabase client so one worker can have many RPCs in flight.
+
+STATE_CATEGORY_RPCS = {
+    "civics": "fetch_election_state",
+    "health": "fetch_health_state",
+    "demographics": "fetch_demographics_state",
+    "education": "fetch_education_state",
+    "economy": "fetch_economy_state"
+}
+# County RPC and the name of its FIPS parameter
+COUNTY_CATEGORY_RPCS = {
+    "civics": ("fetch_election_county", "fips"),
+    "health": ("fetch_health_county", "fips_param"),
+    "demographics": ("fetch_demographics_county", "fips_param"),
+    "education": ("fetch_education_county", "fips_param"),
+    "economy": ("fetch_economy_county", "fips_param")
+}
+
+
+async def _safe_rpc_call_async(function_name: str, params: Dict[str, Any], fields: Optional[List[str]] = None,
+                               years: Optional[List[int]] = None, since: Optional[int] = None,
+                               paginate: bool = False) -> List[Dict]:
+    """_safe_rpc_call() for coroutines; shares its cache entries and coalesces identical calls the same way"""
+    params = _normalize_params(params)
+    fields = _with_place_columns(function_name, fields)
+    if DATA_BACKEND == "local":
+        # The first call may load the tables from disk, and every call scans arrays: keep it off the event loop
+        try:
+            return await asyncio.to_thread(local_engine.call, function_name, params,
+                                           fields=fields, years=years, since=since)
+        except Exception as e:
+            print(f"Error in {function_name}: {e}")
+            raise RPCError(f"{function_name} failed") from e
+
+    cache_key = _rpc_cache_key(function_name, params, fields, years, since)
+    cached = await _rpc_cache.get_async(cache_key)
+    if cached is not MISSING:
+        return cached
+    
+    async def call_rpc():
+        if paginate:
+            data = await _paged_async(lambda start, end: _rpc_query(async_supabase, function_name, params, fields,
+                                                                    years, since).range(start, end).execute())
+        else:
+            response = await _rpc_query(async_supabase, function_name, params, fields, years, since).execute()
+            data = _complete_rows(function_name, response.data)
+        await _rpc_cache.set_async(cache_key, data)
+        return data
+    
+    try:
+        return await _rpc_flights.do_async(cache_key, call_rpc)
+    except Exception as e:
+        print(f"Error in {function_name}: {e}")
+        raise RPCError(f"{function_name} failed") from e
+
+
+async def resolve_county_fips_async(state_abbr: str, county: str) -> Optional[str]:
+    """resolve_county_fips() for coroutines; loads the shared lookup on first use"""
+    if not state_abbr or not county:
+        return None
+    if _county_index_expired():
+        try:
+            _install_county_index(await _safe_rpc_call_async("fetch_counties", {}, paginate=True))
+        except RPCError:
+            if _county_lookup["index"] is None:
+                raise
+    return (_county_lookup["index"] or {}).get((state_abbr.strip().upper(), normalize_county_name(county)))
+
+
+async def fetch_state_category_async(category: str, state_abbr: str, state_full_name: str, **filters) -> List[Dict]:
+    """Async fetch_<category>_state (fetch_election_state for civics)"""
+    if category == "civics":
+        params = {"state_name": state_abbr}
+    else:
+        params = {"state_param": state_abbr, "county_param": state_full_name}
+    return await _safe_rpc_call_async(STATE_CATEGORY_RPCS[category], params, **filters)
+
+
+async def fetch_county_category_async(category: str, state_abbr: str, county: str, **filters) -> List[Dict]:
+    """Async fetch_<category>_county (fetch_election_county for civics)"""
+    function_name, param = COUNTY_CATEGORY_RPCS[category]
+    fips = await resolve_county_fips_async(state_abbr, county)
+    if fips is None:
+        print(f"Error in {function_name}: unknown county {county!r} in {state_abbr}")
+        return []
+    return await _safe_rpc_call_async(function_name, {param: fips}, **filters)
+
+
+async def fetch_category_batch_async(category: str, fips_codes: List[str], state_abbrs: List[str] = None,
+                                     fields: Optional[List[str]] = None, **filters) -> Dict[str, List[Dict]]:
+    """Async fetch_category_batch(); the civics county and state RPCs run concurrently"""
+    if category == "civics":
+        calls = []
+        if fips_codes:
+            calls.append((_safe_rpc_call_async("fetch_election_county_batch", {"fips_list": fips_codes},
+                                               fields=_with_column(fields, "county_fips"), paginate=True,
+                                               **filters), "county_fips"))
+        if state_abbrs:
+            calls.append((_safe_rpc_call_async("fetch_election_state_batch", {"state_list": state_abbrs},
+                                               fields=_with_column(fields, "state_po"), paginate=True,
+                                               **filters), "state_po"))
+        results = {}
+        for rows, (_, column) in zip(await asyncio.gather(*(call for call, _ in calls)), calls):
+            results.update(_group_rows(rows, column))
+        return results
+    
+    rows = await _safe_rpc_call_async(BATCH_FUNCTIONS[category], {"fips_list": list(fips_codes) + [US_FIPS]},
+                                      fields=_with_column(fields, "county_fips"), paginate=True, **filters)
+    return _group_rows(rows, "county_fips")
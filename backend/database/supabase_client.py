@@ -1,4 +1,4 @@
-from supabase import create_client, Client
+from supabase import create_client, Client, AsyncClient
 from dotenv import load_dotenv
 import os
 
@@ -8,4 +8,5 @@ url: str = os.environ.get("SUPABASE_URL", "")
 key: str = os.environ.get("SUPABASE_KEY", "")
 
 supabase: Client = create_client(url, key)
-
+# Async client for the ASGI app (asgi.py); connects on first use
+async_supabase: AsyncClient = AsyncClient(url, key)
@@ -0,0 +1,101 @@
+"""
+Offline build of the precomputed state and county payloads.
+
+Renders the all-categories /api/state and /api/county response for every state
+and county into snapshot_store.py, so those routes serve a precompressed file
+instead of querying Supabase and encoding JSON. Rerun after uploading new data.
+
+Run from the backend directory:
+
+    python -m functions.build_snapshots                 # every state and county
+    python -m functions.build_snapshots --state ME      # just Maine and its counties
+    python -m functions.build_snapshots --refresh       # clear the RPC cache first
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import snapshot_store
+from constants import STATE_FULL
+from database.queries import invalidate_rpc_cache, list_counties
+# payloads, not app: importing app would start its background threads in this batch job
+from payloads import VALID_CATEGORIES, build_county_payload, build_state_payload
+
+# Every state and county has rows of its own in these; none means the read went wrong
+REQUIRED_CATEGORIES = ["demographics", "health", "education", "economy"]
+NATIONAL_COUNTY = "United States"
+
+
+def incomplete(payload):
+    """Why a payload must not be published, or None when it is complete"""
+    if payload["errors"]:
+        return f"errors in {', '.join(payload['errors'])}"
+    # The national comparison rows come back with every place, so they don't count
+    empty = [
+        category for category in REQUIRED_CATEGORIES
+        if not any(row.get("county") != NATIONAL_COUNTY for row in payload["data"].get(category, []))
+    ]
+    if empty:
+        return f"no rows for {', '.join(empty)}"
+    return None
+
+
+def build(states, workers=4, refresh=False):
+    """
+    Build snapshots for the given states and their counties.
+
+    Payloads with category errors or an empty required category fail and
+    keep their previous snapshot (if any) rather than publishing partial
+    data. If the county list can't be loaded, RPCError is raised before
+    anything is written.
+
+    Returns:
+        Number of payloads that failed
+    """
+    if refresh:
+        invalidate_rpc_cache()
+
+    jobs = [(f"state/{abbr}", build_state_payload, (abbr, VALID_CATEGORIES)) for abbr in states]
+    jobs += [
+        (f"county/{row['county_fips']}", build_county_payload, (row["state"], row["county"], VALID_CATEGORIES))
+        for row in list_counties() if row["state"] in states
+    ]
+    print(f"Building {len(jobs)} snapshots into {snapshot_store.SNAPSHOT_DIR}")
+
+    def render(job):
+        key, build_payload, args = job
+        payload = build_payload(*args)
+        error = incomplete(payload)
+        if error:
+            return key, None, error
+        return key, snapshot_store.write_snapshot(key, payload), None
+
+    entries = snapshot_store.read_manifest_entries()
+    started = time.monotonic()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i, (key, entry, error) in enumerate(executor.map(render, jobs), 1):
+            if error:
+                failed += 1
+                print(f"✗ {i}/{len(jobs)} {key} failed, keeping the previous snapshot: {error}")
+                continue
+            entries[key] = entry
+            print(f"✓ {i}/{len(jobs)} {key}")
+
+    snapshot_store.write_manifest(entries, time.time())
+
+    print(f"\n{'='*60}")
+    print(f"Total: {len(jobs)} | Built: {len(jobs) - failed} | Failed: {failed} | {time.monotonic() - started:.0f}s")
+    print(f"{'='*60}")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute compressed state and county payloads")
+    parser.add_argument("--state", action="append", help="State abbreviation to build (repeatable, default: all)")
+    parser.add_argument("--workers", type=int, default=4, help="Payloads rendered concurrently")
+    parser.add_argument("--refresh", action="store_true", help="Clear cached RPC results before building")
+    args = parser.parse_args()
+
+    states = [abbr.upper() for abbr in args.state] if args.state else list(STATE_FULL)
+    sys.exit(1 if build(states, args.workers, args.refresh) else 0)
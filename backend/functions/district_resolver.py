@@ -0,0 +1,199 @@
+import json
+import math
+import os
+import re
+import threading
+from constants import STATE_FIPS
+
+# Offline point-in-district lookups for reverse geocoding. Boundary polygons are
+# read from local GeoJSON files (Census TIGER/Line or cartographic boundary files
+# converted with e.g. `ogr2ogr -f GeoJSON county.geojson cb_2024_us_county_500k.shp`)
+# and bucketed into a lat/lng grid so each lookup only tests a few polygons.
+
+DISTRICT_BOUNDARIES_DIR = os.getenv(
+    "DISTRICT_BOUNDARIES_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "boundaries")
+)
+# Size of a grid cell in degrees
+DISTRICT_GRID_DEGREES = float(os.getenv("DISTRICT_GRID_DEGREES", "0.25"))
+
+# Layer name -> GeoJSON file in DISTRICT_BOUNDARIES_DIR. Missing files are skipped.
+LAYERS = {
+    "county": "county.geojson",
+    "congressional": "congressional.geojson",
+    "state_house": "state_house.geojson",
+    "state_senate": "state_senate.geojson",
+    "school": "school.geojson"
+}
+
+STATE_BY_FIPS = {fips: abbr for abbr, fips in STATE_FIPS.items()}
+
+# TIGER names the district field after the congress, e.g. CD119FP
+CD_FIELD = re.compile(r"^CD\d+FP$")
+
+
+def _point_in_ring(x, y, ring):
+    """Ray casting test for one closed ring of (x, y) points"""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+class _Feature:
+    """One boundary: its properties, polygons (outer ring + holes) and bounding box"""
+
+    def __init__(self, properties, geometry):
+        self.properties = properties
+        if geometry["type"] == "Polygon":
+            polygons = [geometry["coordinates"]]
+        else:
+            polygons = geometry["coordinates"]
+        self.polygons = [[[tuple(point[:2]) for point in ring] for ring in polygon] for polygon in polygons]
+
+        xs = [x for polygon in self.polygons for x, _ in polygon[0]]
+        ys = [y for polygon in self.polygons for _, y in polygon[0]]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    def contains(self, x, y):
+        min_x, min_y, max_x, max_y = self.bbox
+        if not (min_x <= x <= max_x and min_y <= y <= max_y):
+            return False
+        for outer, *holes in self.polygons:
+            if _point_in_ring(x, y, outer) and not any(_point_in_ring(x, y, hole) for hole in holes):
+                return True
+        return False
+
+
+class _GridIndex:
+    """Maps grid cells to the features whose bounding box overlaps them"""
+
+    def __init__(self, features, cell_size):
+        self.cell_size = cell_size
+        self.features = features
+        self.cells = {}
+        for i, feature in enumerate(features):
+            min_x, min_y, max_x, max_y = feature.bbox
+            for cx in range(self._cell(min_x), self._cell(max_x) + 1):
+                for cy in range(self._cell(min_y), self._cell(max_y) + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+
+    def _cell(self, value):
+        return math.floor(value / self.cell_size)
+
+    def find(self, x, y):
+        """Return the properties of the first feature containing (x, y), or None"""
+        for i in self.cells.get((self._cell(x), self._cell(y)), []):
+            if self.features[i].contains(x, y):
+                return self.features[i].properties
+        return None
+
+
+class DistrictResolver:
+    """
+    Resolves lat/lng to county, congressional, state legislative and school districts.
+
+    Args:
+        directory: Folder holding the GeoJSON files named in LAYERS
+        cell_size: Grid cell size in degrees
+    """
+
+    def __init__(self, directory=DISTRICT_BOUNDARIES_DIR, cell_size=DISTRICT_GRID_DEGREES):
+        self.directory = directory
+        self.cell_size = cell_size
+        self.layers = {}
+
+    def load(self):
+        """Read every available layer file and build its grid index"""
+        for layer, filename in LAYERS.items():
+            path = os.path.join(self.directory, filename)
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                collection = json.load(f)
+            features = [
+                _Feature(feature.get("properties") or {}, feature["geometry"])
+                for feature in collection.get("features", [])
+                if feature.get("geometry") and feature["geometry"]["type"] in ("Polygon", "MultiPolygon")
+            ]
+            self.layers[layer] = _GridIndex(features, self.cell_size)
+        return self
+
+    def lookup(self, lat, lng):
+        """Return {layer: feature properties or None} for every loaded layer"""
+        return {layer: index.find(lng, lat) for layer, index in self.layers.items()}
+
+
+def _name(properties):
+    if not properties:
+        return None
+    return properties.get("NAMELSAD") or properties.get("NAME")
+
+def _code(properties, field):
+    """District code from a TIGER state legislative feature (SLDLST/SLDUST), or None"""
+    return (properties or {}).get(field)
+
+def _congressional_district(properties):
+    """District number from a TIGER congressional district feature (0 for at-large)"""
+    for field, value in properties.items():
+        if CD_FIELD.match(field) and str(value).isdigit():
+            # 98 marks non-voting delegates, who sit at-large like 00
+            return 0 if int(value) in (0, 98) else int(value)
+    return None
+
+
+_state = {"resolver": None, "started": False}
+_lock = threading.Lock()
+
+
+def _load_resolver():
+    try:
+        resolver = DistrictResolver().load()
+    except Exception as e:
+        print(f"Error loading district boundaries: {e}")
+        return
+    if resolver.layers:
+        _state["resolver"] = resolver
+        print(f"Loaded district boundaries: {', '.join(resolver.layers)}")
+
+# Load boundary files in a background thread (safe to call repeatedly)
+def start_district_resolver():
+    with _lock:
+        if _state["started"]:
+            return
+        _state["started"] = True
+    if os.path.isdir(DISTRICT_BOUNDARIES_DIR):
+        threading.Thread(target=_load_resolver, name="district-resolver", daemon=True).start()
+
+# Resolve lat/lng to districts in-process. Returns None until boundaries are loaded
+# or when the point isn't inside a known county and congressional district.
+def resolve_point(lat, lng):
+    resolver = _state["resolver"]
+    if resolver is None:
+        return None
+
+    found = resolver.lookup(lat, lng)
+    county = found.get("county")
+    district = found.get("congressional")
+    if not county or not district:
+        return None
+
+    state = STATE_BY_FIPS.get(county.get("STATEFP"))
+    if not state:
+        return None
+
+    return {
+        "state": state,
+        "county": _name(county),
+        "congressional_district": _congressional_district(district),
+        "state_house_district": _name(found.get("state_house")),
+        "state_senate_district": _name(found.get("state_senate")),
+        "state_house_code": _code(found.get("state_house"), "SLDLST"),
+        "state_senate_code": _code(found.get("state_senate"), "SLDUST"),
+        "school_district": _name(found.get("school"))
+    }
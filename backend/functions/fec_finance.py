@@ -1,12 +1,25 @@
+import asyncio
 import os
+import datetime
+import functools
+import hashlib
+import json
+import threading
+import time
+import httpx
 import requests
 import yaml
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from cache import get_cache, MISSING, SingleFlight
+from . import fec_store, http_client
 
 load_dotenv()
 FEC_API_KEY = os.getenv("FEC_API_KEY")
 
 
+FEC_API_BASE = "https://api.open.fec.gov/v1"
+
 # URL for congress-legislators github repo
 LEGIS_URL = "https://raw.githubusercontent.com/unitedstates/congress-legislators/master/legislators-current.yaml"
 
@@ -29,41 +42,307 @@ EXCLUDE_EMPLOYERS = {
     "INFORMATION REQUESTED"
 }
 
-# in-memory cache
-_cache = {"legislators": None, "states": None}
+# Parsed, trimmed copy of the legislators file kept on local disk. Workers load it
+# at startup and a background thread refreshes it, so requests never wait on the
+# YAML download or parse.
+LEGIS_SNAPSHOT_PATH = os.getenv(
+    "LEGIS_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "legislators.json")
+)
+# Seconds between checks for a newer legislators file
+LEGIS_REFRESH_SECONDS = float(os.getenv("LEGIS_REFRESH_SECONDS", "21600"))
+# Seconds before retrying a failed download while no snapshot exists yet
+# (cold start); doubles on each failure, up to LEGIS_REFRESH_SECONDS
+LEGIS_RETRY_SECONDS = float(os.getenv("LEGIS_RETRY_SECONDS", "15"))
 
+# This worker's parsed copy of the snapshot
+_cache = {"legislators": None, "index": None, "snapshot_mtime": None}
+_refresh = {"pid": None}
+_refresh_lock = threading.Lock()
 
-# Fetch legislators from github repo
-def load_legislators():
-    if _cache["legislators"] is not None:
-        return _cache["legislators"]
-    r = requests.get(LEGIS_URL, timeout=10)
+
+# Keep only the fields the app reads: ids, name and the current term
+def _compact_legislator(person):
+    terms = person.get("terms") or [{}]
+    return {"id": person.get("id", {}), "name": person.get("name", {}), "terms": [terms[-1]]}
+
+def _read_snapshot():
+    try:
+        with open(LEGIS_SNAPSHOT_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_snapshot(snapshot):
+    os.makedirs(os.path.dirname(LEGIS_SNAPSHOT_PATH), exist_ok=True)
+    tmp_path = f"{LEGIS_SNAPSHOT_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot, f, default=str)
+    os.replace(tmp_path, LEGIS_SNAPSHOT_PATH)
+
+def _install_legislators(folks, snapshot_mtime=None):
+    index = _build_legislator_index(folks)
+    with _refresh_lock:
+        _cache["index"] = index
+        _cache["legislators"] = folks
+        _cache["snapshot_mtime"] = snapshot_mtime
+
+# Load the on-disk snapshot if it's newer than the copy in memory
+def _load_snapshot():
+    try:
+        mtime = os.path.getmtime(LEGIS_SNAPSHOT_PATH)
+    except OSError:
+        return None
+    if mtime == _cache["snapshot_mtime"]:
+        return None
+    snapshot = _read_snapshot()
+    if snapshot is not None:
+        _install_legislators(snapshot["legislators"], mtime)
+    return snapshot
+
+# Download the legislators file if it changed and rewrite the snapshot
+def refresh_legislators():
+    snapshot = _load_snapshot() or _read_snapshot() or {}
+
+    # Another worker on this host refreshed recently, reuse its snapshot
+    if time.time() - snapshot.get("fetched_at", 0) < LEGIS_REFRESH_SECONDS:
+        return
+
+    headers = {"If-None-Match": snapshot["etag"]} if snapshot.get("etag") else {}
+    r = http_client.get(LEGIS_URL, headers=headers, timeout=30)
+    if r.status_code == 304:
+        snapshot["fetched_at"] = time.time()
+        _write_snapshot(snapshot)
+        _load_snapshot()
+        return
     r.raise_for_status()
-    folks = yaml.safe_load(r.text)
-    _cache["legislators"] = folks
-    return folks
+
+    digest = hashlib.sha256(r.content).hexdigest()
+    if digest != snapshot.get("sha256"):
+        snapshot["legislators"] = [_compact_legislator(p) for p in yaml.safe_load(r.text)]
+    snapshot.update({"etag": r.headers.get("ETag"), "sha256": digest, "fetched_at": time.time()})
+    _write_snapshot(snapshot)
+    _load_snapshot()
+
+def _refresh_loop():
+    retry = LEGIS_RETRY_SECONDS
+    while True:
+        try:
+            refresh_legislators()
+        except Exception as e:
+            print(f"Error refreshing legislators: {http_client.redact(e)}")
+        if legislators_loaded():
+            time.sleep(LEGIS_REFRESH_SECONDS)
+        else:
+            # Nothing to serve until the first download succeeds, so retry soon
+            time.sleep(retry)
+            retry = min(retry * 2, LEGIS_REFRESH_SECONDS)
+
+# Load the snapshot and start this process's background refresh thread (safe to call repeatedly)
+def start_legislators_refresh():
+    with _refresh_lock:
+        # Threads don't survive a fork, so each gunicorn worker starts its own
+        if _refresh["pid"] == os.getpid():
+            return
+        _refresh["pid"] = os.getpid()
+    _load_snapshot()
+    threading.Thread(target=_refresh_loop, name="legislators-refresh", daemon=True).start()
+
+# Whether a legislators snapshot has been loaded; False on a cold start until the first download lands
+def legislators_loaded():
+    return _cache["legislators"] is not None
+
+# Get legislators from the local snapshot of the congress-legislators github repo.
+# Never waits: on a cold start this is empty until the background download succeeds.
+def load_legislators():
+    start_legislators_refresh()
+    return _cache["legislators"] or []
+
+# Build lookup tables over the legislators list so member queries don't rescan it
+def _build_legislator_index(folks):
+    index = {"by_bioguide": {}, "by_fec": {}, "by_state": {}, "by_district": {}}
+    for person in folks:
+        ids = person.get("id", {})
+        bio_id = ids.get("bioguide")
+        if not bio_id:
+            continue
+        index["by_bioguide"][bio_id] = person
+        for fec_id in ids.get("fec", []):
+            index["by_fec"][fec_id] = bio_id
+
+        terms = person.get("terms") or [{}]
+        term = terms[-1]
+        state = term.get("state")
+        if not state:
+            continue
+        index["by_state"].setdefault(state, []).append(person)
+        if term.get("type") == "rep":
+            index["by_district"].setdefault((state, term.get("district")), []).append(person)
+    return index
+
+def _legislator_index():
+    load_legislators()
+    return _cache["index"] or _build_legislator_index([])
+
+# Get the legislators-current entry for a bioguide id, or None
+def get_member(bio_id):
+    return _legislator_index()["by_bioguide"].get(bio_id)
+
+# Get the bioguide id that owns an FEC candidate id, or None
+def get_bioguide_for_fec(fec_id):
+    return _legislator_index()["by_fec"].get(fec_id)
+
+# Get current members for a state (senators and representatives)
+def get_members_by_state(state_abbr):
+    return _legislator_index()["by_state"].get(state_abbr.upper(), [])
+
+# Get current representatives for a congressional district (0 for at-large seats)
+def get_members_by_district(state_abbr, district):
+    return _legislator_index()["by_district"].get((state_abbr.upper(), int(district)), [])
 
 # Get the fec id for a member from geocodio (fec id not included in returned json)
 def get_member_fec(bio_id):
-    folks = load_legislators()
-    member_fec_ids = []
-    for person in folks:
-        if person.get("id", {}).get("bioguide") == bio_id:
-            fec_ids = person.get("id", {}).get("fec", [])
-            if fec_ids:  
-                member_fec_ids.extend(fec_ids)
-    return member_fec_ids
+    person = get_member(bio_id)
+    if not person:
+        return []
+    return list(person.get("id", {}).get("fec", []))
 
-# Function to get cash, debts, raised, and spent for members to create finance overview bar chart
-def fetch_fec_totals(fec_id, cycle=2024):
-    """Fetch FEC totals for a candidate for a specific cycle"""
-    base = f"https://api.open.fec.gov/v1/candidate/{fec_id}/totals/"
-    params = {"api_key": FEC_API_KEY, "cycle": cycle, "per_page": 100}
-    r = requests.get(base, params=params, timeout=10)
+# FEC results for closed cycles never change, so they are kept until evicted.
+# Current-cycle results are fresh for FEC_CACHE_FRESH_SECONDS; after that they are
+# still served (and refreshed in the background) for up to FEC_CACHE_STALE_SECONDS.
+FEC_CACHE_FRESH_SECONDS = float(os.getenv("FEC_CACHE_FRESH_SECONDS", "3600"))
+FEC_CACHE_STALE_SECONDS = float(os.getenv("FEC_CACHE_STALE_SECONDS", "86400"))
+FEC_CACHE_SIZE = int(os.getenv("FEC_CACHE_SIZE", "5000"))
+
+_fec_cache = get_cache("fec", maxsize=FEC_CACHE_SIZE, ttl=FEC_CACHE_STALE_SECONDS)
+# Concurrent misses for the same (endpoint, id, cycle) share one FEC call
+_fec_flights = SingleFlight()
+_revalidate_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="fec-revalidate")
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+# Two-year FEC cycle that is still open, e.g. 2026 during 2025 and 2026
+def current_cycle():
+    year = datetime.date.today().year
+    return year + year % 2
+
+def _store_fec_result(key, value, closed):
+    # Error dicts aren't cached so the next request retries
+    if isinstance(value, dict) and "error" in value:
+        return
+    _fec_cache.set(key, {"value": value, "fetched_at": time.time()}, float("inf") if closed else None)
+
+async def _store_fec_result_async(key, value, closed):
+    if isinstance(value, dict) and "error" in value:
+        return
+    await _fec_cache.set_async(key, {"value": value, "fetched_at": time.time()}, float("inf") if closed else None)
+
+def _revalidate(key, fetch, *args):
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def run():
+        try:
+            _store_fec_result(key, fetch(*args), closed=False)
+        except Exception as e:
+            print(f"Error revalidating {key}: {e}")
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(key)
+
+    _revalidate_executor.submit(run)
+
+# Cache an FEC fetcher taking (candidate or committee id, cycle) with cycle-aware TTLs.
+# Concurrent misses for the same key wait on one call instead of each hitting FEC.
+def _fec_cached(endpoint):
+    def decorator(fetch):
+        @functools.wraps(fetch)
+        def wrapper(fec_id, cycle=2024):
+            cycle = int(cycle)
+            key = (endpoint, fec_id, cycle)
+            closed = cycle < current_cycle()
+
+            entry = _fec_cache.get(key)
+            if entry is not MISSING:
+                if not closed and time.time() - entry["fetched_at"] > FEC_CACHE_FRESH_SECONDS:
+                    _revalidate(key, fetch, fec_id, cycle)
+                return entry["value"]
+
+            def load():
+                value = fetch(fec_id, cycle)
+                _store_fec_result(key, value, closed)
+                return value
+            return _fec_flights.do(key, load)
+        return wrapper
+    return decorator
+
+# GET an FEC endpoint through the shared HTTP client; returns (response, None) or (None, error dict)
+def _fec_get(url, params):
+    try:
+        r = http_client.get(url, params=params, timeout=10)
+    except requests.RequestException as e:
+        # The exception text includes the request URL, which carries the API key
+        return None, {"error": f"FEC API request failed: {type(e).__name__}", "status_code": 503}
     if r.status_code != 200:
-        return {"error": r.text, "status_code": r.status_code}
-    data = r.json()
-    results = data.get("results", [])
+        return None, {"error": r.text, "status_code": r.status_code}
+    return r, None
+
+# Async _fec_get() for the ASGI app, through the shared httpx client
+async def _fec_get_async(url, params):
+    try:
+        r = await http_client.get_async(url, params=params, timeout=10)
+    except (httpx.HTTPError, requests.RequestException) as e:
+        return None, {"error": f"FEC API request failed: {type(e).__name__}", "status_code": 503}
+    if r.status_code != 200:
+        return None, {"error": r.text, "status_code": r.status_code}
+    return r, None
+
+# Async counterpart of _fec_cached, sharing its cache. Stale current-cycle entries
+# are refreshed in the background by the sync fetcher, like the sync path does.
+def _fec_cached_async(endpoint, sync_fetch):
+    def decorator(fetch):
+        @functools.wraps(fetch)
+        async def wrapper(fec_id, cycle=2024):
+            cycle = int(cycle)
+            key = (endpoint, fec_id, cycle)
+            closed = cycle < current_cycle()
+
+            entry = await _fec_cache.get_async(key)
+            if entry is not MISSING:
+                if not closed and time.time() - entry["fetched_at"] > FEC_CACHE_FRESH_SECONDS:
+                    _revalidate(key, sync_fetch.__wrapped__, fec_id, cycle)
+                return entry["value"]
+
+            async def load():
+                value = await fetch(fec_id, cycle)
+                await _store_fec_result_async(key, value, closed)
+                return value
+            return await _fec_flights.do_async(key, load)
+        return wrapper
+    return decorator
+
+# URL and params of each FEC endpoint, shared by the sync and async fetchers
+def _totals_request(fec_id, cycle):
+    return f"{FEC_API_BASE}/candidate/{fec_id}/totals/", {"api_key": FEC_API_KEY, "cycle": cycle, "per_page": 100}
+
+def _state_totals_request(fec_id, cycle):
+    return f"{FEC_API_BASE}/schedules/schedule_a/by_state/by_candidate/", {
+        "api_key": FEC_API_KEY, "cycle": cycle, "per_page": 100, "sort": "-total", "candidate_id": fec_id, "election_full": "false"
+    }
+
+def _primary_committee_request(fec_id, cycle):
+    return f"{FEC_API_BASE}/candidates/search/", {"api_key": FEC_API_KEY, "cycle": cycle, "per_page": 100, "candidate_id": fec_id}
+
+def _top_contributors_request(committee_id, cycle):
+    return f"{FEC_API_BASE}/schedules/schedule_a/by_employer/", {
+        "api_key": FEC_API_KEY, "cycle": cycle, "per_page": 100, "sort": "-total", "committee_id": committee_id
+    }
+
+# Shape /candidate/<id>/totals/ rows into the summary used by the finance overview charts
+def summarize_fec_totals(fec_id, cycle, results):
     summary = {
         "fec_id": fec_id,
         "cycle": cycle,
@@ -92,15 +371,8 @@ def fetch_fec_totals(fec_id, cycle=2024):
   
     return summary
 
-# Function to get top 5 states contributors for a member
-def fetch_fec_state_totals(fec_id, cycle=2024):
-    base = f"https://api.open.fec.gov/v1/schedules/schedule_a/by_state/by_candidate/"
-    params = {"api_key": FEC_API_KEY, "cycle": cycle, "per_page": 100, "sort": "-total", "candidate_id": fec_id, "election_full": "false"}
-    r = requests.get(base, params=params, timeout=10)
-    if r.status_code != 200:
-        return {"error": r.text, "status_code": r.status_code}
-    data = r.json()
-    results = data.get("results", [])
+# Keep the top 5 states from by-state rows sorted by total, largest first
+def top_state_totals(results):
     first5 = results[:5]
 
     first5_summary = []
@@ -111,37 +383,15 @@ def fetch_fec_state_totals(fec_id, cycle=2024):
  
     return first5_summary
 
-# Function to get a member's primary committee for given cycle
-def fetch_member_primary_committee(fec_id, cycle=2024):
-    base = f"https://api.open.fec.gov/v1/candidates/search/"
-    params = {"api_key": FEC_API_KEY, "cycle": cycle, "per_page": 100, "candidate_id": fec_id}
-    r = requests.get(base, params=params, timeout=10)
-    if r.status_code != 200:
-        return {"error": r.text, "status_code": r.status_code}
-    data = r.json()
-    results = data.get("results", [])
-
-    if not results:
-        return {"error": f"No results found for candidate ID {fec_id}", "status_code": r.status_code}
-
-    candidate = results[0]
+# Principal committee id from a /candidates/search/ result, or None
+def principal_committee_id(candidate):
     principal_committees = candidate.get("principal_committees", [])
     if principal_committees:
-        committee_id = principal_committees[0].get("committee_id")
-    
-    return committee_id
+        return principal_committees[0].get("committee_id")
+    return None
 
-# Function to get top INDIVIDUAL contributors for a member and cycle. This exclued PAC and Committee donations
-def fetch_fec_top_contributors(committee_id, cycle=2024):
-    """Fetch FEC individual top contributors for a member and cycle"""
-    base = f"https://api.open.fec.gov/v1/schedules/schedule_a/by_employer/"
-    params = {"api_key": FEC_API_KEY, "cycle": cycle, "per_page": 100, "sort": "-total", "committee_id": committee_id}
-    r = requests.get(base, params=params, timeout=10)
-    if r.status_code != 200:
-        return {"error": r.text, "status_code": r.status_code}
-    data = r.json()
-    results = data.get("results", [])
-    
+# Drop excluded employers from by-employer rows sorted by total and keep the top 20
+def top_employer_totals(results):
     cleaned = []
     for row in results:
         employer = (row.get("employer") or "").strip().upper()
@@ -153,4 +403,116 @@ def fetch_fec_top_contributors(committee_id, cycle=2024):
 
     
     first10_summary = cleaned[:20]
-    return first10_summary
\ No newline at end of file
+    return first10_summary
+
+# Function to get cash, debts, raised, and spent for members to create finance overview bar chart
+@_fec_cached("totals")
+def fetch_fec_totals(fec_id, cycle=2024):
+    """Fetch FEC totals for a candidate for a specific cycle"""
+    stored = fec_store.read_totals(fec_id, cycle)
+    if stored is not None:
+        return summarize_fec_totals(fec_id, cycle, stored)
+
+    r, error = _fec_get(*_totals_request(fec_id, cycle))
+    if error:
+        return error
+    data = r.json()
+    return summarize_fec_totals(fec_id, cycle, data.get("results", []))
+
+# Function to get top 5 states contributors for a member
+@_fec_cached("state_totals")
+def fetch_fec_state_totals(fec_id, cycle=2024):
+    stored = fec_store.read_state_totals(fec_id, cycle)
+    if stored is not None:
+        return top_state_totals(stored)
+
+    r, error = _fec_get(*_state_totals_request(fec_id, cycle))
+    if error:
+        return error
+    data = r.json()
+    return top_state_totals(data.get("results", []))
+
+# Function to get a member's primary committee for given cycle
+@_fec_cached("primary_committee")
+def fetch_member_primary_committee(fec_id, cycle=2024):
+    stored = fec_store.read_primary_committee(fec_id, cycle)
+    if stored is not None:
+        return stored["committee_id"]
+
+    r, error = _fec_get(*_primary_committee_request(fec_id, cycle))
+    if error:
+        return error
+    data = r.json()
+    results = data.get("results", [])
+
+    if not results:
+        return {"error": f"No results found for candidate ID {fec_id}", "status_code": r.status_code}
+
+    return principal_committee_id(results[0])
+
+# Function to get top INDIVIDUAL contributors for a member and cycle. This exclued PAC and Committee donations
+@_fec_cached("top_contributors")
+def fetch_fec_top_contributors(committee_id, cycle=2024):
+    """Fetch FEC individual top contributors for a member and cycle"""
+    stored = fec_store.read_employer_totals(committee_id, cycle)
+    if stored is not None:
+        return top_employer_totals(stored)
+
+    r, error = _fec_get(*_top_contributors_request(committee_id, cycle))
+    if error:
+        return error
+    data = r.json()
+    return top_employer_totals(data.get("results", []))
+
+
+## Async fetchers for the ASGI app (asgi.py); same results and cache entries as the sync ones.
+# The local store is SQLite, so its reads run in worker threads.
+
+@_fec_cached_async("totals", fetch_fec_totals)
+async def fetch_fec_totals_async(fec_id, cycle=2024):
+    stored = await asyncio.to_thread(fec_store.read_totals, fec_id, cycle)
+    if stored is not None:
+        return summarize_fec_totals(fec_id, cycle, stored)
+
+    r, error = await _fec_get_async(*_totals_request(fec_id, cycle))
+    if error:
+        return error
+    return summarize_fec_totals(fec_id, cycle, r.json().get("results", []))
+
+@_fec_cached_async("state_totals", fetch_fec_state_totals)
+async def fetch_fec_state_totals_async(fec_id, cycle=2024):
+    stored = await asyncio.to_thread(fec_store.read_state_totals, fec_id, cycle)
+    if stored is not None:
+        return top_state_totals(stored)
+
+    r, error = await _fec_get_async(*_state_totals_request(fec_id, cycle))
+    if error:
+        return error
+    return top_state_totals(r.json().get("results", []))
+
+@_fec_cached_async("primary_committee", fetch_member_primary_committee)
+async def fetch_member_primary_committee_async(fec_id, cycle=2024):
+    stored = await asyncio.to_thread(fec_store.read_primary_committee, fec_id, cycle)
+    if stored is not None:
+        return stored["committee_id"]
+
+    r, error = await _fec_get_async(*_primary_committee_request(fec_id, cycle))
+    if error:
+        return error
+    results = r.json().get("results", [])
+
+    if not results:
+        return {"error": f"No results found for candidate ID {fec_id}", "status_code": r.status_code}
+
+    return principal_committee_id(results[0])
+
+@_fec_cached_async("top_contributors", fetch_fec_top_contributors)
+async def fetch_fec_top_contributors_async(committee_id, cycle=2024):
+    stored = await asyncio.to_thread(fec_store.read_employer_totals, committee_id, cycle)
+    if stored is not None:
+        return top_employer_totals(stored)
+
+    r, error = await _fec_get_async(*_top_contributors_request(committee_id, cycle))
+    if error:
+        return error
+    return top_employer_totals(r.json().get("results", []))
@@ -0,0 +1,125 @@
+"""
+Nightly FEC ingestion job.
+
+Pulls totals, by-state and by-employer aggregates for every current member of
+Congress into the local store (fec_store.py), so the API serves campaign
+finance data without calling the FEC API on the request path.
+
+Run from the backend directory, e.g. nightly from cron:
+
+    python -m functions.fec_ingest                  # current cycle
+    python -m functions.fec_ingest --cycle 2024 --cycle 2026
+"""
+import argparse
+import os
+import sys
+import time
+from . import fec_store, http_client
+from .fec_finance import (
+    FEC_API_BASE, FEC_API_KEY, current_cycle, load_legislators, principal_committee_id, refresh_legislators
+)
+
+# Pages of 100 rows pulled per aggregate endpoint
+INGEST_MAX_PAGES = int(os.getenv("FEC_INGEST_MAX_PAGES", "3"))
+# The job runs unattended, so it waits as long as the FEC quota requires
+INGEST_RATE_LIMIT_WAIT = float(os.getenv("FEC_INGEST_RATE_LIMIT_WAIT", "3600"))
+
+
+class FecIngestError(Exception):
+    """Raised when the FEC API returns an error response during ingestion"""
+
+
+def fetch_all_pages(path, params, max_pages=INGEST_MAX_PAGES):
+    """
+    Fetch up to max_pages pages of results from an FEC endpoint.
+
+    Follows `last_indexes` cursors (itemized schedules) or page numbers
+    (aggregate endpoints), whichever the response's pagination block uses.
+    """
+    params = {"api_key": FEC_API_KEY, "per_page": 100, **params}
+    results = []
+    page_count = 0
+
+    while page_count < max_pages:
+        r = http_client.get(f"{FEC_API_BASE}{path}", params=params, timeout=30, rate_limit_wait=INGEST_RATE_LIMIT_WAIT)
+        if r.status_code != 200:
+            raise FecIngestError(f"{path} returned {r.status_code}: {r.text[:200]}")
+        data = r.json()
+        page_count += 1
+
+        page_results = data.get("results") or []
+        results.extend(page_results)
+        if not page_results:
+            break
+
+        # Check if there are more pages
+        pagination = data.get("pagination") or {}
+        if pagination.get("last_indexes"):
+            for key, value in pagination["last_indexes"].items():
+                params[key] = value
+        elif pagination.get("page", 1) < pagination.get("pages", 1):
+            params["page"] = pagination["page"] + 1
+        else:
+            break
+
+    return results
+
+
+def ingest_candidate(conn, fec_id, cycle):
+    """Fetch and store every aggregate the API serves for one FEC candidate id and cycle"""
+    totals = fetch_all_pages(f"/candidate/{fec_id}/totals/", {"cycle": cycle})
+    fec_store.write_totals(conn, fec_id, cycle, totals)
+
+    state_totals = fetch_all_pages("/schedules/schedule_a/by_state/by_candidate/", {
+        "cycle": cycle, "candidate_id": fec_id, "election_full": "false", "sort": "-total"
+    })
+    fec_store.write_state_totals(conn, fec_id, cycle, state_totals)
+
+    candidates = fetch_all_pages("/candidates/search/", {"cycle": cycle, "candidate_id": fec_id}, max_pages=1)
+    committee_id = principal_committee_id(candidates[0]) if candidates else None
+    fec_store.write_primary_committee(conn, fec_id, cycle, committee_id)
+
+    if committee_id:
+        employer_totals = fetch_all_pages("/schedules/schedule_a/by_employer/", {
+            "cycle": cycle, "committee_id": committee_id, "sort": "-total"
+        })
+        fec_store.write_employer_totals(conn, committee_id, cycle, employer_totals)
+
+
+def run(cycles, limit=None):
+    """
+    Ingest every current member's FEC ids for the given cycles.
+
+    Returns:
+        Number of (FEC id, cycle) pairs that failed
+    """
+    refresh_legislators()
+    members = load_legislators()[:limit]
+    conn = fec_store.open_store()
+
+    jobs = [(fec_id, cycle) for person in members for fec_id in person.get("id", {}).get("fec", []) for cycle in cycles]
+    print(f"Ingesting {len(jobs)} candidate cycles for {len(members)} members into {fec_store.FEC_STORE_PATH}")
+
+    started = time.monotonic()
+    failed = 0
+    for i, (fec_id, cycle) in enumerate(jobs, 1):
+        try:
+            ingest_candidate(conn, fec_id, cycle)
+            print(f"✓ {i}/{len(jobs)} {fec_id} {cycle}")
+        except Exception as e:
+            failed += 1
+            print(f"✗ {i}/{len(jobs)} {fec_id} {cycle} failed: {http_client.redact(e)}")
+
+    print(f"\n{'='*60}")
+    print(f"Total: {len(jobs)} | Success: {len(jobs) - failed} | Failed: {failed} | {time.monotonic() - started:.0f}s")
+    print(f"{'='*60}")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest FEC aggregates for current members into the local store")
+    parser.add_argument("--cycle", type=int, action="append", help="Cycle to ingest (repeatable, default: current cycle)")
+    parser.add_argument("--limit", type=int, help="Only ingest the first N members (for testing)")
+    args = parser.parse_args()
+
+    sys.exit(1 if run(args.cycle or [current_cycle()], args.limit) else 0)
@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Local SQLite store filled by the nightly FEC ingestion job (fec_ingest.py).
+# The fetchers in fec_finance.py read from here first and only call the live
+# FEC API when a (candidate or committee, cycle) hasn't been ingested recently.
+
+FEC_STORE_PATH = os.getenv(
+    "FEC_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "fec_store.sqlite3")
+)
+# Ingested rows older than this are ignored so a stalled job falls back to live calls
+FEC_STORE_MAX_AGE = float(os.getenv("FEC_STORE_MAX_AGE", str(3 * 86400)))
+
+SCHEMA = """
+create table if not exists ingested (
+  kind text not null,
+  id text not null,
+  cycle integer not null,
+  ingested_at real not null,
+  primary key (kind, id, cycle)
+);
+create table if not exists candidate_totals (
+  fec_id text not null,
+  cycle integer not null,
+  raw text not null,
+  primary key (fec_id, cycle)
+);
+create table if not exists candidate_state_totals (
+  fec_id text not null,
+  cycle integer not null,
+  state text,
+  total real,
+  primary key (fec_id, cycle, state)
+);
+create table if not exists candidate_committees (
+  fec_id text not null,
+  cycle integer not null,
+  committee_id text,
+  primary key (fec_id, cycle)
+);
+create table if not exists committee_employer_totals (
+  committee_id text not null,
+  cycle integer not null,
+  employer text,
+  total real
+);
+create index if not exists committee_employer_totals_lookup
+  on committee_employer_totals (committee_id, cycle, total desc);
+"""
+
+_local = threading.local()
+
+
+def _connect():
+    """Return this thread's connection, or None if the store hasn't been built yet"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        if not os.path.exists(FEC_STORE_PATH):
+            return None
+        conn = sqlite3.connect(FEC_STORE_PATH, timeout=30)
+        conn.execute("pragma journal_mode=wal")
+        _local.conn = conn
+    return conn
+
+
+def open_store():
+    """Open the store for writing, creating the file and tables if needed"""
+    os.makedirs(os.path.dirname(FEC_STORE_PATH), exist_ok=True)
+    conn = sqlite3.connect(FEC_STORE_PATH, timeout=30)
+    conn.execute("pragma journal_mode=wal")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _is_fresh(conn, kind, key_id, cycle):
+    row = conn.execute(
+        "select ingested_at from ingested where kind = ? and id = ? and cycle = ?", (kind, key_id, cycle)
+    ).fetchone()
+    return row is not None and time.time() - row[0] < FEC_STORE_MAX_AGE
+
+
+def _read(kind, key_id, cycle, query):
+    conn = _connect()
+    if conn is None:
+        return None
+    try:
+        if not _is_fresh(conn, kind, key_id, int(cycle)):
+            return None
+        return conn.execute(query, (key_id, int(cycle))).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error reading FEC store: {e}")
+        return None
+
+
+# Readers return None when the store has nothing fresh for the key, so callers fall back to the live API
+
+def read_totals(fec_id, cycle):
+    """Raw /candidate/<id>/totals/ rows"""
+    rows = _read("totals", fec_id, cycle, "select raw from candidate_totals where fec_id = ? and cycle = ?")
+    return json.loads(rows[0][0]) if rows else None
+
+def read_state_totals(fec_id, cycle):
+    """By-state receipts as {"state", "total"} rows, largest first"""
+    rows = _read("state_totals", fec_id, cycle,
+                 "select state, total from candidate_state_totals where fec_id = ? and cycle = ? order by total desc")
+    return None if rows is None else [{"state": state, "total": total} for state, total in rows]
+
+def read_primary_committee(fec_id, cycle):
+    """{"committee_id": ...}; committee_id is None when the candidate has no principal committee"""
+    rows = _read("committee", fec_id, cycle,
+                 "select committee_id from candidate_committees where fec_id = ? and cycle = ?")
+    return {"committee_id": rows[0][0]} if rows else None
+
+def read_employer_totals(committee_id, cycle):
+    """By-employer receipts as {"employer", "total"} rows, largest first"""
+    rows = _read("employer_totals", committee_id, cycle,
+                 "select employer, total from committee_employer_totals where committee_id = ? and cycle = ? order by total desc")
+    return None if rows is None else [{"employer": employer, "total": total} for employer, total in rows]
+
+
+# Writers replace everything stored for a key and mark it ingested, in one transaction
+
+def _mark(conn, kind, key_id, cycle):
+    conn.execute("insert or replace into ingested values (?, ?, ?, ?)", (kind, key_id, cycle, time.time()))
+
+def write_totals(conn, fec_id, cycle, rows):
+    with conn:
+        conn.execute("insert or replace into candidate_totals values (?, ?, ?)", (fec_id, cycle, json.dumps(rows)))
+        _mark(conn, "totals", fec_id, cycle)
+
+def write_state_totals(conn, fec_id, cycle, rows):
+    with conn:
+        conn.execute("delete from candidate_state_totals where fec_id = ? and cycle = ?", (fec_id, cycle))
+        conn.executemany("insert or replace into candidate_state_totals values (?, ?, ?, ?)",
+                         [(fec_id, cycle, row.get("state"), row.get("total")) for row in rows])
+        _mark(conn, "state_totals", fec_id, cycle)
+
+def write_primary_committee(conn, fec_id, cycle, committee_id):
+    with conn:
+        conn.execute("insert or replace into candidate_committees values (?, ?, ?)", (fec_id, cycle, committee_id))
+        _mark(conn, "committee", fec_id, cycle)
+
+def write_employer_totals(conn, committee_id, cycle, rows):
+    with conn:
+        conn.execute("delete from committee_employer_totals where committee_id = ? and cycle = ?", (committee_id, cycle))
+        conn.executemany("insert into committee_employer_totals values (?, ?, ?, ?)",
+                         [(committee_id, cycle, row.get("employer"), row.get("total")) for row in rows])
+        _mark(conn, "employer_totals", committee_id, cycle)
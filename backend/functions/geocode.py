@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import os
+import re
+import httpx
+import requests
+from dotenv import load_dotenv
+from cache import get_cache, MISSING, SingleFlight
+from constants import STATE_FULL
+from . import http_client
+from .district_resolver import resolve_point
+from .fec_finance import get_members_by_state, get_members_by_district
+from .state_legislators import has_state, members_for
+
+load_dotenv()
+GEOCODIO_KEY = os.getenv("GEOCODIO_KEY")
+
+GEOCODIO_URL = "https://api.geocod.io/v1.9"
+GEOCODIO_FIELDS = "cd,stateleg,school"
+
+# Parsed Geocodio responses are cached so repeat lookups skip the paid API.
+# Keys are users' addresses, so the cache is in memory by default and gone on
+# restart; GEOCODE_CACHE_BACKEND=sqlite keeps them on disk for up to
+# GEOCODE_CACHE_TTL (purge with python -m functions.geocode --purge).
+GEOCODE_CACHE_TTL = float(os.getenv("GEOCODE_CACHE_TTL", str(30 * 86400)))
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "50000"))
+GEOCODE_CACHE_BACKEND = os.getenv("GEOCODE_CACHE_BACKEND", "memory")
+# Decimal places kept when bucketing reverse lookups (3 places is roughly 100m)
+GEOCODE_COORD_PRECISION = int(os.getenv("GEOCODE_COORD_PRECISION", "3"))
+
+_geocode_cache = get_cache("geocode", maxsize=GEOCODE_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL, backend=GEOCODE_CACHE_BACKEND)
+# Concurrent lookups of the same normalized query or coordinate bucket share one Geocodio call
+_geocode_flights = SingleFlight()
+
+
+# Lowercase, drop punctuation and collapse whitespace so "04101", " 04101 " and
+# "123 Main St., Portland" / "123 main st portland" share a cache entry
+def normalize_query(query):
+    return " ".join(re.sub(r"[^\w\s-]", " ", query.lower()).split())
+
+# Round coordinates so nearby reverse lookups share a cache entry
+def coordinate_bucket(lat, lng, precision=GEOCODE_COORD_PRECISION):
+    return round(float(lat), precision), round(float(lng), precision)
+
+# Turn the first Geocodio result into the payload /api/geocode returns, or None if there are no results
+def parse_geocodio_response(data):
+    if data.get("results"):
+        result = data["results"][0]
+        location = result["location"]
+        components = result["address_components"]
+        cd_fields = result.get("fields", {}).get("congressional_districts", [])
+        state_house_fields = result.get("fields", {}).get("state_legislative_districts", {}).get("house", [])
+        state_senate_fields = result.get("fields", {}).get("state_legislative_districts", {}).get("senate", [])
+        sd_fields = result.get("fields", {}).get("school_districts", {}).get("unified", {})
+        
+        fed_legislators = []
+        if cd_fields:
+            for leg in cd_fields[0].get("current_legislators", []):
+                fed_legislators.append({
+                    "name": f"{leg['bio']['first_name']} {leg['bio']['last_name']}",
+                    "role": "sen" if leg["type"] == "senator" else "rep",
+                    "party": leg["bio"]["party"],
+                    "bio_id": leg["references"]["bioguide_id"],
+                    "photo_url": leg["bio"]["photo_url"],
+                    "district": cd_fields[0].get("district_number") if leg["type"] == "representative" else None,
+                    "phone": leg["contact"]["phone"],
+                    "website": leg["contact"]["url"]
+                })
+        state_house_legislators = []
+        if state_house_fields:
+            for leg in state_house_fields[0].get("current_legislators", []):
+                state_house_legislators.append({
+                    "name": f"{leg['bio']['first_name']} {leg['bio']['last_name']}",
+                    "role": "rep" if leg["type"] == "representative" else "tribal_rep",
+                    "party": leg["bio"]["party"],
+                    "openstates_id": leg["references"]["openstates_id"],
+                    "photo_url": leg["bio"]["photo_url"],
+                    "district": state_house_fields[0].get("name"),
+                    "phone": leg["contact"]["phone"],
+                    "email": leg["contact"].get("email"),
+                    "website": leg["contact"]["url"]
+                })
+
+        state_senate_legislators = []
+        if state_senate_fields:
+            for leg in state_senate_fields[0].get("current_legislators", []):
+                state_senate_legislators.append({
+                    "name": f"{leg['bio']['first_name']} {leg['bio']['last_name']}",
+                    "role": "sen" if leg["type"] == "senator" else "unknown",
+                    "party": leg["bio"]["party"],
+                    "openstates_id": leg["references"]["openstates_id"],
+                    "photo_url": leg["bio"]["photo_url"],
+                    "district": state_senate_fields[0].get("name"),
+                    "phone": leg["contact"]["phone"],
+                    "email": leg["contact"].get("email"),
+                    "website": leg["contact"]["url"]
+                })
+        
+        return {
+            "lat": location["lat"],
+            "lng": location["lng"],
+            "state": components["state"],
+            "state_full": STATE_FULL.get(components["state"], components["state"]),
+            "zip": components.get("zip"),
+            "county": components.get("county"),
+            "city": components.get("city"),
+            "fed_legislators": fed_legislators,
+            "state_house_legislators": state_house_legislators,
+            "state_senate_legislators": state_senate_legislators,
+            "school_district": sd_fields.get("name") if sd_fields else None
+        }
+
+    return None
+
+class GeocodingError(Exception):
+    """A Geocodio request failed. The message has the API key masked."""
+
+# URL and params of a Geocodio lookup for an address/ZIP, or a reverse lookup for lat/lng.
+# params carries the API key: never log or return them, or errors that quote the URL, unredacted.
+def _geocodio_request(query=None, lat=None, lng=None):
+    params = {"fields": GEOCODIO_FIELDS, "api_key": GEOCODIO_KEY}
+    if query:
+        url = f"{GEOCODIO_URL}/geocode"
+        params["q"] = query
+    else:
+        url = f"{GEOCODIO_URL}/reverse"
+        params["q"] = f"{lat},{lng}"
+    return url, params
+
+# Call Geocodio for an address/ZIP, or reverse geocode lat/lng
+def fetch_geocodio(query=None, lat=None, lng=None):
+    url, params = _geocodio_request(query, lat, lng)
+    try:
+        resp = http_client.get(url, params=params, timeout=10)
+    except requests.RequestException as e:
+        # The exception text quotes the request URL, api_key included; drop the cause too
+        raise GeocodingError(http_client.redact(e)) from None
+    return parse_geocodio_response(resp.json())
+
+# fetch_geocodio() through the async HTTP client, for the ASGI app
+async def fetch_geocodio_async(query=None, lat=None, lng=None):
+    url, params = _geocodio_request(query, lat, lng)
+    try:
+        resp = await http_client.get_async(url, params=params, timeout=10)
+    except (httpx.HTTPError, requests.RequestException) as e:
+        raise GeocodingError(http_client.redact(e)) from None
+    return parse_geocodio_response(resp.json())
+
+# Federal legislator entry in the same shape parse_geocodio_response builds, from the legislators snapshot
+def _fed_legislator(person):
+    term = person["terms"][-1]
+    bio_id = person["id"]["bioguide"]
+    return {
+        "name": f"{person['name'].get('first')} {person['name'].get('last')}",
+        "role": term.get("type"),
+        "party": term.get("party"),
+        "bio_id": bio_id,
+        "photo_url": f"https://bioguide.congress.gov/bioguide/photo/{bio_id[0]}/{bio_id}.jpg",
+        "district": term.get("district") if term.get("type") == "rep" else None,
+        "phone": term.get("phone"),
+        "website": term.get("url")
+    }
+
+# Reverse geocode from local boundary files (see district_resolver.py), or None if they can't answer.
+# State legislator contacts come from the Open States files (see state_legislators.py); when those
+# aren't loaded for the state, state_legislators_available is False and the page says so.
+def reverse_geocode_offline(lat, lng):
+    found = resolve_point(lat, lng)
+    # No congressional district means the point fell outside the loaded districts, not an at-large seat
+    if not found or found["congressional_district"] is None:
+        return None
+
+    state = found["state"]
+    senators = [p for p in get_members_by_state(state) if p["terms"][-1].get("type") == "sen"]
+    reps = get_members_by_district(state, found["congressional_district"])
+    state_house = members_for(state, "state_house", found["state_house_code"], found["state_house_district"])
+    state_senate = members_for(state, "state_senate", found["state_senate_code"], found["state_senate_district"])
+    return {
+        "lat": lat,
+        "lng": lng,
+        "state": state,
+        "state_full": STATE_FULL.get(state, state),
+        "zip": None,
+        "county": found["county"],
+        "city": None,
+        "fed_legislators": [_fed_legislator(p) for p in senators + reps],
+        "state_house_legislators": state_house,
+        "state_senate_legislators": state_senate,
+        "state_legislators_available": has_state(state),
+        "state_house_district": found["state_house_district"],
+        "state_senate_district": found["state_senate_district"],
+        "school_district": found["school_district"]
+    }
+
+# Whether an offline answer can be served: it needs the federal legislators, which are
+# missing until the legislators snapshot has loaded. State legislators are optional.
+def _offline_complete(result):
+    return bool(result and result["fed_legislators"])
+
+# Cache key of a lookup: normalized query text, or the rounded coordinates
+def _cache_key(query=None, lat=None, lng=None):
+    if query:
+        return ("q", normalize_query(query))
+    return ("latlng",) + coordinate_bucket(lat, lng)
+
+# Geocode an address/ZIP or reverse geocode lat/lng, serving repeats from the cache.
+# Reverse lookups are answered from local boundary files when they cover the point.
+# Only successful lookups are cached; concurrent identical misses share one call.
+def geocode_lookup(query=None, lat=None, lng=None):
+    key = _cache_key(query, lat, lng)
+    cached = _geocode_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    if not query:
+        offline = reverse_geocode_offline(lat, lng)
+        if _offline_complete(offline):
+            return offline
+
+    def load():
+        result = fetch_geocodio(query=query, lat=lat, lng=lng)
+        if result:
+            _geocode_cache.set(key, result)
+        return result
+    return _geocode_flights.do(key, load)
+
+# geocode_lookup() for the ASGI app. The Geocodio call is awaited; the point-in-polygon
+# search and SQLite cache reads run in a worker thread so they don't block the event loop.
+async def geocode_lookup_async(query=None, lat=None, lng=None):
+    key = _cache_key(query, lat, lng)
+    cached = await _geocode_cache.get_async(key)
+    if cached is not MISSING:
+        return cached
+
+    if not query:
+        offline = await asyncio.to_thread(reverse_geocode_offline, lat, lng)
+        if _offline_complete(offline):
+            return offline
+
+    async def load():
+        result = await fetch_geocodio_async(query=query, lat=lat, lng=lng)
+        if result:
+            await _geocode_cache.set_async(key, result)
+        return result
+    return await _geocode_flights.do_async(key, load)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Geocode cache maintenance")
+    parser.add_argument("--purge", action="store_true", help="Delete every cached Geocodio result (addresses included)")
+    args = parser.parse_args()
+    if args.purge:
+        print(f"Purged {_geocode_cache.invalidate()} cached geocode results")
+    else:
+        parser.print_help()
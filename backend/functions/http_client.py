@@ -0,0 +1,326 @@
+import asyncio
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+# Shared outbound HTTP client for FEC, Geocodio and GitHub calls: one pooled
+# keep-alive session, retries with jittered backoff, and per-host rate limits
+# shared by every process on the machine.
+# get_async() is the asyncio counterpart used by the ASGI app, with the same
+# retries and the same rate limiters.
+
+# Connections kept open per host
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+# Concurrent connections the async client may open in total
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "200"))
+# Retries for connection errors and 429/5xx responses
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+# Base for exponential backoff between retries, in seconds
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+# Longest a request waits for a rate limit slot before failing fast
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "5"))
+# Longest Retry-After a request sleeps for before retrying. Longer ones (FEC
+# sends up to an hour once the key's quota is spent) end the request and
+# pause the host's rate limiter for that long instead.
+RETRY_AFTER_MAX_WAIT = float(os.getenv("RETRY_AFTER_MAX_WAIT", "10"))
+# "sqlite" (default): each host's rate limit is one bucket shared by every
+# process on this machine (web workers and fec_ingest.py) through
+# RATE_LIMIT_PATH. "memory": one bucket per process.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sqlite")
+RATE_LIMIT_PATH = os.getenv(
+    "RATE_LIMIT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "rate_limits.sqlite3")
+)
+
+# api.data.gov keys default to 1,000 FEC requests per hour
+FEC_RATE_LIMIT_PER_HOUR = int(os.getenv("FEC_RATE_LIMIT_PER_HOUR", "1000"))
+FEC_RATE_LIMIT_BURST = int(os.getenv("FEC_RATE_LIMIT_BURST", "60"))
+GEOCODIO_RATE_LIMIT_PER_MINUTE = int(os.getenv("GEOCODIO_RATE_LIMIT_PER_MINUTE", "1000"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RateLimitExceeded(requests.RequestException):
+    """Raised when a host's rate limit has no slot free within RATE_LIMIT_MAX_WAIT"""
+
+
+_API_KEY_PARAM = re.compile(r"(api_key=)[^&\s'\"]+")
+
+
+def redact(text) -> str:
+    """Mask api_key= query values in a URL or exception message before it is logged or returned"""
+    return _API_KEY_PARAM.sub(r"\1REDACTED", str(text))
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` requests per `per` seconds, with bursts up to `burst`.
+
+    Callers reserve a token up front and sleep until it is due, so concurrent
+    threads are spaced out instead of all firing at once. The bucket lives in
+    this process; SQLiteRateLimiter shares one between processes.
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, rate: int, per: float, burst: int):
+        self.interval = per / rate
+        self.burst = burst
+        self._state = (float(burst), self.clock())
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _bucket(self):
+        """Yield the bucket as [tokens, updated]; changes are saved unless the block raises"""
+        with self._lock:
+            bucket = list(self._state)
+            yield bucket
+            self._state = tuple(bucket)
+
+    def _refill(self, bucket) -> float:
+        now = self.clock()
+        tokens = min(self.burst, bucket[0] + max(now - bucket[1], 0) / self.interval)
+        bucket[:] = [tokens, now]
+        return tokens
+
+    def reserve(self, max_wait: float = RATE_LIMIT_MAX_WAIT) -> float:
+        """Take a token; return seconds until it is due, or raise RateLimitExceeded if over max_wait"""
+        with self._bucket() as bucket:
+            tokens = self._refill(bucket)
+            wait = (1 - tokens) * self.interval if tokens < 1 else 0
+            if wait > max_wait:
+                raise RateLimitExceeded(f"Rate limit reached, next slot in {wait:.1f}s")
+            bucket[0] = tokens - 1
+            return wait
+
+    def pause(self, seconds: float):
+        """Hold every caller off for `seconds`, e.g. after the host answered 429 with Retry-After"""
+        with self._bucket() as bucket:
+            bucket[0] = min(self._refill(bucket), 1 - seconds / self.interval)
+
+    def acquire(self, max_wait: float = RATE_LIMIT_MAX_WAIT):
+        """Wait for a token; raise RateLimitExceeded if it's more than max_wait away"""
+        wait = self.reserve(max_wait)
+        if wait:
+            time.sleep(wait)
+
+    async def reserve_async(self, max_wait: float = RATE_LIMIT_MAX_WAIT) -> float:
+        """reserve() for coroutines; in memory, so it runs inline"""
+        return self.reserve(max_wait)
+
+    async def pause_async(self, seconds: float):
+        """pause() for coroutines; in memory, so it runs inline"""
+        self.pause(seconds)
+
+    async def acquire_async(self, max_wait: float = RATE_LIMIT_MAX_WAIT):
+        """acquire() for coroutines: sleeps without blocking the event loop"""
+        wait = await self.reserve_async(max_wait)
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """
+    RateLimiter whose bucket is a row in a SQLite file, so every process on
+    the host draws from one quota instead of each getting the full rate.
+    Uses wall clock time so the bucket means the same thing in every process.
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, name: str, rate: int, per: float, burst: int, path: str = RATE_LIMIT_PATH):
+        super().__init__(rate, per, burst)
+        self.name = name
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; autocommit mode so _bucket() controls the transaction
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("""
+                create table if not exists rate_limits (
+                  name text primary key,
+                  tokens real not null,
+                  updated real not null
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    async def reserve_async(self, max_wait: float = RATE_LIMIT_MAX_WAIT) -> float:
+        """reserve() in a worker thread: it may wait up to 30s for another process's write lock"""
+        return await asyncio.to_thread(self.reserve, max_wait)
+
+    async def pause_async(self, seconds: float):
+        """pause() in a worker thread, like reserve_async()"""
+        await asyncio.to_thread(self.pause, seconds)
+
+    @contextmanager
+    def _bucket(self):
+        conn = self._connect()
+        # Write lock up front, so two processes can't both take the last token
+        conn.execute("begin immediate")
+        try:
+            row = conn.execute("select tokens, updated from rate_limits where name = ?", (self.name,)).fetchone()
+            bucket = list(row) if row else [float(self.burst), self.clock()]
+            yield bucket
+            conn.execute("insert or replace into rate_limits values (?, ?, ?)", (self.name, *bucket))
+            conn.execute("commit")
+        except BaseException:
+            conn.execute("rollback")
+            raise
+
+
+def _rate_limiter(host: str, rate: int, per: float, burst: int) -> RateLimiter:
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteRateLimiter(host, rate, per, burst)
+    if RATE_LIMIT_BACKEND == "memory":
+        return RateLimiter(rate, per, burst)
+    raise ValueError(f"Unknown rate limit backend: {RATE_LIMIT_BACKEND}")
+
+
+RATE_LIMITS = {
+    "api.open.fec.gov": _rate_limiter("api.open.fec.gov", FEC_RATE_LIMIT_PER_HOUR, 3600, FEC_RATE_LIMIT_BURST),
+    "api.geocod.io": _rate_limiter("api.geocod.io", GEOCODIO_RATE_LIMIT_PER_MINUTE, 60, GEOCODIO_RATE_LIMIT_PER_MINUTE),
+}
+
+
+def _retry_after(headers) -> float:
+    """Seconds from a Retry-After header (delta-seconds form), or 0 when absent or unparseable"""
+    try:
+        return max(float(headers.get("Retry-After") or 0), 0)
+    except ValueError:
+        return 0
+
+
+class _Retry(Retry):
+    """Retry that sleeps for short Retry-After values and hands back the response on long ones"""
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if response is not None and _retry_after(response.headers) > RETRY_AFTER_MAX_WAIT:
+            # Caught by urllib3, which returns this response (raise_on_status=False)
+            raise MaxRetryError(_pool, redact(url), "Retry-After longer than RETRY_AFTER_MAX_WAIT")
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def _honor_retry_after(limiter, response):
+    """After a 429 with Retry-After, pause the host's limiter so no process sends until then"""
+    if limiter and response.status_code == 429:
+        seconds = _retry_after(response.headers)
+        if seconds:
+            limiter.pause(seconds)
+
+
+async def _honor_retry_after_async(limiter, response):
+    """_honor_retry_after() for coroutines"""
+    if limiter and response.status_code == 429:
+        seconds = _retry_after(response.headers)
+        if seconds:
+            await limiter.pause_async(seconds)
+
+
+def _build_session() -> requests.Session:
+    retry = _Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        backoff_jitter=HTTP_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        # Short Retry-After values are slept; long ones return the response (see _Retry)
+        respect_retry_after_header=True,
+        # Hand the last response back so callers can report its status code
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = _build_session()
+
+
+def get(url: str, params: dict = None, headers: dict = None, timeout: float = 10,
+        rate_limit_wait: float = RATE_LIMIT_MAX_WAIT) -> requests.Response:
+    """
+    GET through the shared session, waiting on the host's rate limit first.
+
+    Args:
+        rate_limit_wait: Longest to wait for a rate limit slot; batch jobs pass a large value
+
+    Raises:
+        RateLimitExceeded: no rate limit slot within rate_limit_wait
+        requests.RequestException: connection failed after all retries
+    """
+    limiter = RATE_LIMITS.get(urlsplit(url).hostname)
+    if limiter:
+        limiter.acquire(rate_limit_wait)
+    response = _session.get(url, params=params, headers=headers, timeout=timeout)
+    _honor_retry_after(limiter, response)
+    return response
+
+
+_async_client = {"client": None}
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    # Created on first use so it binds to the serving event loop
+    if _async_client["client"] is None:
+        limits = httpx.Limits(max_connections=ASYNC_HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_POOL_SIZE)
+        # The transport retries failed connections; status retries are in get_async()
+        transport = httpx.AsyncHTTPTransport(retries=HTTP_RETRIES, limits=limits)
+        _async_client["client"] = httpx.AsyncClient(transport=transport)
+    return _async_client["client"]
+
+
+async def get_async(url: str, params: dict = None, headers: dict = None, timeout: float = 10,
+               rate_limit_wait: float = RATE_LIMIT_MAX_WAIT) -> httpx.Response:
+    """
+    Async GET through the shared httpx client, waiting on the host's rate limit first.
+
+    Connection errors are retried by the transport; 429/5xx responses are
+    retried here with the same jittered backoff and Retry-After handling as
+    the sync session, and the last response is returned if they keep failing.
+
+    Raises:
+        RateLimitExceeded: no rate limit slot within rate_limit_wait
+        httpx.HTTPError: connection failed after all retries
+    """
+    limiter = RATE_LIMITS.get(urlsplit(url).hostname)
+    if limiter:
+        await limiter.acquire_async(rate_limit_wait)
+
+    client = _get_async_client()
+    for attempt in range(HTTP_RETRIES + 1):
+        response = await client.get(url, params=params, headers=headers, timeout=timeout)
+        retry_after = _retry_after(response.headers)
+        if (response.status_code not in RETRY_STATUSES or attempt == HTTP_RETRIES
+                or retry_after > RETRY_AFTER_MAX_WAIT):
+            break
+        await asyncio.sleep(retry_after or HTTP_BACKOFF * 2 ** attempt + random.uniform(0, HTTP_BACKOFF))
+    await _honor_retry_after_async(limiter, response)
+    return response
+
+
+async def aclose():
+    """Close the async client's connections (on ASGI shutdown)"""
+    client = _async_client["client"]
+    _async_client["client"] = None
+    if client is not None:
+        await client.aclose()
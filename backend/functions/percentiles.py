@@ -0,0 +1,190 @@
+"""
+Percentile ranks of every county (within its state and nationally) and every
+state (nationally) for each census metric and year.
+
+The ranks are computed offline in bulk with pandas from the cleaned census
+CSVs and saved as a compact NumPy file. At serve time that file is loaded once
+and category payloads look their rows up in memory; no query per request.
+
+Build after new census data is cleaned, from the backend directory:
+
+    python -m functions.percentiles
+"""
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLEANED_DATA_DIR = os.getenv(
+    "CLEANED_DATA_DIR", os.path.join(os.path.dirname(_BACKEND_DIR), "data_processing", "cleaned_data")
+)
+PERCENTILES_PATH = os.getenv("PERCENTILES_PATH", os.path.join(_BACKEND_DIR, "data", "percentiles.npz"))
+
+# Source table -> cleaned CSV the ranks are computed from
+TABLES = {
+    "census_data": "census_data.csv",
+    "census_economic_data": "census_economic_data.csv"
+}
+# Category payload -> table its rows come from
+CATEGORY_TABLES = {
+    "demographics": "census_data",
+    "education": "census_data",
+    "health": "census_data",
+    "economy": "census_economic_data"
+}
+# Columns that identify a row rather than measure something
+ID_COLUMNS = {"GEOID", "NAME", "state_name", "state", "county", "geography", "year", "county_fips"}
+# Stored in place of a percentile when the value is missing
+MISSING = 255
+
+
+def _county_fips(frame):
+    """5-digit county_fips like upload_to_supabase.py: counties from GEOID, states as FIPS + "000" """
+    geoid = frame["GEOID"].astype(str).str.zfill(2)
+    return np.where(frame["geography"] == "county", geoid.str.zfill(5), geoid.str[:2] + "000")
+
+
+def _as_percentile(ranks):
+    """0-1 pct ranks -> uint8 0-100, with MISSING for NaN"""
+    return np.where(np.isnan(ranks), MISSING, np.rint(ranks * 100)).astype(np.uint8)
+
+
+def compute_table(frame):
+    """
+    Rank every metric column of one table in bulk.
+
+    Counties are ranked among counties in the same state and year, and among
+    all counties that year. States are ranked among states that year.
+
+    Returns:
+        Dict of arrays: fips, year, metrics, state (n x metrics), national (n x metrics)
+    """
+    frame = frame[frame["geography"].isin(["county", "state"])].copy()
+    frame["county_fips"] = _county_fips(frame)
+    frame["state_fips"] = frame["county_fips"].str[:2]
+    metrics = [c for c in frame.columns if c not in ID_COLUMNS | {"state_fips"} and pd.api.types.is_numeric_dtype(frame[c])]
+
+    values = frame[metrics]
+    national = values.groupby([frame["geography"], frame["year"]]).rank(pct=True)
+    in_state = values.groupby([frame["geography"], frame["year"], frame["state_fips"]]).rank(pct=True)
+    # Within-state ranks only mean something for counties
+    in_state[frame["geography"].to_numpy() == "state"] = np.nan
+
+    return {
+        "fips": frame["county_fips"].to_numpy(dtype="U5"),
+        "year": frame["year"].to_numpy(dtype=np.int16),
+        "metrics": np.array(metrics, dtype="U64"),
+        "state": _as_percentile(in_state.to_numpy(dtype=float)),
+        "national": _as_percentile(national.to_numpy(dtype=float))
+    }
+
+
+def build(data_dir=CLEANED_DATA_DIR, path=PERCENTILES_PATH):
+    """Compute ranks for every table in TABLES and write them to path"""
+    arrays = {}
+    for table, filename in TABLES.items():
+        csv_path = os.path.join(data_dir, filename)
+        frame = pd.read_csv(csv_path, dtype={"GEOID": str})
+        for name, array in compute_table(frame).items():
+            arrays[f"{table}__{name}"] = array
+        print(f"✓ {table}: {len(frame)} rows, {len(arrays[f'{table}__metrics'])} metrics")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(f"{path}.tmp", path)
+    print(f"Wrote {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+
+
+class PercentileTable:
+    """In-memory ranks for one table, indexed by (county_fips, year)"""
+
+    def __init__(self, fips, year, metrics, state, national):
+        self.metrics = {metric: i for i, metric in enumerate(metrics.tolist())}
+        self.index = {(f, int(y)): i for i, (f, y) in enumerate(zip(fips.tolist(), year.tolist()))}
+        self.state = state
+        self.national = national
+
+    def lookup(self, fips, year, columns):
+        """{metric: {"state", "national"}} for the metrics among columns, or None if the row isn't ranked"""
+        i = self.index.get((fips, int(year)))
+        if i is None:
+            return None
+        out = {}
+        for column in columns:
+            j = self.metrics.get(column)
+            if j is None:
+                continue
+            ranks = {}
+            if self.state[i, j] != MISSING:
+                ranks["state"] = int(self.state[i, j])
+            if self.national[i, j] != MISSING:
+                ranks["national"] = int(self.national[i, j])
+            if ranks:
+                out[column] = ranks
+        return out
+
+
+_state = {"tables": None, "mtime": None}
+_lock = threading.Lock()
+
+
+def _load_tables():
+    """Return {table: PercentileTable}, reloading when the file is rebuilt; {} if it doesn't exist"""
+    try:
+        mtime = os.stat(PERCENTILES_PATH).st_mtime
+    except OSError:
+        return {}
+    if mtime != _state["mtime"]:
+        with _lock:
+            if mtime != _state["mtime"]:
+                try:
+                    with np.load(PERCENTILES_PATH, allow_pickle=False) as data:
+                        _state["tables"] = {
+                            table: PercentileTable(*(data[f"{table}__{name}"] for name in ("fips", "year", "metrics", "state", "national")))
+                            for table in TABLES if f"{table}__fips" in data
+                        }
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Error loading percentiles: {e}")
+                    _state["tables"] = {}
+                _state["mtime"] = mtime
+    return _state["tables"]
+
+
+def percentiles_for(fips, data):
+    """
+    Percentile ranks for the rows of a category payload.
+
+    Args:
+        fips: county_fips of the place (state FIPS + "000" for states)
+        data: Payload data dict of category -> rows
+
+    Returns:
+        {category: {year: {metric: {"state": 0-100, "national": 0-100}}}} for
+        categories and years that have ranks; {} when none are built
+    """
+    tables = _load_tables()
+    if not tables or not fips:
+        return {}
+
+    out = {}
+    for category, rows in data.items():
+        table = tables.get(CATEGORY_TABLES.get(category))
+        if table is None:
+            continue
+        by_year = {}
+        for row in rows:
+            # Rows include the national comparison row, which isn't ranked
+            if row.get("year") is None or row.get("state") == "US":
+                continue
+            ranks = table.lookup(fips, row["year"], row.keys())
+            if ranks:
+                by_year[str(int(row["year"]))] = ranks
+        if by_year:
+            out[category] = by_year
+    return out
+
+
+if __name__ == "__main__":
+    build()
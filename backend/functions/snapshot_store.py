@@ -0,0 +1,123 @@
+import gzip
+import json
+import os
+import threading
+from werkzeug.http import generate_etag
+from payloads import encode_json
+
+try:
+    import brotli
+except ImportError:  # optional; snapshots are still built and served with gzip
+    brotli = None
+
+# Precomputed /api/state and /api/county payloads, written by build_snapshots.py.
+# Each payload is stored already encoded as JSON, gzip and (if the brotli package
+# is installed) brotli, under a content hash, and manifest.json maps every
+# "state/<ABBR>" or "county/<FIPS>" key to its hash. Serving one is a file read.
+
+SNAPSHOT_DIR = os.getenv(
+    "SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "snapshots")
+)
+MANIFEST_PATH = os.path.join(SNAPSHOT_DIR, "manifest.json")
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+_manifest = {"mtime": None, "entries": {}}
+_lock = threading.Lock()
+
+
+def encode_payload(payload) -> bytes:
+    """Serialize a payload exactly as the live routes do (encode_json() plus jsonify's trailing newline)"""
+    return encode_json(payload) + b"\n"
+
+def content_hash(body: bytes) -> str:
+    """Hash of an encoded payload; also its ETag, the same one the live routes compute for that body"""
+    return generate_etag(body)
+
+def _blob_path(key, digest, suffix=""):
+    return os.path.join(SNAPSHOT_DIR, f"{key}.{digest}.json{suffix}")
+
+
+def _load_manifest():
+    """Return the manifest entries, rereading the file when a rebuild replaced it"""
+    try:
+        mtime = os.stat(MANIFEST_PATH).st_mtime
+    except OSError:
+        return {}
+    if mtime != _manifest["mtime"]:
+        with _lock:
+            if mtime != _manifest["mtime"]:
+                try:
+                    with open(MANIFEST_PATH) as f:
+                        _manifest["entries"] = json.load(f).get("entries", {})
+                except (OSError, ValueError) as e:
+                    print(f"Error reading snapshot manifest: {e}")
+                    _manifest["entries"] = {}
+                _manifest["mtime"] = mtime
+    return _manifest["entries"]
+
+
+def get_snapshot(key: str):
+    """
+    Look up a snapshot by key ("state/ME", "county/23031").
+
+    Returns:
+        Manifest entry {"hash", "encodings"}, or None if there's no snapshot
+    """
+    return _load_manifest().get(key)
+
+def read_snapshot(key: str, entry: dict, encoding: str = None):
+    """Return the stored bytes for one encoding (None = plain JSON), or None if the file is gone"""
+    suffix = ENCODINGS.get(encoding, "")
+    try:
+        with open(_blob_path(key, entry["hash"], suffix), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_snapshot(key: str, payload) -> dict:
+    """Write a payload's JSON and precompressed blobs; return its manifest entry"""
+    body = encode_payload(payload)
+    digest = content_hash(body)
+    blobs = {"": body, ".gz": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        blobs[".br"] = brotli.compress(body, quality=11)
+
+    os.makedirs(os.path.dirname(_blob_path(key, digest)), exist_ok=True)
+    for suffix, blob in blobs.items():
+        path = _blob_path(key, digest, suffix)
+        if not os.path.exists(path):
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(blob)
+            os.replace(f"{path}.tmp", path)
+
+    encodings = [encoding for encoding, suffix in ENCODINGS.items() if suffix in blobs]
+    return {"hash": digest, "encodings": encodings}
+
+def write_manifest(entries: dict, built_at: float):
+    """Atomically publish a new manifest, then delete blobs it no longer references"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with open(f"{MANIFEST_PATH}.tmp", "w") as f:
+        json.dump({"built_at": built_at, "entries": entries}, f)
+    os.replace(f"{MANIFEST_PATH}.tmp", MANIFEST_PATH)
+
+    keep = {os.path.basename(_blob_path(key, entry["hash"])) for key, entry in entries.items()}
+    for kind in ("state", "county"):
+        directory = os.path.join(SNAPSHOT_DIR, kind)
+        if not os.path.isdir(directory):
+            continue
+        for filename in os.listdir(directory):
+            base = filename.split(".json")[0] + ".json"
+            if base not in keep:
+                os.remove(os.path.join(directory, filename))
+
+def read_manifest_entries() -> dict:
+    """Entries of the current manifest straight from disk (used by incremental builds)"""
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f).get("entries", {})
+    except (OSError, ValueError):
+        return {}
@@ -0,0 +1,93 @@
+import csv
+import glob
+import os
+import threading
+
+# State legislator contacts for offline reverse geocoding, from the Open States
+# bulk legislator CSVs (https://open.pluralpolicy.com/data/), one file per state
+# named by its abbreviation (me.csv, ...). Members are keyed by chamber and
+# district so they can be matched to the SLDL/SLDU codes in the boundary files.
+
+STATE_LEGISLATORS_DIR = os.getenv(
+    "STATE_LEGISLATORS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "openstates")
+)
+
+# Open States chamber -> boundary layer. Unicameral legislatures (Nebraska, DC)
+# are drawn in the upper-house (SLDU) boundary file.
+CHAMBERS = {"lower": "state_house", "upper": "state_senate", "legislature": "state_senate"}
+ROLES = {"state_house": "rep", "state_senate": "sen"}
+
+
+def district_key(district):
+    """Compare district codes as Open States writes them: "001" and "1" match, names ignore case"""
+    district = str(district or "").strip().upper()
+    if district.isdigit():
+        return district.lstrip("0") or "0"
+    return district
+
+
+def _member(row, layer):
+    links = [link for link in (row.get("links") or "").split(";") if link]
+    return {
+        "name": row.get("name"),
+        "role": ROLES[layer],
+        "party": row.get("current_party"),
+        "openstates_id": row.get("id"),
+        "photo_url": row.get("image") or None,
+        "phone": row.get("capitol_voice") or row.get("district_voice") or None,
+        "email": row.get("email") or None,
+        "website": links[0] if links else None
+    }
+
+
+def load_state_legislators(directory=STATE_LEGISLATORS_DIR):
+    """Read every state CSV in directory into {(state, layer, district key): [member, ...]}"""
+    index = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.csv"))):
+        state = os.path.splitext(os.path.basename(path))[0].upper()
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                layer = CHAMBERS.get(row.get("current_chamber"))
+                if layer:
+                    key = (state, layer, district_key(row.get("current_district")))
+                    index.setdefault(key, []).append(_member(row, layer))
+    return index
+
+
+_state = {"index": None, "states": frozenset(), "started": False}
+_lock = threading.Lock()
+
+
+def _load():
+    try:
+        index = load_state_legislators()
+    except Exception as e:
+        print(f"Error loading state legislators: {e}")
+        return
+    if index:
+        _state["index"] = index
+        _state["states"] = frozenset(state for state, _, _ in index)
+        print(f"Loaded state legislators for {len(_state['states'])} states")
+
+# Load the Open States files in a background thread (safe to call repeatedly)
+def start_state_legislators():
+    with _lock:
+        if _state["started"]:
+            return
+        _state["started"] = True
+    if os.path.isdir(STATE_LEGISLATORS_DIR):
+        threading.Thread(target=_load, name="state-legislators", daemon=True).start()
+
+# Whether contacts were loaded for this state, so an empty district means "none found", not "unknown"
+def has_state(state_abbr):
+    return state_abbr.upper() in _state["states"]
+
+# Members for a state legislative district, in the shape geocode.parse_geocodio_response builds.
+# district_name is the boundary file's name for the district, shown as each member's district.
+def members_for(state_abbr, layer, district_code, district_name=None):
+    index = _state["index"]
+    if index is None or not district_code:
+        return []
+    members = index.get((state_abbr.upper(), layer, district_key(district_code)), [])
+    return [dict(member, district=district_name) for member in members]
@@ -0,0 +1,112 @@
+"""
+Load test for comparing the Flask (app.py) and ASGI (asgi.py) serving paths.
+
+    # 1. Stand-in for Supabase that answers every RPC after a fixed delay
+    python load_test.py upstream --port 9100 --latency 0.1
+
+    # 2. Start either app against it, with the RPC cache off so every request goes upstream
+    export SUPABASE_URL=http://127.0.0.1:9100 RPC_CACHE_TTL=0
+    gunicorn -w 4 -b 127.0.0.1:5002 app:app
+    uvicorn asgi:app --port 5003 --workers 1
+
+    # 3. Fire requests at it
+    python load_test.py run http://127.0.0.1:5002 --requests 2000 --concurrency 200
+
+Point `run` at a real deployment to measure it against Supabase itself.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+DEFAULT_PATH = "/api/county/ME/York?categories=health,economy"
+
+
+## Simulated upstream
+
+def upstream_app(latency: float, rows: int):
+    """ASGI app answering POST /rest/v1/rpc/<function> like PostgREST, after `latency` seconds"""
+    from fastapi import FastAPI
+
+    app = FastAPI()
+
+    @app.post("/rest/v1/rpc/{function_name}")
+    async def rpc(function_name: str):
+        await asyncio.sleep(latency)
+        if function_name == "fetch_counties":
+            return [{"state": "ME", "county": "York County", "county_fips": "23031"}]
+        return [
+            {"state": "ME", "county": "York County", "year": 2023 - i, "value": i * 1.5}
+            for i in range(rows)
+        ]
+
+    return app
+
+
+## Load generator
+
+async def run(base_url: str, path: str, requests: int, concurrency: int, timeout: float):
+    """Send `requests` GETs with at most `concurrency` in flight; return latencies and failures"""
+    latencies = []
+    failures = 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        async def worker():
+            nonlocal failures
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    ok = response.status_code == 200 and not response.json().get("errors")
+                except (httpx.HTTPError, ValueError):
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    failures += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return latencies, failures, elapsed
+
+
+def report(latencies, failures, elapsed):
+    done = len(latencies)
+    print(f"Requests: {done + failures} | OK: {done} | Failed: {failures} | {elapsed:.1f}s")
+    print(f"Throughput: {done / elapsed:.1f} req/s")
+    if done:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"Latency p50: {quantiles[49] * 1000:.0f}ms | p95: {quantiles[94] * 1000:.0f}ms | "
+              f"p99: {quantiles[98] * 1000:.0f}ms | max: {max(latencies) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    upstream = commands.add_parser("upstream", help="Serve a simulated Supabase with fixed latency")
+    upstream.add_argument("--port", type=int, default=9100)
+    upstream.add_argument("--latency", type=float, default=0.1, help="Seconds each RPC takes")
+    upstream.add_argument("--rows", type=int, default=20, help="Rows each RPC returns")
+
+    load = commands.add_parser("run", help="Send requests to a running app")
+    load.add_argument("url", help="Base URL, e.g. http://127.0.0.1:5002")
+    load.add_argument("--path", default=DEFAULT_PATH)
+    load.add_argument("--requests", type=int, default=2000)
+    load.add_argument("--concurrency", type=int, default=200)
+    load.add_argument("--timeout", type=float, default=60)
+
+    args = parser.parse_args()
+    if args.command == "upstream":
+        import uvicorn
+        uvicorn.run(upstream_app(args.latency, args.rows), port=args.port, log_level="warning")
+    else:
+        report(*asyncio.run(run(args.url, args.path, args.requests, args.concurrency, args.timeout)))
@@ -0,0 +1,370 @@
+"""
+Payload building shared by app.py (Flask), asgi.py and functions/build_snapshots.py.
+
+Configuration, query-param parsing and the state/county response builders
+live here rather than in app.py so that importing them has no side effects:
+no background threads are started and no app is created.
+"""
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from time import monotonic
+from dotenv import load_dotenv
+from constants import STATE_FULL
+from database.queries import (
+    fetch_election_state, fetch_election_county,
+    fetch_health_state, fetch_health_county,
+    fetch_demographics_state, fetch_demographics_county,
+    fetch_education_state, fetch_education_county,
+    fetch_economy_state, fetch_economy_county,
+    resolve_county_fips, county_name, state_fips_key, RPCError
+)
+from database.columns import (
+    ELECTION_STATE_COLUMNS, ELECTION_COUNTY_COLUMNS, DEMOGRAPHICS_COLUMNS,
+    HEALTH_COLUMNS, EDUCATION_COLUMNS, ECONOMY_COLUMNS
+)
+from functions.percentiles import percentiles_for
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib encoder
+    orjson = None
+
+# Load environment variables from .env
+load_dotenv()
+
+# Shared secret for cache maintenance endpoints; they are disabled when unset
+CACHE_ADMIN_TOKEN = os.getenv("CACHE_ADMIN_TOKEN")
+
+# Threads in the shared fetch pool (executor below)
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
+# Seconds to wait for each category before reporting it as missing
+CATEGORY_TIMEOUT = float(os.getenv("CATEGORY_TIMEOUT", "8"))
+# Seconds to wait for the FEC calls behind /api/member/<bio_id>/finance
+FINANCE_TIMEOUT = float(os.getenv("FINANCE_TIMEOUT", "20"))
+
+# Cache-Control lifetimes (seconds) sent to browsers and CDNs on read endpoints.
+# Census, health and election data only change on upload; current-cycle FEC
+# data changes daily, closed cycles essentially never.
+CENSUS_HTTP_MAX_AGE = int(os.getenv("CENSUS_HTTP_MAX_AGE", "86400"))
+CENSUS_HTTP_STALE = int(os.getenv("CENSUS_HTTP_STALE", "604800"))
+FEC_HTTP_MAX_AGE = int(os.getenv("FEC_HTTP_MAX_AGE", "300"))
+FEC_HTTP_STALE = int(os.getenv("FEC_HTTP_STALE", "3600"))
+FEC_CLOSED_HTTP_MAX_AGE = int(os.getenv("FEC_CLOSED_HTTP_MAX_AGE", "86400"))
+MEMBER_HTTP_MAX_AGE = int(os.getenv("MEMBER_HTTP_MAX_AGE", "3600"))
+GEOCODE_HTTP_MAX_AGE = int(os.getenv("GEOCODE_HTTP_MAX_AGE", "86400"))
+
+# Body of the 503 the member routes send until the legislators snapshot has
+# loaded (first start on a host, before the first download succeeds)
+LEGISLATORS_LOADING = {"error": "Legislator data is still loading, try again shortly"}
+
+# Most places one /api/batch request may ask for
+MAX_BATCH_GEOGRAPHIES = int(os.getenv("MAX_BATCH_GEOGRAPHIES", "100"))
+# JSON responses at least this many bytes are gzip/brotli compressed when the client accepts it
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "4"))
+# "orjson" (default when installed) or "stdlib"
+JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson" if orjson else "stdlib")
+
+# Bounded pool for fanning out upstream calls within a request. Its threads
+# start on first use, so importing this module doesn't create any.
+executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+
+
+# Mapping of category names to fetch functions
+STATE_FETCHERS = {
+    "civics": fetch_election_state,  
+    "health": fetch_health_state,
+    "demographics": fetch_demographics_state,
+    "education": fetch_education_state,
+    "economy": fetch_economy_state
+}
+
+COUNTY_FETCHERS = {
+    "civics": fetch_election_county,  
+    "health": fetch_health_county,
+    "demographics": fetch_demographics_county,
+    "education": fetch_education_county,
+    "economy": fetch_economy_county
+}
+
+VALID_CATEGORIES = ["civics", "health", "demographics", "education", "economy"]
+
+# Columns each category's SQL functions return, by geography level; fields= may only name these
+CATEGORY_COLUMNS = {
+    "state": {
+        "civics": ELECTION_STATE_COLUMNS,
+        "health": HEALTH_COLUMNS,
+        "demographics": DEMOGRAPHICS_COLUMNS,
+        "education": EDUCATION_COLUMNS,
+        "economy": ECONOMY_COLUMNS
+    },
+    "county": {
+        "civics": ELECTION_COUNTY_COLUMNS,
+        "health": HEALTH_COLUMNS,
+        "demographics": DEMOGRAPHICS_COLUMNS,
+        "education": EDUCATION_COLUMNS,
+        "economy": ECONOMY_COLUMNS
+    }
+}
+
+
+def get_state_full_name(state_abbr: str) -> str:
+    """Get full state name from abbreviation"""
+    return STATE_FULL.get(state_abbr, state_abbr)
+
+
+def fetch_category_data(category: str, geography_type: str, state_abbr: str, county: str = None, filters: dict = None):
+    """
+    Fetch data for a specific category and geography.
+    
+    NOTE: Database structure quirk - state-level rows use the 'county' column 
+    to store the full state name (e.g., state=ME, county=Maine).
+    County-level rows use it normally (e.g., state=ME, county=Cumberland).
+    
+    Args:
+        category: Data category (health, demographics, etc.)
+        geography_type: "state" or "county"
+        state_abbr: State abbreviation (e.g., "ME")
+        county: County name (for county requests) or full state name (for state requests)
+        filters: Optional fields / years / since for this category (see parse_row_filters)
+    
+    Returns:
+        List of results (empty when there is no data)
+    
+    Raises:
+        RPCError: The upstream call failed; fetch_categories() reports it in errors
+    """
+    fetchers = STATE_FETCHERS if geography_type == "state" else COUNTY_FETCHERS
+    fetch_func = fetchers.get(category)
+    
+    if not fetch_func:
+        return []
+    
+    state_full = get_state_full_name(state_abbr)
+    filters = filters or {}
+    
+    if geography_type == "state":
+        # State-level queries need different params based on category
+        if category in ["civics"]:
+            return fetch_func(state_abbr, **filters)
+        return fetch_func(state_abbr, state_full, **filters)
+    # County-level queries
+    return fetch_func(state_abbr, county, **filters)
+
+
+def gather(futures, timeout: float):
+    """
+    Wait for a dict of futures that share one deadline.
+    
+    Args:
+        futures: Dict mapping a key to a Future
+        timeout: Seconds from now the whole batch may take
+    
+    Returns:
+        Tuple of (results dict, errors dict), both keyed like futures.
+        Keys that timed out or raised appear only in errors.
+    """
+    deadline = monotonic() + timeout
+    results = {}
+    errors = {}
+    for key, future in futures.items():
+        try:
+            results[key] = future.result(timeout=max(deadline - monotonic(), 0))
+        except FutureTimeoutError:
+            future.cancel()
+            print(f"Timed out fetching {key} after {timeout}s")
+            errors[key] = "timeout"
+        except Exception as e:
+            print(f"Error fetching {key}: {e}")
+            errors[key] = str(e)
+    return results, errors
+
+
+def fetch_categories(categories, geography_type: str, state_abbr: str, county: str = None, filters: dict = None):
+    """
+    Fetch several categories concurrently on the shared executor.
+    
+    Every category gets at most CATEGORY_TIMEOUT seconds, measured from when the
+    batch was dispatched, so the total wait tracks the slowest RPC rather than
+    the sum of all of them. Categories that time out or raise come back as empty
+    lists and are listed in the returned errors dict.
+    
+    Args:
+        categories: List of category names to fetch
+        geography_type: "state" or "county"
+        state_abbr: State abbreviation (e.g., "ME")
+        county: County name (county requests only)
+        filters: Optional dict of category -> fields / years / since (see parse_row_filters)
+    
+    Returns:
+        Tuple of (data dict keyed by category, errors dict keyed by category)
+    """
+    filters = filters or {}
+    futures = {
+        category: executor.submit(fetch_category_data, category, geography_type, state_abbr, county,
+                                   filters.get(category))
+        for category in categories
+    }
+    results, errors = gather(futures, CATEGORY_TIMEOUT)
+    data = {category: results.get(category, []) for category in categories}
+    return data, errors
+
+
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _parse_years(value: str):
+    """Comma-separated years -> list of ints; raises ValueError on anything else"""
+    return [int(year) for year in value.split(",") if year.strip()]
+
+
+def category_columns(category: str, levels=("state", "county")):
+    """Columns a category returns at every one of the given geography levels ("state", "county")"""
+    columns = [set(CATEGORY_COLUMNS[level][category]) for level in levels]
+    return set.intersection(*columns)
+
+
+def geography_levels(geographies):
+    """Geography levels ("state", "county") a /api/batch request covers"""
+    levels = {"county" if geography.get("county") else "state" for geography in geographies if isinstance(geography, dict)}
+    return sorted(levels) or ["state", "county"]
+
+
+def parse_row_filters(categories, args, levels=("state", "county")):
+    """
+    Read the fields=, years= and since= query params from args (a query string mapping).
+    
+    fields is a comma-separated column list. A bare column applies to each
+    requested category that has it; "category.column" (e.g.
+    health.pct_uninsured) applies to that category only. Columns are checked
+    against CATEGORY_COLUMNS for the geography levels the request covers.
+    years is a comma-separated list; since is the first year to include.
+    
+    Returns:
+        Tuple of (dict of category -> {"fields", "years", "since"}, error message).
+        The dict is empty when no filters were given. Unknown columns, and
+        requested categories none of the fields apply to, are errors.
+    """
+    fields = [f.strip() for f in args.get("fields", "").split(",") if f.strip()]
+    columns = {category: category_columns(category, levels) for category in categories}
+    by_category = {category: [] for category in categories}
+    for field in fields:
+        category, _, column = field.rpartition(".")
+        if not FIELD_NAME.match(column) or (category and category not in VALID_CATEGORIES):
+            return None, f"Invalid field: {field}"
+        if category:
+            if column not in category_columns(category, levels):
+                return None, f"Unknown field: {field}"
+            if category in by_category:
+                by_category[category].append(column)
+            continue
+        matched = [c for c in categories if column in columns[c]]
+        if not matched:
+            return None, f"Unknown field: {field} (not a column of {', '.join(categories)})"
+        for category in matched:
+            by_category[category].append(column)
+    if fields:
+        unmatched = [category for category in categories if not by_category[category]]
+        if unmatched:
+            return None, f"No requested field applies to {', '.join(unmatched)}; add category.column fields or drop those categories"
+    
+    try:
+        years = _parse_years(args.get("years", ""))
+        since = args.get("since")
+        since = int(since) if since else None
+    except ValueError:
+        return None, "years and since must be whole years (e.g. years=2020,2022 or since=2018)"
+    
+    if not fields and not years and since is None:
+        return {}, None
+    
+    filters = {}
+    for category in categories:
+        category_filters = {"fields": list(dict.fromkeys(by_category[category])), "years": years, "since": since}
+        filters[category] = {key: value for key, value in category_filters.items() if value or value == 0}
+    return filters, None
+
+
+def county_fips_or_none(state_abbr: str, county: str):
+    """resolve_county_fips(), or None while the county lookup can't be loaded"""
+    try:
+        return resolve_county_fips(state_abbr, county)
+    except RPCError:
+        return None
+
+
+def build_state_payload(state_abbr: str, categories, filters: dict = None):
+    """Fetch categories for a state and shape the /api/state response body"""
+    data, errors = fetch_categories(categories, "state", state_abbr, filters=filters)
+    return {
+        "state": state_abbr,
+        "state_full": get_state_full_name(state_abbr),
+        "data": data,
+        "percentiles": percentiles_for(state_fips_key(state_abbr), data),
+        "errors": errors
+    }
+
+
+def build_county_payload(state_abbr: str, county: str, categories, filters: dict = None):
+    """
+    Fetch categories for a county and shape the /api/county response body.
+
+    "county" is the stored name ("York County") rather than the spelling in
+    the URL, so live responses match the precomputed snapshots.
+    """
+    data, errors = fetch_categories(categories, "county", state_abbr, county, filters)
+    fips = county_fips_or_none(state_abbr, county)
+    return {
+        "state": state_abbr,
+        "state_full": get_state_full_name(state_abbr),
+        "county": county_name(fips) or county,
+        "data": data,
+        "percentiles": percentiles_for(fips, data),
+        "errors": errors
+    }
+
+
+def encode_json(payload, default=None) -> bytes:
+    """
+    Sorted, compact JSON with the JSON_ENCODER backend. Flask's jsonify,
+    asgi.py and the snapshots all encode through here, so the same payload is
+    the same bytes (and ETag) whichever of them serves it.
+    """
+    if JSON_ENCODER == "orjson" and orjson:
+        return orjson.dumps(payload, default=default, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=default, sort_keys=True, separators=(",", ":")).encode()
+
+
+def encoded_etag(etag: str, encoding: str = None) -> str:
+    """ETag of one encoding of a body; each Content-Encoding is its own representation"""
+    return f"{etag}-{encoding}" if encoding else etag
+
+
+def is_fec_error(result) -> bool:
+    return isinstance(result, dict) and "error" in result
+
+
+def is_fec_failure(result) -> bool:
+    """An FEC error other than "no results", which comes back with the 200 status"""
+    return is_fec_error(result) and result.get("status_code") != 200
+
+
+def aggregate_fec_totals(results):
+    """Sum fetch_fec_totals results across a member's FEC ids, skipping errors"""
+    out = {"by_fec_id": [], "aggregated": {"cash_on_hand": 0, "debts": 0, "receipts": 0, "disbursements": 0, "large_contributions": 0, "small_contributions": 0, 
+                                           "PAC_contributions": 0, "candidate_contributions": 0, "other_contributions": 0}}
+    for res in results:
+        out["by_fec_id"].append(res)
+        if "error" not in res:
+            out["aggregated"]["cash_on_hand"] += res["cash_on_hand"]
+            out["aggregated"]["debts"] += res["debts"]
+            out["aggregated"]["receipts"] += res["receipts"]
+            out["aggregated"]["disbursements"] += res["disbursements"]
+            out["aggregated"]["large_contributions"] += res["large_contributions"]
+            out["aggregated"]["small_contributions"] += res["small_contributions"]
+            out["aggregated"]["PAC_contributions"] += res["PAC_contributions"]
+            out["aggregated"]["candidate_contributions"] += res["candidate_contributions"]
+            out["aggregated"]["other_contributions"] += res["other_contributions"]
+    return out
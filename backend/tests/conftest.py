@@ -0,0 +1,129 @@
+"""
+Shared test setup. Run from backend/: python -m pytest -q
+
+The backend modules read their configuration from the environment when they
+are imported, so it is set here, before any test imports them. Every cache,
+snapshot and store path points into a temporary directory, and Supabase
+points at a closed port, so no test touches real data or a real upstream;
+tests that need an upstream start a fake one (the postgrest fixture below
+stands in for Supabase). A fresh legislators snapshot is written so the apps'
+background refresh has nothing to download.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_TMP = tempfile.mkdtemp(prefix="backend-tests-")
+
+os.environ.update({
+    "SUPABASE_URL": "http://127.0.0.1:9",
+    "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.e30.test",
+    "DATA_BACKEND": "supabase",
+    "FEC_API_KEY": "test-fec-key",
+    "GEOCODIO_KEY": "test-geocodio-key",
+    "CACHE_BACKEND": "memory",
+    "GEOCODE_CACHE_BACKEND": "memory",
+    "RATE_LIMIT_BACKEND": "memory",
+    "CACHE_PATH": os.path.join(_TMP, "cache.sqlite3"),
+    "RATE_LIMIT_PATH": os.path.join(_TMP, "rate_limits.sqlite3"),
+    "LEGIS_SNAPSHOT_PATH": os.path.join(_TMP, "legislators.json"),
+    "FEC_STORE_PATH": os.path.join(_TMP, "fec_store.sqlite3"),
+    "SNAPSHOT_DIR": os.path.join(_TMP, "snapshots"),
+    "PERCENTILES_PATH": os.path.join(_TMP, "percentiles.npz"),
+    "LOCAL_ENGINE_CACHE_DIR": os.path.join(_TMP, "local_engine"),
+    "DISTRICT_BOUNDARIES_DIR": os.path.join(_TMP, "boundaries"),
+    "STATE_LEGISLATORS_DIR": os.path.join(_TMP, "openstates"),
+    "CACHE_ADMIN_TOKEN": "test-admin-token",
+})
+
+LEGISLATORS = [
+    {"id": {"bioguide": "K000383", "fec": ["S2ME00109"]}, "name": {"first": "Angus", "last": "King"},
+     "terms": [{"type": "sen", "state": "ME", "party": "Independent"}]},
+    {"id": {"bioguide": "P000597", "fec": ["H8ME01120"]}, "name": {"first": "Chellie", "last": "Pingree"},
+     "terms": [{"type": "rep", "state": "ME", "district": 1, "party": "Democrat"}]},
+]
+with open(os.environ["LEGIS_SNAPSHOT_PATH"], "w") as f:
+    json.dump({"legislators": LEGISLATORS, "fetched_at": time.time()}, f)
+
+
+class FakePostgREST(ThreadingHTTPServer):
+    """POST /rest/v1/rpc/<function>; answers come from self.routes[function] (rows, or an HTTP status)"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _PostgRESTHandler)
+        self.routes = {}
+        self.calls = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _PostgRESTHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        from database.queries import POSTGREST_MAX_ROWS
+
+        parts = urlsplit(self.path)
+        function = parts.path.rsplit("/", 1)[-1]
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.calls.append((function, query))
+
+        answer = self.server.routes.get(function, [])
+        if isinstance(answer, int):
+            status, rows = answer, {"message": "upstream failure"}
+        else:
+            # PostgREST caps every response at its max-rows setting
+            offset = int(query.get("offset", 0))
+            limit = min(int(query.get("limit", POSTGREST_MAX_ROWS)), POSTGREST_MAX_ROWS)
+            status, rows = 200, answer[offset:offset + limit]
+        body = json.dumps(rows).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def postgrest(monkeypatch):
+    """A fake PostgREST that both Supabase clients (sync and async) talk to, with the RPC cache cleared"""
+    from supabase import AsyncClient, create_client
+    from database import queries
+
+    server = FakePostgREST()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    key = os.environ["SUPABASE_KEY"]
+    monkeypatch.setattr(queries, "supabase", create_client(server.url, key))
+    monkeypatch.setattr(queries, "async_supabase", AsyncClient(server.url, key))
+    queries.invalidate_rpc_cache()
+    yield server
+    server.shutdown()
+    server.server_close()
+    queries.invalidate_rpc_cache()
+
+
+@pytest.fixture
+def flask_client():
+    from app import app
+    return app.test_client()
+
+
+@pytest.fixture
+def asgi_client():
+    from fastapi.testclient import TestClient
+    from asgi import app
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,149 @@
+"""
+asgi.py must answer like app.py: same status, bytes, ETag and caching headers,
+and keep blocking work (SQLite, files) off the event loop.
+"""
+import asyncio
+import gzip
+import threading
+import pytest
+from functions import fec_finance, fec_store, http_client
+
+STATE_ROWS = {
+    "fetch_election_state": [{"state_po": "ME", "year": 2024, "party": "DEMOCRAT", "candidate": "A", "candidatevotes": 10}],
+    "fetch_health_state": [{"state": "ME", "county": "Maine", "year": 2022, "pct_uninsured": 7.1},
+                           {"state": "US", "county": "United States", "year": 2022, "pct_uninsured": 8.0}],
+    "fetch_demographics_state": [{"state": "ME", "county": "Maine", "year": year, "total_pop": 1300000 + year}
+                                 for year in range(2000, 2024)],
+    "fetch_education_state": [],
+    "fetch_economy_state": [{"state": "ME", "county": "Maine", "year": 2022, "unemployment_rate": 3.1}],
+}
+COUNTIES = [{"state": "ME", "county": "York County", "county_fips": "23031"}]
+
+
+@pytest.fixture
+def upstream(postgrest):
+    postgrest.routes.update(STATE_ROWS)
+    postgrest.routes["fetch_counties"] = COUNTIES
+    postgrest.routes["fetch_health_county"] = [{"state": "ME", "county": "York County", "year": 2022, "pct_uninsured": 6.5}]
+    return postgrest
+
+
+def _flask(client, method, url, headers=None, json=None):
+    response = client.open(url, method=method, headers=headers or {}, json=json)
+    body = response.data
+    if response.headers.get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    return _summary(response, body)
+
+
+def _asgi(client, method, url, headers=None, json=None):
+    # httpx sends Accept-Encoding unless told otherwise, and decodes the body itself
+    response = client.request(method, url, headers={"Accept-Encoding": "identity", **(headers or {})}, json=json)
+    return _summary(response, response.content)
+
+
+def _summary(response, body):
+    return {
+        "status": response.status_code,
+        "body": body,
+        "etag": response.headers.get("ETag"),
+        # Same directives; werkzeug and asgi.py write them in a different order
+        "cache_control": sorted((response.headers.get("Cache-Control") or "").split(", ")),
+        "vary": response.headers.get("Vary"),
+        "encoding": response.headers.get("Content-Encoding"),
+    }
+
+
+def _both(flask_client, asgi_client, method, url, **kwargs):
+    return _flask(flask_client, method, url, **kwargs), _asgi(asgi_client, method, url, **kwargs)
+
+
+@pytest.mark.parametrize("url", [
+    "/api/state/ME",
+    "/api/state/me?categories=health,economy",
+    "/api/state/ME?category=economy&fields=year,unemployment_rate",
+    "/api/county/ME/York?category=health",
+    "/api/state/ME?category=weather",
+    "/api/state/ME?fields=bogus",
+])
+def test_census_routes_match(upstream, flask_client, asgi_client, url):
+    flask, asgi = _both(flask_client, asgi_client, "GET", url)
+    assert flask == asgi
+    assert flask["status"] in (200, 400)
+
+
+def test_large_responses_are_compressed_alike(upstream, flask_client, asgi_client):
+    flask, asgi = _both(flask_client, asgi_client, "GET", "/api/state/ME", headers={"Accept-Encoding": "gzip"})
+    assert flask == asgi
+    assert flask["encoding"] == "gzip"
+    assert flask["vary"] == "Accept-Encoding"
+
+
+@pytest.mark.parametrize("url, vary", [("/api/state/ME?category=health", None),
+                                       ("/api/state/ME?categories=demographics,health", "Accept-Encoding")])
+def test_revalidation_matches(upstream, flask_client, asgi_client, url, vary):
+    etag = _flask(flask_client, "GET", url)["etag"]
+    flask, asgi = _both(flask_client, asgi_client, "GET", url, headers={"If-None-Match": etag})
+    assert flask == asgi
+    assert flask["status"] == 304 and flask["body"] == b""
+    assert flask["vary"] == vary
+
+
+def test_partial_responses_are_not_stored(upstream, flask_client, asgi_client):
+    upstream.routes["fetch_health_state"] = 500
+    flask, asgi = _both(flask_client, asgi_client, "GET", "/api/state/ME?categories=health,economy")
+    assert flask == asgi
+    assert flask["cache_control"] == ["no-store"]
+    assert flask["etag"] is None
+
+
+def test_batch_matches(upstream, flask_client, asgi_client):
+    upstream.routes["fetch_health_batch"] = [
+        {"county_fips": fips, "state": state, "county": name, "year": 2022, "pct_uninsured": value}
+        for fips, state, name, value in [("23031", "ME", "York County", 6.5), ("23000", "ME", "Maine", 7.1),
+                                         ("00000", "US", "United States", 8.0)]
+    ]
+    body = {"geographies": [{"state": "ME"}, {"state": "ME", "county": "York"}, {"state": "ME", "county": "Nowhere"}],
+            "categories": ["health"]}
+    flask, asgi = _both(flask_client, asgi_client, "POST", "/api/batch", json=body)
+    assert flask == asgi
+    assert b'"unknown":["ME/Nowhere"]' in flask["body"].replace(b" ", b"")
+
+
+@pytest.mark.parametrize("url", ["/api/member/K000383", "/api/member/X000000"])
+def test_member_routes_match(flask_client, asgi_client, url):
+    flask, asgi = _both(flask_client, asgi_client, "GET", url)
+    assert flask == asgi
+    assert flask["status"] == 200
+
+
+def test_cache_invalidation_matches(upstream, flask_client, asgi_client):
+    headers = {"X-Cache-Token": "test-admin-token"}
+    flask, asgi = _both(flask_client, asgi_client, "POST", "/api/cache/invalidate", headers=headers, json={})
+    assert flask["status"] == asgi["status"] == 200
+    assert _both(flask_client, asgi_client, "POST", "/api/cache/invalidate", json={})[1]["status"] == 403
+
+
+def test_fec_store_reads_run_in_worker_threads(monkeypatch):
+    read_on = []
+    monkeypatch.setattr(fec_store, "read_totals", lambda fec_id, cycle: read_on.append(threading.current_thread()) or [])
+
+    async def run():
+        fec_finance._fec_cache.invalidate()
+        await fec_finance.fetch_fec_totals_async("S2ME00109", 2020)
+        return threading.current_thread()
+
+    assert asyncio.run(run()) not in read_on and len(read_on) == 1
+
+
+def test_shared_rate_limiter_runs_in_worker_threads(tmp_path, monkeypatch):
+    limiter = http_client.SQLiteRateLimiter("test", rate=10, per=1, burst=10, path=str(tmp_path / "limits.sqlite3"))
+    reserved_on = []
+    reserve = limiter.reserve
+    monkeypatch.setattr(limiter, "reserve", lambda max_wait: reserved_on.append(threading.current_thread()) or reserve(max_wait))
+
+    async def run():
+        await limiter.acquire_async()
+        return threading.current_thread()
+
+    assert asyncio.run(run()) not in reserved_on and len(reserved_on) == 1
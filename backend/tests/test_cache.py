@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+import pytest
+from cache import MISSING, SQLiteCache, TTLCache, get_cache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteCache("test", maxsize=3, ttl=60, path=str(tmp_path / "cache.sqlite3"), touch_interval=0)
+    return TTLCache(maxsize=3, ttl=60)
+
+
+def test_get_set(cache):
+    assert cache.get(("a",)) is MISSING
+    cache.set(("a",), {"rows": [1, 2]})
+    assert cache.get(("a",)) == {"rows": [1, 2]}
+
+
+def test_cached_none_is_not_a_miss(cache):
+    cache.set(("none",), None)
+    assert cache.get(("none",)) is None
+
+
+def test_entries_expire(cache):
+    cache.set(("a",), 1, ttl=0.05)
+    cache.set(("b",), 2)
+    time.sleep(0.1)
+    assert cache.get(("a",)) is MISSING
+    assert cache.get(("b",)) == 2
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for key in "abc":
+        cache.set((key,), key)
+        time.sleep(0.01)
+    cache.get(("a",))
+    time.sleep(0.01)
+    cache.set(("d",), "d")
+    assert cache.get(("b",)) is MISSING
+    assert [cache.get((key,)) for key in "acd"] == ["a", "c", "d"]
+
+
+def test_invalidate(cache):
+    cache.set(("fetch_health_county", "23005"), 1)
+    cache.set(("fetch_health_county", "23031"), 2)
+    cache.set(("fetch_economy_county", "23005"), 3)
+    assert cache.invalidate(lambda key: key[0] == "fetch_health_county") == 2
+    assert cache.get(("fetch_economy_county", "23005")) == 3
+    assert cache.invalidate() == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_stats_count_hits_and_misses(cache):
+    cache.get(("a",))
+    cache.set(("a",), 1)
+    cache.get(("a",))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_get_or_set_calls_loader_once_for_concurrent_misses(cache):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_set(("k",), loader))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+
+
+def test_get_or_set_does_not_cache_errors(cache):
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_set(("k",), fail)
+    assert cache.get_or_set(("k",), lambda: "ok") == "ok"
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    SQLiteCache("rpc", path=path).set(("a",), 1)
+    assert SQLiteCache("rpc", path=path).get(("a",)) == 1
+    assert SQLiteCache("geocode", path=path).get(("a",)) is MISSING
+
+
+def test_sqlite_hits_only_touch_entries_after_the_interval(tmp_path):
+    cache = SQLiteCache("test", ttl=60, path=str(tmp_path / "cache.sqlite3"), touch_interval=0.1)
+    cache.set(("a",), 1)
+    conn = cache._connect()
+    writes = conn.total_changes
+    assert [cache.get(("a",)) for _ in range(5)] == [1] * 5
+    assert conn.total_changes == writes
+    time.sleep(0.15)
+    assert cache.get(("a",)) == 1
+    assert conn.total_changes == writes + 1
+
+
+async def _roundtrip(cache):
+    await cache.set_async(("a",), 1)
+    return await cache.get_async(("a",))
+
+
+def test_async_get_set(cache):
+    assert asyncio.run(_roundtrip(cache)) == 1
+
+
+def test_get_cache_backends():
+    assert isinstance(get_cache("x", backend="memory"), TTLCache)
+    with pytest.raises(ValueError):
+        get_cache("x", backend="redis")
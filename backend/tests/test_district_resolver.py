@@ -0,0 +1,93 @@
+import json
+import pytest
+from functions import district_resolver
+from functions.district_resolver import DistrictResolver, _point_in_ring
+
+
+def _square(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+
+def _feature(properties, *rings, multi=False):
+    if multi:
+        geometry = {"type": "MultiPolygon", "coordinates": [[ring] for ring in rings]}
+    else:
+        geometry = {"type": "Polygon", "coordinates": list(rings)}
+    return {"type": "Feature", "properties": properties, "geometry": geometry}
+
+
+def _write(directory, filename, *features):
+    with open(directory / filename, "w") as f:
+        json.dump({"type": "FeatureCollection", "features": list(features)}, f)
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    # Two counties side by side; the western one has a hole (an enclave county)
+    _write(tmp_path, "county.geojson",
+           _feature({"STATEFP": "23", "NAMELSAD": "West County"}, _square(-71, 43, -70, 44), _square(-70.6, 43.4, -70.4, 43.6)),
+           _feature({"STATEFP": "23", "NAMELSAD": "Enclave County"}, _square(-70.6, 43.4, -70.4, 43.6)),
+           _feature({"STATEFP": "23", "NAMELSAD": "East County"}, _square(-70, 43, -69, 44)))
+    _write(tmp_path, "congressional.geojson",
+           _feature({"STATEFP": "23", "CD119FP": "01"}, _square(-71, 43, -69.5, 44)),
+           _feature({"STATEFP": "23", "CD119FP": "02"}, _square(-69.5, 43, -69, 44), _square(-68, 43, -67.5, 44), multi=True))
+    _write(tmp_path, "state_house.geojson",
+           _feature({"NAMELSAD": "State House District 1", "SLDLST": "001"}, _square(-71, 43, -69, 44)))
+    return DistrictResolver(str(tmp_path), cell_size=0.25).load()
+
+
+def test_point_in_ring():
+    ring = [tuple(point) for point in _square(0, 0, 2, 2)]
+    assert _point_in_ring(1, 1, ring)
+    assert not _point_in_ring(3, 1, ring)
+    assert not _point_in_ring(1, -0.5, ring)
+
+
+def test_missing_layer_files_are_skipped(resolver):
+    assert set(resolver.layers) == {"county", "congressional", "state_house"}
+
+
+def test_lookup_finds_the_containing_feature_in_each_layer(resolver):
+    found = resolver.lookup(43.5, -70.8)
+    assert found["county"]["NAMELSAD"] == "West County"
+    assert found["congressional"]["CD119FP"] == "01"
+    assert found["state_house"]["NAMELSAD"] == "State House District 1"
+
+
+def test_holes_are_excluded(resolver):
+    assert resolver.lookup(43.5, -70.5)["county"]["NAMELSAD"] == "Enclave County"
+
+
+def test_multipolygon_parts(resolver):
+    assert resolver.lookup(43.5, -67.7)["congressional"]["CD119FP"] == "02"
+    assert resolver.lookup(43.5, -68.5)["congressional"] is None
+
+
+def test_points_outside_every_feature(resolver):
+    assert resolver.lookup(45.5, -70.5) == {"county": None, "congressional": None, "state_house": None}
+
+
+def test_resolve_point(resolver, monkeypatch):
+    monkeypatch.setitem(district_resolver._state, "resolver", resolver)
+    assert district_resolver.resolve_point(43.5, -69.2) == {
+        "state": "ME",
+        "county": "East County",
+        "congressional_district": 2,
+        "state_house_district": "State House District 1",
+        "state_senate_district": None,
+        "state_house_code": "001",
+        "state_senate_code": None,
+        "school_district": None
+    }
+    # In a congressional district but no county
+    assert district_resolver.resolve_point(43.5, -67.7) is None
+
+
+def test_resolve_point_before_boundaries_load(monkeypatch):
+    monkeypatch.setitem(district_resolver._state, "resolver", None)
+    assert district_resolver.resolve_point(43.5, -70.8) is None
+
+
+@pytest.mark.parametrize("value, district", [("00", 0), ("98", 0), ("02", 2), ("ZZ", None)])
+def test_congressional_district_numbers(value, district):
+    assert district_resolver._congressional_district({"CD119FP": value}) == district
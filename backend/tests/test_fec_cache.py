@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+import types
+import pytest
+import cache
+from functions import fec_finance
+
+CURRENT = 2026
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    # fec_finance timestamps entries with time.time(); the cache expires them on monotonic()
+    monkeypatch.setattr(fec_finance, "time", types.SimpleNamespace(time=clock, sleep=time.sleep))
+    monkeypatch.setattr(cache, "monotonic", clock)
+    monkeypatch.setattr(fec_finance, "current_cycle", lambda: CURRENT)
+    monkeypatch.setattr(fec_finance, "FEC_CACHE_FRESH_SECONDS", 100)
+    fec_finance._fec_cache.invalidate()
+    yield clock
+    fec_finance._fec_cache.invalidate()
+
+
+class Fetcher:
+    """Counts calls and returns "<id>:<call number>"; set gate to hold calls until it is set"""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = None
+        self.error = False
+
+    def __call__(self, fec_id, cycle):
+        if self.gate:
+            self.gate.wait(5)
+        self.calls += 1
+        if self.error:
+            return {"error": "FEC down", "status_code": 503}
+        return f"{fec_id}:{self.calls}"
+
+
+@pytest.fixture
+def fetcher():
+    fetcher = Fetcher()
+    fetcher.cached = fec_finance._fec_cached("test")(fetcher)
+    return fetcher
+
+
+def _wait_for_revalidation():
+    deadline = time.monotonic() + 5
+    while fec_finance._revalidating and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not fec_finance._revalidating
+
+
+def test_closed_cycles_are_kept(clock, fetcher):
+    assert fetcher.cached("S1", CURRENT - 2) == "S1:1"
+    # Far past both the fresh and the stale windows
+    clock.advance(fec_finance.FEC_CACHE_STALE_SECONDS * 10)
+    assert fetcher.cached("S1", CURRENT - 2) == "S1:1"
+    assert fetcher.calls == 1
+    assert not fec_finance._revalidating
+
+
+def test_current_cycle_is_fresh_for_a_while(clock, fetcher):
+    assert fetcher.cached("S1", CURRENT) == "S1:1"
+    clock.advance(99)
+    assert fetcher.cached("S1", CURRENT) == "S1:1"
+    assert fetcher.calls == 1
+    assert not fec_finance._revalidating
+
+
+def test_stale_entries_are_served_while_one_refresh_runs(clock, fetcher):
+    fetcher.cached("S1", CURRENT)
+    clock.advance(101)
+
+    fetcher.gate = threading.Event()
+    assert [fetcher.cached("S1", CURRENT) for _ in range(5)] == ["S1:1"] * 5
+    assert fec_finance._revalidating == {("test", "S1", CURRENT)}
+    fetcher.gate.set()
+    _wait_for_revalidation()
+
+    assert fetcher.calls == 2
+    assert fetcher.cached("S1", CURRENT) == "S1:2"
+    assert not fec_finance._revalidating
+
+
+def test_failed_refresh_keeps_the_stale_entry(clock, fetcher):
+    fetcher.cached("S1", CURRENT)
+    clock.advance(101)
+    fetcher.error = True
+    assert fetcher.cached("S1", CURRENT) == "S1:1"
+    _wait_for_revalidation()
+    assert fetcher.calls == 2
+    assert fetcher.cached("S1", CURRENT) == "S1:1"
+
+
+def test_current_cycle_expires_after_the_stale_window(clock, fetcher):
+    fetcher.cached("S1", CURRENT)
+    clock.advance(fec_finance.FEC_CACHE_STALE_SECONDS + 1)
+    assert fetcher.cached("S1", CURRENT) == "S1:2"
+    assert fetcher.calls == 2
+
+
+def test_errors_are_not_cached(clock, fetcher):
+    fetcher.error = True
+    assert fetcher.cached("S1", CURRENT - 2)["status_code"] == 503
+    fetcher.error = False
+    assert fetcher.cached("S1", CURRENT - 2) == "S1:2"
+
+
+def test_cycle_is_part_of_the_key(clock, fetcher):
+    assert fetcher.cached("S1", CURRENT) == "S1:1"
+    assert fetcher.cached("S1", str(CURRENT - 2)) == "S1:2"
+    assert fetcher.cached("S1", CURRENT - 2) == "S1:2"
+
+
+def test_async_fetchers_share_the_cache_and_refresh(clock, fetcher):
+    async_calls = []
+
+    async def fetch_async(fec_id, cycle):
+        async_calls.append(fec_id)
+        return f"{fec_id}:async"
+    cached_async = fec_finance._fec_cached_async("test", fetcher.cached)(fetch_async)
+
+    fetcher.cached("S1", CURRENT)
+    assert asyncio.run(cached_async("S1", CURRENT)) == "S1:1"
+    assert asyncio.run(cached_async("S2", CURRENT)) == "S2:async"
+    assert fetcher.cached("S2", CURRENT) == "S2:async"
+
+    # Stale: served, and refreshed in the background by the sync fetcher
+    clock.advance(101)
+    assert asyncio.run(cached_async("S1", CURRENT)) == "S1:1"
+    _wait_for_revalidation()
+    assert fetcher.calls == 2
+    assert asyncio.run(cached_async("S1", CURRENT)) == "S1:2"
+    assert async_calls == ["S2"]
@@ -0,0 +1,39 @@
+from payloads import is_fec_error, is_fec_failure, aggregate_fec_totals
+
+FIELDS = ["cash_on_hand", "debts", "receipts", "disbursements", "large_contributions", "small_contributions",
+          "PAC_contributions", "candidate_contributions", "other_contributions"]
+
+
+def _totals(fec_id, amount):
+    return {"fec_id": fec_id, **{field: amount for field in FIELDS}}
+
+
+def test_sums_every_field_across_ids():
+    out = aggregate_fec_totals([_totals("H0ME01", 100), _totals("S2ME00", 250.5)])
+    assert out["aggregated"] == {field: 350.5 for field in FIELDS}
+    assert [row["fec_id"] for row in out["by_fec_id"]] == ["H0ME01", "S2ME00"]
+
+
+def test_errors_are_listed_but_not_summed():
+    error = {"error": "FEC API request failed: ConnectTimeout", "status_code": 503}
+    out = aggregate_fec_totals([_totals("H0ME01", 100), error])
+    assert out["aggregated"] == {field: 100 for field in FIELDS}
+    assert out["by_fec_id"][1] is error
+
+
+def test_no_results_is_all_zeros():
+    out = aggregate_fec_totals([])
+    assert out == {"by_fec_id": [], "aggregated": {field: 0 for field in FIELDS}}
+
+
+def test_accepts_any_iterable():
+    out = aggregate_fec_totals(_totals(fec_id, 1) for fec_id in ("a", "b", "c"))
+    assert out["aggregated"]["receipts"] == 3
+
+
+def test_fec_error_kinds():
+    assert not is_fec_error([{"state": "ME"}])
+    # "No results" comes back with the 200 status: no data, not an upstream failure
+    assert is_fec_error({"error": "No results found for candidate ID X", "status_code": 200})
+    assert not is_fec_failure({"error": "No results found for candidate ID X", "status_code": 200})
+    assert is_fec_failure({"error": "rate limited", "status_code": 429})
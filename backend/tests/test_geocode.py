@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from functions import geocode
+from functions.http_client import redact
+
+
+def test_normalize_query_ignores_case_punctuation_and_spacing():
+    assert geocode.normalize_query("  123 Main St., Portland ") == "123 main st portland"
+    assert geocode.normalize_query("123 main st portland") == "123 main st portland"
+    assert geocode.normalize_query(" 04101 ") == "04101"
+
+
+def test_normalize_query_keeps_hyphens():
+    assert geocode.normalize_query("04101-1234") == "04101-1234"
+
+
+def test_coordinate_bucket_rounds_nearby_points_together():
+    assert geocode.coordinate_bucket(43.65612, -70.25541) == geocode.coordinate_bucket("43.6559", "-70.2551")
+    assert geocode.coordinate_bucket(43.6561, -70.2554) != geocode.coordinate_bucket(43.6571, -70.2554)
+
+
+def test_coordinate_bucket_precision():
+    assert geocode.coordinate_bucket(43.65612, -70.25541, precision=1) == (43.7, -70.3)
+
+
+def test_cache_keys():
+    assert geocode._cache_key(query="123 Main St.") == geocode._cache_key(query="123 main st")
+    assert geocode._cache_key(lat=43.65612, lng=-70.25541) == ("latlng", 43.656, -70.255)
+
+
+def test_lookups_are_cached_and_failures_are_not(monkeypatch):
+    calls = []
+
+    def fetch(query=None, lat=None, lng=None):
+        calls.append(query)
+        return {"state": "ME"} if len(calls) > 1 else None
+
+    monkeypatch.setattr(geocode, "fetch_geocodio", fetch)
+    assert geocode.geocode_lookup(query="1 Test Rd, Nowhere") is None
+    assert geocode.geocode_lookup(query="1 test rd nowhere") == {"state": "ME"}
+    assert geocode.geocode_lookup(query="1 TEST RD. NOWHERE") == {"state": "ME"}
+    assert len(calls) == 2
+
+
+OFFLINE_POINT = {
+    "state": "ME", "county": "Cumberland County", "congressional_district": 1,
+    "state_house_district": "State House District 118", "state_senate_district": "State Senate District 27",
+    "state_house_code": "118", "state_senate_code": "027", "school_district": None
+}
+SENATOR = {"id": {"bioguide": "K000383"}, "name": {"first": "Angus", "last": "King"},
+           "terms": [{"type": "sen", "state": "ME", "party": "Independent"}]}
+REP = {"id": {"bioguide": "P000597"}, "name": {"first": "Chellie", "last": "Pingree"},
+       "terms": [{"type": "rep", "state": "ME", "district": 1, "party": "Democrat"}]}
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setattr(geocode, "resolve_point", lambda lat, lng: dict(OFFLINE_POINT))
+    monkeypatch.setattr(geocode, "get_members_by_state", lambda state: [SENATOR, REP])
+    monkeypatch.setattr(geocode, "get_members_by_district", lambda state, district: [REP] if district == 1 else [])
+    monkeypatch.setattr(geocode, "fetch_geocodio", lambda **kwargs: {"source": "geocodio"})
+
+
+def test_offline_answer_is_served_without_state_legislators(offline):
+    result = geocode.geocode_lookup(lat=43.6, lng=-70.2)
+    assert [(m["name"], m["role"], m["district"]) for m in result["fed_legislators"]] == [
+        ("Angus King", "sen", None), ("Chellie Pingree", "rep", 1)
+    ]
+    assert result["county"] == "Cumberland County"
+    assert result["state_house_district"] == "State House District 118"
+    assert result["state_house_legislators"] == result["state_senate_legislators"] == []
+    assert result["state_legislators_available"] is False
+
+
+def test_offline_answer_includes_state_legislators(offline, monkeypatch):
+    members = {("state_house", "118"): [{"name": "Rep One"}], ("state_senate", "027"): [{"name": "Sen One"}]}
+    monkeypatch.setattr(geocode, "members_for", lambda state, layer, code, name: [
+        dict(member, district=name) for member in members.get((layer, code), [])
+    ])
+    monkeypatch.setattr(geocode, "has_state", lambda state: True)
+    result = asyncio.run(geocode.geocode_lookup_async(lat=43.6, lng=-70.2))
+    assert result["state_house_legislators"] == [{"name": "Rep One", "district": "State House District 118"}]
+    assert result["state_senate_legislators"] == [{"name": "Sen One", "district": "State Senate District 27"}]
+    assert result["state_legislators_available"] is True
+
+
+def test_offline_answer_needs_the_legislators_snapshot(offline, monkeypatch):
+    monkeypatch.setattr(geocode, "get_members_by_state", lambda state: [])
+    monkeypatch.setattr(geocode, "get_members_by_district", lambda state, district: [])
+    assert geocode.geocode_lookup(lat=10.5, lng=20.5) == {"source": "geocodio"}
+
+
+def test_missing_congressional_district_is_not_at_large(monkeypatch):
+    monkeypatch.setattr(geocode, "resolve_point", lambda lat, lng: {
+        "state": "ME", "county": "Cumberland County", "congressional_district": None,
+        "state_house_district": None, "state_senate_district": None,
+        "state_house_code": None, "state_senate_code": None, "school_district": None
+    })
+    assert geocode.reverse_geocode_offline(43.6, -70.2) is None
+
+
+def test_transport_errors_mask_the_api_key(monkeypatch):
+    monkeypatch.setattr(geocode, "GEOCODIO_URL", "http://127.0.0.1:9")
+    monkeypatch.setattr(geocode, "GEOCODIO_KEY", "secret-key")
+    with pytest.raises(geocode.GeocodingError) as raised:
+        geocode.fetch_geocodio(query="x")
+    assert "secret-key" not in str(raised.value)
+    assert "api_key=REDACTED" in str(raised.value)
+    assert raised.value.__cause__ is None
+
+
+def test_redact():
+    assert redact("GET /v1.9/geocode?api_key=abc123&q=x failed") == "GET /v1.9/geocode?api_key=REDACTED&q=x failed"
@@ -0,0 +1,126 @@
+import gzip
+import pytest
+import app as flask_app
+from functions.fec_finance import current_cycle, summarize_fec_totals
+from payloads import encoded_etag
+
+HEALTH_ROWS = [{"state": "ME", "county": "Maine", "year": year, "pct_uninsured": 7.1} for year in range(2000, 2024)]
+
+
+@pytest.fixture
+def upstream(postgrest):
+    postgrest.routes["fetch_health_state"] = HEALTH_ROWS
+    postgrest.routes["fetch_economy_state"] = [{"state": "ME", "county": "Maine", "year": 2022, "unemployment_rate": 3.1}]
+    return postgrest
+
+
+@pytest.fixture
+def fec(monkeypatch):
+    """FEC fetchers that answer without the network; set fec.fail to make totals fail"""
+    class Fake:
+        fail = False
+    fake = Fake()
+
+    def totals(fec_id, cycle):
+        if fake.fail:
+            return {"error": "FEC down", "status_code": 503}
+        return summarize_fec_totals(fec_id, cycle, [{"receipts": 100.0, "individual_itemized_contributions": 60.0,
+                                                     "individual_unitemized_contributions": 40.0,
+                                                     "other_political_committee_contributions": 0.0,
+                                                     "candidate_contribution": 0.0}])
+    monkeypatch.setattr(flask_app, "fetch_fec_totals", totals)
+    monkeypatch.setattr(flask_app, "fetch_fec_state_totals", lambda fec_id, cycle: [{"state": "ME", "total": 10.0}])
+    monkeypatch.setattr(flask_app, "fetch_top_contributors_for", lambda fec_id, cycle: None)
+    return fake
+
+
+def test_etag_and_cache_control(upstream, flask_client):
+    response = flask_client.get("/api/state/ME?category=health")
+    assert response.status_code == 200
+    assert response.headers["ETag"].startswith('"')
+    assert response.cache_control.max_age == 86400
+    assert response.cache_control.stale_while_revalidate == 604800
+    assert response.cache_control.public
+
+
+def test_matching_etag_is_a_304_with_the_caching_headers(upstream, flask_client):
+    first = flask_client.get("/api/state/ME?category=health")
+    response = flask_client.get("/api/state/ME?category=health", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == first.headers["ETag"]
+    assert response.headers["Cache-Control"] == first.headers["Cache-Control"]
+    assert response.headers["Vary"] == first.headers["Vary"] == "Accept-Encoding"
+
+
+def test_compressed_copy_revalidates(upstream, flask_client):
+    first = flask_client.get("/api/state/ME?category=health", headers={"Accept-Encoding": "gzip"})
+    assert first.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(first.data).startswith(b"{")
+    etag = first.get_etag()[0]
+
+    # A client holding the gzip copy revalidates whatever it asks for now
+    response = flask_client.get("/api/state/ME?category=health", headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.headers["Vary"] == "Accept-Encoding"
+    plain = flask_client.get("/api/state/ME?category=health").get_etag()[0]
+    assert etag == encoded_etag(plain, "gzip")
+
+
+def test_other_etags_get_the_body(upstream, flask_client):
+    response = flask_client.get("/api/state/ME?category=health", headers={"If-None-Match": '"something-else"'})
+    assert response.status_code == 200
+    assert response.json["data"]["health"] == HEALTH_ROWS
+
+
+def test_small_responses_do_not_vary(upstream, flask_client):
+    first = flask_client.get("/api/state/ME?category=economy")
+    response = flask_client.get("/api/state/ME?category=economy", headers={"If-None-Match": first.headers["ETag"]})
+    assert "Vary" not in first.headers and "Vary" not in response.headers
+    assert response.status_code == 304
+
+
+def test_responses_with_errors_are_not_stored(upstream, flask_client):
+    upstream.routes["fetch_economy_state"] = 500
+    response = flask_client.get("/api/state/ME?categories=health,economy")
+    assert response.status_code == 200
+    assert response.json["errors"] == {"economy": "fetch_economy_state failed"}
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "ETag" not in response.headers
+
+
+def test_error_statuses_pass_through(upstream, flask_client):
+    response = flask_client.get("/api/state/ME?category=weather")
+    assert response.status_code == 400
+    assert "Cache-Control" not in response.headers and "ETag" not in response.headers
+
+
+def test_member_lifetime(flask_client):
+    response = flask_client.get("/api/member/K000383")
+    assert response.json == ["S2ME00109"]
+    assert response.cache_control.max_age == 3600
+    assert response.cache_control.stale_while_revalidate == 3600
+
+
+def test_finance_lifetime_depends_on_the_cycle(fec, flask_client):
+    current = flask_client.get(f"/api/member/K000383/finance?cycle={current_cycle()}")
+    assert current.cache_control.max_age == 300
+    assert current.cache_control.stale_while_revalidate == 3600
+
+    closed = flask_client.get("/api/member/K000383/finance?cycle=2020")
+    assert closed.cache_control.max_age == 86400
+    assert closed.json["totals"]["aggregated"]["receipts"] == 100.0
+
+
+def test_finance_failures_are_not_stored(fec, flask_client):
+    fec.fail = True
+    response = flask_client.get("/api/member/K000383/finance?cycle=2020")
+    assert response.json["errors"]["totals:S2ME00109"] == "FEC down"
+    assert response.headers["Cache-Control"] == "no-store"
+
+
+def test_geocode_is_private(flask_client, monkeypatch):
+    monkeypatch.setattr(flask_app, "geocode_lookup", lambda **kwargs: {"state": "ME"})
+    response = flask_client.get("/api/geocode?q=04101")
+    assert response.cache_control.private and not response.cache_control.public
+    assert response.cache_control.max_age == 86400
@@ -0,0 +1,197 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from database import local_engine
+from database.local_engine import CSV_FILES, FUNCTIONS, LocalEngine
+
+
+def _write_csvs(directory, unemployment=3.1):
+    """One state (Maine) with two counties, and the national rows, for 2021 and 2022"""
+    places = [("1", "United States", "us"), ("23", "Maine", "state"),
+              ("23005", "Cumberland County, Maine", "county"), ("23031", "York County, Maine", "county")]
+    census, economic = [], []
+    for year in (2021, 2022):
+        for i, (geoid, name, geography) in enumerate(places):
+            census.append({"GEOID": geoid, "NAME": name, "geography": geography, "year": year,
+                           "total_pop": 1000 * (i + 1) + year, "pct_pacificI": 0.1, "pct_uninsured": 5.0 + i})
+            economic.append({"GEOID": geoid, "NAME": name, "geography": geography, "year": year,
+                             "unemployment_rate": unemployment + i, "gini_index": 0.4})
+    # A tract-level row the tables skip
+    census.append({"GEOID": "23005000100", "NAME": "Tract 1", "geography": "tract", "year": 2022, "total_pop": 5})
+    health = [{"state": state, "statecode": statecode, "countycode": countycode, "year_numeric": year,
+               "premature_death": 7000.0 + year, "alcohol_impaired_driving_deaths": 0.3, "pct_ba_or_higher": 35.0}
+              for state, statecode, countycode in [("US", None, None), ("ME", 23, 0), ("ME", 23, 5), ("ME", 23, 31)]
+              for year in (2021, 2022)]
+    election = [{"state_po": "ME", "county_name": county, "county_fips": fips, "year": year,
+                 "party": party, "candidate": candidate, "candidatevotes": votes}
+                for county, fips in [("CUMBERLAND", 23005), ("YORK", 23031)]
+                for year, party, candidate, votes in [(2020, "DEMOCRAT", "BIDEN", 100), (2020, "REPUBLICAN", "TRUMP", 60),
+                                                      (2024, "DEMOCRAT", "HARRIS", 90), (2024, "REPUBLICAN", "TRUMP", 95)]]
+    # A row whose FIPS is missing but whose county name is known elsewhere
+    election.append({"state_po": "ME", "county_name": "YORK", "county_fips": None, "year": 2024,
+                     "party": "OTHER", "candidate": "OTHER", "candidatevotes": 5})
+    for name, rows in [("census", census), ("economic", economic), ("health", health), ("election", election)]:
+        pd.DataFrame(rows).to_csv(os.path.join(directory, CSV_FILES[name]), index=False)
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    directory = tmp_path / "cleaned_data"
+    directory.mkdir()
+    _write_csvs(directory)
+    return directory
+
+
+@pytest.fixture
+def engine(data_dir, tmp_path):
+    return LocalEngine(str(data_dir), str(tmp_path / "cache")).load()
+
+
+PARAMS = {
+    "fetch_election_state": {"state_name": "ME"},
+    "fetch_election_county": {"fips": "23031"},
+    "fetch_election_county_batch": {"fips_list": ["23031", "23005"]},
+    "fetch_election_state_batch": {"state_list": ["ME"]},
+}
+for _category in ("demographics", "health", "education", "economy"):
+    PARAMS[f"fetch_{_category}_state"] = {"state_param": "ME", "county_param": "Maine"}
+    PARAMS[f"fetch_{_category}_county"] = {"fips_param": "23031"}
+    PARAMS[f"fetch_{_category}_batch"] = {"fips_list": ["23031", "23005", "00000"]}
+
+
+@pytest.mark.parametrize("function_name", sorted(FUNCTIONS))
+def test_output_columns_match_the_sql_functions(engine, function_name):
+    rows = engine.call(function_name, PARAMS[function_name])
+    assert rows
+    assert all(list(row) == FUNCTIONS[function_name][2] for row in rows)
+
+
+def test_state_rows_come_with_the_national_rows_newest_first(engine):
+    rows = engine.call("fetch_demographics_state", PARAMS["fetch_demographics_state"])
+    assert [(row["state"], row["county"], row["year"]) for row in rows] == [
+        ("ME", "Maine", 2022), ("US", "United States", 2022), ("ME", "Maine", 2021), ("US", "United States", 2021)
+    ]
+    assert rows[0]["pct_pacifici"] == 0.1
+
+
+def test_education_state_is_oldest_first(engine):
+    rows = engine.call("fetch_education_state", PARAMS["fetch_education_state"])
+    assert [row["year"] for row in rows] == [2021, 2021, 2022, 2022]
+    assert rows[0]["pct_ba_or_higher"] == 35.0
+
+
+def test_health_rows_join_county_health_rankings(engine):
+    rows = engine.call("fetch_health_county", {"fips_param": "23031"})
+    york = [row for row in rows if row["state"] == "ME"]
+    assert [(row["county"], row["year"], row["premature_death"], row["alcohol_deaths"]) for row in york] == [
+        ("York County", 2022, 9022.0, 0.3), ("York County", 2021, 9021.0, 0.3)
+    ]
+    assert rows[1]["state"] == "US" and rows[1]["pct_uninsured"] == 5.0
+
+
+def test_election_rows_by_year_then_votes(engine):
+    rows = engine.call("fetch_election_county", {"fips": "23031"})
+    assert [(row["year"], row["candidate"], row["candidatevotes"]) for row in rows] == [
+        (2020, "BIDEN", 100), (2020, "TRUMP", 60), (2024, "TRUMP", 95), (2024, "HARRIS", 90), (2024, "OTHER", 5)
+    ]
+
+
+def test_election_state_rows_are_the_county_totals(engine):
+    rows = engine.call("fetch_election_state", {"state_name": " ME "})
+    assert [(row["year"], row["candidate"], row["candidatevotes"]) for row in rows] == [
+        (2020, "BIDEN", 200), (2020, "TRUMP", 120), (2024, "TRUMP", 190), (2024, "HARRIS", 180), (2024, "OTHER", 5)
+    ]
+
+
+def test_batch_rows_are_sorted_by_fips(engine):
+    rows = engine.call("fetch_economy_batch", {"fips_list": ["23031", "00000", "23005", "99999"]})
+    assert [(row["county_fips"], row["year"]) for row in rows] == [
+        ("00000", 2022), ("00000", 2021), ("23005", 2022), ("23005", 2021), ("23031", 2022), ("23031", 2021)
+    ]
+
+
+def test_tables_are_stored_in_key_order(engine):
+    fips = engine.tables["census"].columns["county_fips"]
+    assert list(fips) == sorted(fips)
+    assert "23005000100" not in fips
+    assert engine.tables["census"].slices["23031"] == (6, 8)
+
+
+def test_year_filters(engine):
+    params = {"fips_param": "23031"}
+    assert {row["year"] for row in engine.call("fetch_economy_county", params, years=[2021])} == {2021}
+    assert {row["year"] for row in engine.call("fetch_economy_county", params, since=2022)} == {2022}
+    assert engine.call("fetch_economy_county", params, years=[2021], since=2022) == []
+    assert {row["year"] for row in engine.call("fetch_election_county", {"fips": "23031"}, since=2024)} == {2024}
+
+
+def test_fields_project_rows(engine):
+    rows = engine.call("fetch_economy_county", {"fips_param": "23031"}, fields=["year", "unemployment_rate"], years=[2022])
+    assert rows == [{"year": 2022, "unemployment_rate": 6.1}, {"year": 2022, "unemployment_rate": 3.1}]
+
+
+def test_unknown_columns_are_rejected(engine):
+    with pytest.raises(ValueError, match="column premature_death does not exist"):
+        engine.call("fetch_economy_county", {"fips_param": "23031"}, fields=["year", "premature_death"])
+
+
+def test_unknown_functions_are_rejected(engine):
+    with pytest.raises(ValueError, match="not available"):
+        engine.call("fetch_weather_county", {"fips_param": "23031"})
+
+
+def test_unknown_places_return_only_the_national_rows(engine):
+    assert {row["state"] for row in engine.call("fetch_health_county", {"fips_param": "99999"})} == {"US"}
+    assert engine.call("fetch_election_county", {"fips": "99999"}) == []
+
+
+def test_counties(engine):
+    assert engine.counties() == [
+        {"state": "ME", "county": "Cumberland County", "county_fips": "23005"},
+        {"state": "ME", "county": "York County", "county_fips": "23031"},
+    ]
+
+
+def _versions(cache_dir):
+    return sorted(entry for entry in os.listdir(cache_dir) if entry.startswith("v-"))
+
+
+def test_later_loads_map_the_cached_arrays(data_dir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    LocalEngine(str(data_dir), str(cache_dir)).load()
+    version = _versions(cache_dir)
+
+    engine = LocalEngine(str(data_dir), str(cache_dir)).load()
+    assert _versions(cache_dir) == version
+    assert isinstance(engine.tables["economic"].columns["unemployment_rate"], np.memmap)
+    with open(cache_dir / "current.json") as f:
+        assert json.load(f)["version"] == version[0]
+
+
+def test_changed_csv_rebuilds_and_old_version_stays_readable(data_dir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    old = LocalEngine(str(data_dir), str(cache_dir)).load()
+    old_version = _versions(cache_dir)
+
+    _write_csvs(data_dir, unemployment=9.0)
+    path = data_dir / CSV_FILES["economic"]
+    os.utime(path, (os.stat(path).st_atime, os.stat(path).st_mtime + 10))
+    new = LocalEngine(str(data_dir), str(cache_dir)).load()
+
+    versions = _versions(cache_dir)
+    assert len(versions) == 1 and versions != old_version
+    with open(cache_dir / "current.json") as f:
+        assert json.load(f)["version"] == versions[0]
+    params, filters = {"fips_param": "23031"}, {"fields": ["unemployment_rate"], "years": [2022]}
+    assert new.call("fetch_economy_county", params, **filters)[0] == {"unemployment_rate": 12.0}
+    # The old version's files were deleted, but this engine still has them mapped
+    assert old.call("fetch_economy_county", params, **filters)[0] == {"unemployment_rate": 6.1}
+
+
+def test_module_call_uses_the_shared_engine(engine, monkeypatch):
+    monkeypatch.setitem(local_engine._engine, "engine", engine)
+    assert local_engine.call("fetch_election_state", {"state_name": "ME"}) == engine.call(
+        "fetch_election_state", {"state_name": "ME"}
+    )
@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+from functions import percentiles
+
+
+def _census_frame():
+    # Two states, ME with three counties and NH with one, for one year
+    rows = [
+        ("23", "state", "ME", 2022, 100.0),
+        ("33", "state", "NH", 2022, 300.0),
+        ("23001", "county", "ME", 2022, 10.0),
+        ("23005", "county", "ME", 2022, 30.0),
+        ("23031", "county", "ME", 2022, None),
+        ("33001", "county", "NH", 2022, 20.0),
+    ]
+    return pd.DataFrame(rows, columns=["GEOID", "geography", "state", "year", "total_pop"])
+
+
+@pytest.fixture
+def built(tmp_path, monkeypatch):
+    """Build a percentiles file from tiny CSVs and point the module at it"""
+    frame = _census_frame()
+    frame.to_csv(tmp_path / "census_data.csv", index=False)
+    frame.rename(columns={"total_pop": "gini_index"}).to_csv(tmp_path / "census_economic_data.csv", index=False)
+    path = str(tmp_path / "percentiles.npz")
+    percentiles.build(data_dir=str(tmp_path), path=path)
+    monkeypatch.setattr(percentiles, "PERCENTILES_PATH", path)
+    monkeypatch.setattr(percentiles, "_state", {"tables": None, "mtime": None})
+    return path
+
+
+def test_compute_table_ranks_within_state_and_nationally():
+    table = percentiles.compute_table(_census_frame())
+    rows = dict(zip(table["fips"].tolist(), range(len(table["fips"]))))
+    j = table["metrics"].tolist().index("total_pop")
+
+    # 23005 is the larger of ME's two ranked counties and the largest nationally
+    assert table["state"][rows["23005"], j] == 100
+    assert table["national"][rows["23005"], j] == 100
+    assert table["state"][rows["23001"], j] == 50
+    # States are only ranked nationally, and missing values stay missing
+    assert table["state"][rows["23000"], j] == percentiles.MISSING
+    assert table["national"][rows["33000"], j] == 100
+    assert table["national"][rows["23031"], j] == percentiles.MISSING
+
+
+def test_identifier_columns_are_not_ranked():
+    metrics = percentiles.compute_table(_census_frame())["metrics"].tolist()
+    assert metrics == ["total_pop"]
+
+
+def test_percentiles_for_payload_rows(built):
+    data = {
+        "demographics": [{"state": "ME", "year": 2022, "total_pop": 30.0},
+                         {"state": "US", "year": 2022, "total_pop": 999.0}],
+        "economy": [{"state": "ME", "year": 2022, "gini_index": 30.0}],
+        "civics": [{"year": 2020, "candidatevotes": 5}],
+    }
+    assert percentiles.percentiles_for("23005", data) == {
+        "demographics": {"2022": {"total_pop": {"state": 100, "national": 100}}},
+        "economy": {"2022": {"gini_index": {"state": 100, "national": 100}}},
+    }
+
+
+def test_unranked_places_and_years_are_left_out(built):
+    data = {"demographics": [{"state": "ME", "year": 2015, "total_pop": 1.0}]}
+    assert percentiles.percentiles_for("23005", data) == {}
+    assert percentiles.percentiles_for("99999", {"demographics": [{"year": 2022, "total_pop": 1.0}]}) == {}
+    assert percentiles.percentiles_for(None, data) == {}
+
+
+def test_no_file_means_no_percentiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(percentiles, "PERCENTILES_PATH", str(tmp_path / "missing.npz"))
+    assert percentiles.percentiles_for("23005", {"demographics": [{"year": 2022, "total_pop": 1.0}]}) == {}
@@ -0,0 +1,124 @@
+import pandas as pd
+import pytest
+from database import local_engine, queries
+from database.local_engine import ColumnTable, LocalEngine
+from payloads import build_state_payload, geography_levels, parse_row_filters
+
+
+def test_no_params_means_no_filters():
+    assert parse_row_filters(["health"], {}, ["county"]) == ({}, None)
+
+
+def test_bare_field_applies_to_every_category_that_has_it():
+    filters, error = parse_row_filters(
+        ["health", "economy"], {"fields": "year,health.premature_death,economy.gini_index"}, ["county"]
+    )
+    assert error is None
+    assert filters == {
+        "health": {"fields": ["year", "premature_death"]},
+        "economy": {"fields": ["year", "gini_index"]},
+    }
+
+
+def test_bare_field_skips_categories_without_the_column():
+    filters, error = parse_row_filters(["health", "demographics"], {"fields": "year,pct_uninsured,total_pop"}, ["state"])
+    assert error is None
+    assert filters["health"]["fields"] == ["year", "pct_uninsured"]
+    assert filters["demographics"]["fields"] == ["year", "pct_uninsured", "total_pop"]
+
+
+def test_duplicate_fields_are_dropped():
+    filters, _ = parse_row_filters(["health"], {"fields": "year,health.year,year"}, ["county"])
+    assert filters["health"]["fields"] == ["year"]
+
+
+def test_unknown_bare_field_is_an_error():
+    filters, error = parse_row_filters(["health"], {"fields": "bogus"}, ["county"])
+    assert filters is None
+    assert "Unknown field: bogus" in error
+
+
+def test_unknown_qualified_field_is_an_error():
+    filters, error = parse_row_filters(["health"], {"fields": "health.gini_index"}, ["county"])
+    assert filters is None
+    assert error == "Unknown field: health.gini_index"
+
+
+def test_unknown_category_prefix_is_invalid():
+    _, error = parse_row_filters(["health"], {"fields": "weather.year"}, ["county"])
+    assert error == "Invalid field: weather.year"
+
+
+def test_malformed_column_name_is_invalid():
+    _, error = parse_row_filters(["health"], {"fields": "year;drop"}, ["county"])
+    assert error == "Invalid field: year;drop"
+
+
+def test_category_left_without_fields_is_an_error():
+    _, error = parse_row_filters(["health", "economy"], {"fields": "premature_death"}, ["county"])
+    assert error.startswith("No requested field applies to economy")
+
+
+def test_civics_columns_depend_on_geography_level():
+    assert parse_row_filters(["civics"], {"fields": "county_name"}, ["county"])[1] is None
+    assert parse_row_filters(["civics"], {"fields": "county_name"}, ["state"])[1] is not None
+
+
+def test_batch_levels_only_allow_columns_shared_by_both():
+    levels = geography_levels([{"state": "ME"}, {"state": "ME", "county": "York"}])
+    assert levels == ["county", "state"]
+    assert parse_row_filters(["civics"], {"fields": "county_name"}, levels)[1] is not None
+    assert parse_row_filters(["civics"], {"fields": "candidatevotes"}, levels)[1] is None
+
+
+def test_years_and_since():
+    filters, error = parse_row_filters(["health"], {"years": "2020, 2022", "since": "2018"}, ["county"])
+    assert error is None
+    assert filters == {"health": {"years": [2020, 2022], "since": 2018}}
+
+
+def test_since_zero_is_kept():
+    filters, _ = parse_row_filters(["health"], {"since": "0"}, ["county"])
+    assert filters == {"health": {"since": 0}}
+
+
+def test_non_numeric_years_are_an_error():
+    filters, error = parse_row_filters(["health"], {"years": "2020,last"}, ["county"])
+    assert filters is None
+    assert "whole years" in error
+
+
+@pytest.fixture
+def local_economy(monkeypatch):
+    """DATA_BACKEND=local with an economy table holding Maine's rows and the national ones"""
+    frame = pd.DataFrame({
+        "county_fips": ["23000", "23000", "00000", "00000"],
+        "state": ["ME", "ME", "US", "US"],
+        "county": ["Maine", "Maine", "United States", "United States"],
+        "geography": ["state", "state", "us", "us"],
+        "year": [2022, 2021, 2022, 2021],
+        "unemployment_rate": [3.1, 4.6, 3.6, 5.3],
+    })
+    engine = LocalEngine()
+    engine.tables = {"economic": ColumnTable.from_frame(frame, "county_fips")}
+    queries.invalidate_rpc_cache()
+    monkeypatch.setattr(queries, "DATA_BACKEND", "local")
+    monkeypatch.setattr(queries, "local_engine", local_engine, raising=False)
+    monkeypatch.setitem(local_engine._engine, "engine", engine)
+
+
+def test_projected_rows_keep_the_place_columns(local_economy):
+    filters, error = parse_row_filters(["economy"], {"fields": "year,unemployment_rate", "since": "2022"}, ["state"])
+    assert error is None
+    rows = build_state_payload("ME", ["economy"], filters)["data"]["economy"]
+    assert rows == [
+        {"state": "ME", "county": "Maine", "year": 2022, "unemployment_rate": 3.1},
+        {"state": "US", "county": "United States", "year": 2022, "unemployment_rate": 3.6},
+    ]
+
+
+def test_place_columns_are_added_to_census_projections_only():
+    assert queries._with_place_columns("fetch_health_county", ["year", "county"]) == ["state", "county", "year"]
+    assert queries._with_place_columns("fetch_health_batch", ["year", "county_fips"]) == ["state", "county", "year", "county_fips"]
+    assert queries._with_place_columns("fetch_election_county", ["year"]) == ["year"]
+    assert queries._with_place_columns("fetch_health_state", None) is None
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+import pytest
+from cache import SingleFlight
+
+
+def _run_concurrently(n, target):
+    results = []
+    errors = []
+
+    def run():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    flights = SingleFlight()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return "rows"
+
+    results, errors = _run_concurrently(5, lambda: flights.do(("fetch_health_county", "23005"), fetch))
+    assert results == ["rows"] * 5 and not errors
+    assert len(calls) == 1
+    assert flights.stats() == {"calls": 1, "coalesced": 4}
+
+
+def test_waiters_receive_the_leaders_error():
+    flights = SingleFlight()
+
+    def fetch():
+        time.sleep(0.1)
+        raise RuntimeError("upstream down")
+
+    results, errors = _run_concurrently(3, lambda: flights.do("k", fetch))
+    assert not results
+    assert [str(e) for e in errors] == ["upstream down"] * 3
+
+
+def test_nothing_is_kept_after_the_call():
+    flights = SingleFlight()
+    assert flights.do("k", lambda: 1) == 1
+    assert flights.do("k", lambda: 2) == 2
+    assert flights.stats() == {"calls": 2, "coalesced": 0}
+
+
+def test_different_keys_are_not_joined():
+    flights = SingleFlight()
+    _run_concurrently(2, lambda: flights.do(threading.get_ident(), lambda: time.sleep(0.05) or "x"))
+    assert flights.stats()["coalesced"] == 0
+
+
+def test_do_async_shares_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "rows"
+
+    async def main():
+        return await asyncio.gather(*(flights.do_async("k", fetch) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["rows"] * 4
+    assert len(calls) == 1
+    assert flights.stats() == {"calls": 1, "coalesced": 3}
+
+
+def test_do_async_caller_timeout_does_not_cancel_the_shared_call():
+    flights = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.1)
+        return "rows"
+
+    async def main():
+        impatient = asyncio.wait_for(flights.do_async("k", fetch), 0.01)
+        patient = flights.do_async("k", fetch)
+        return await asyncio.gather(impatient, patient, return_exceptions=True)
+
+    impatient, patient = asyncio.run(main())
+    assert isinstance(impatient, asyncio.TimeoutError)
+    assert patient == "rows"
+
+
+def test_do_async_propagates_errors():
+    flights = SingleFlight()
+
+    async def fetch():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(flights.do_async("k", fetch))
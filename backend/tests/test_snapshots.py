@@ -0,0 +1,162 @@
+import gzip
+import json
+import os
+import subprocess
+import sys
+import pytest
+from werkzeug.http import generate_etag
+from database import queries
+from functions import build_snapshots, snapshot_store
+from payloads import encoded_etag
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATEGORY_RPCS = {"demographics": "total_pop", "health": "pct_uninsured", "education": "pct_ba_or_higher",
+                 "economy": "unemployment_rate"}
+
+
+def _rows(state, county, value):
+    national = {"state": "US", "county": "United States", "year": 2022}
+    return lambda column: [{"state": state, "county": county, "year": 2022, column: value}, dict(national, **{column: 1.0})]
+
+
+@pytest.fixture
+def upstream(postgrest):
+    """Maine and York County, with a row of their own in every category"""
+    state, county = _rows("ME", "Maine", 2.0), _rows("ME", "York County", 3.0)
+    for category, column in CATEGORY_RPCS.items():
+        postgrest.routes[f"fetch_{category}_state"] = state(column)
+        postgrest.routes[f"fetch_{category}_county"] = county(column)
+    postgrest.routes["fetch_election_state"] = [{"state_po": "ME", "year": 2024, "candidate": "A", "candidatevotes": 1}]
+    postgrest.routes["fetch_election_county"] = []
+    postgrest.routes["fetch_counties"] = [{"state": "ME", "county": "York County", "county_fips": "23031"},
+                                          {"state": "VT", "county": "Addison County", "county_fips": "50001"}]
+    return postgrest
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    directory = tmp_path / "snapshots"
+    monkeypatch.setattr(snapshot_store, "SNAPSHOT_DIR", str(directory))
+    monkeypatch.setattr(snapshot_store, "MANIFEST_PATH", str(directory / "manifest.json"))
+    monkeypatch.setitem(snapshot_store._manifest, "mtime", None)
+    monkeypatch.setitem(snapshot_store._manifest, "entries", {})
+    return directory
+
+
+def _manifest(store):
+    with open(store / "manifest.json") as f:
+        return json.load(f)["entries"]
+
+
+def test_build_publishes_every_state_and_county_payload(upstream, store):
+    assert build_snapshots.build(["ME"], workers=2) == 0
+
+    entries = _manifest(store)
+    assert set(entries) == {"state/ME", "county/23031"}
+    entry = entries["county/23031"]
+    assert entry["encodings"] == (["br", "gzip"] if snapshot_store.brotli else ["gzip"])
+
+    body = snapshot_store.read_snapshot("county/23031", entry)
+    assert entry["hash"] == generate_etag(body)
+    assert json.loads(body)["county"] == "York County"
+    assert gzip.decompress(snapshot_store.read_snapshot("county/23031", entry, "gzip")) == body
+
+
+def test_incomplete_payloads_keep_the_previous_snapshot(upstream, store):
+    build_snapshots.build(["ME"])
+    before = _manifest(store)
+
+    upstream.routes["fetch_health_county"] = 500
+    upstream.routes["fetch_economy_state"] = _rows("US", "United States", 1.0)("unemployment_rate")[1:]
+    upstream.routes["fetch_demographics_state"] = _rows("ME", "Maine", 9.0)("total_pop")
+    assert build_snapshots.build(["ME"], refresh=True) == 2
+
+    after = _manifest(store)
+    assert after == before
+    assert snapshot_store.read_snapshot("state/ME", after["state/ME"]) is not None
+
+
+def test_incomplete_reasons():
+    payload = {"errors": {}, "data": {"demographics": [{"county": "Maine"}], "health": [{"county": "Maine"}],
+                                      "education": [{"county": "United States"}], "economy": []}}
+    assert build_snapshots.incomplete(payload) == "no rows for education, economy"
+    assert build_snapshots.incomplete(dict(payload, errors={"health": "timeout"})) == "errors in health"
+
+
+def test_replaced_blobs_are_removed(upstream, store):
+    build_snapshots.build(["ME"])
+    old = _manifest(store)["state/ME"]["hash"]
+    upstream.routes["fetch_health_state"] = _rows("ME", "Maine", 4.0)("pct_uninsured")
+    build_snapshots.build(["ME"], refresh=True)
+    assert _manifest(store)["state/ME"]["hash"] != old
+    assert not [name for name in os.listdir(store / "state") if old in name]
+
+
+def _run_build(upstream, store):
+    env = dict(os.environ, SUPABASE_URL=upstream.url, SNAPSHOT_DIR=str(store))
+    return subprocess.run([sys.executable, "-m", "functions.build_snapshots", "--state", "ME"],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=60)
+
+
+def test_build_exits_with_status_1_when_a_payload_fails(upstream, store):
+    assert _run_build(upstream, store).returncode == 0
+    upstream.routes["fetch_health_state"] = 500
+    result = _run_build(upstream, store)
+    assert result.returncode == 1
+    assert "state/ME failed, keeping the previous snapshot: errors in health" in result.stdout
+
+
+@pytest.fixture
+def built(upstream, store):
+    build_snapshots.build(["ME"])
+    # Served from the snapshot: the live data no longer matches it
+    upstream.routes["fetch_health_state"] = 500
+    queries.invalidate_rpc_cache()
+    return _manifest(store)
+
+
+@pytest.fixture(params=["flask", "asgi"])
+def get(request, flask_client):
+    if request.param == "flask":
+        return lambda url, headers=None: flask_client.get(url, headers=headers or {})
+    asgi_client = request.getfixturevalue("asgi_client")
+    # httpx decodes gzip itself, so ask for exactly what the test names
+    return lambda url, headers=None: asgi_client.get(url, headers={"Accept-Encoding": "identity", **(headers or {})})
+
+
+def _body(response):
+    return response.data if hasattr(response, "data") else response.content
+
+
+def test_snapshot_served_as_json(built, get):
+    entry = built["state/ME"]
+    response = get("/api/state/ME")
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'"{entry["hash"]}"'
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert json.loads(_body(response))["errors"] == {}
+
+
+def test_snapshot_served_gzipped(built, get):
+    entry = built["county/23031"]
+    response = get("/api/county/ME/york county", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == f'"{encoded_etag(entry["hash"], "gzip")}"'
+    if hasattr(response, "data"):
+        assert gzip.decompress(response.data) == snapshot_store.read_snapshot("county/23031", entry)
+
+
+def test_snapshot_revalidates(built, get):
+    etag = f'"{encoded_etag(built["state/ME"]["hash"], "gzip")}"'
+    response = get("/api/state/ME", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert "max-age=86400" in response.headers["Cache-Control"]
+
+
+def test_filtered_requests_are_built_live(built, get):
+    response = get("/api/state/ME?category=health")
+    assert response.headers["Cache-Control"] == "no-store"
+    assert json.loads(_body(response))["errors"] == {"health": "fetch_health_state failed"}
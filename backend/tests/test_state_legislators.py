@@ -0,0 +1,65 @@
+import csv
+import pytest
+from functions import state_legislators
+from functions.state_legislators import district_key, load_state_legislators
+
+FIELDS = ["id", "name", "current_party", "current_district", "current_chamber",
+          "email", "image", "links", "capitol_voice", "district_voice"]
+
+
+def _write(path, *rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: row.get(field, "") for field in FIELDS})
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    _write(tmp_path / "me.csv",
+           {"id": "ocd-person/1", "name": "Rep One", "current_party": "Democratic", "current_district": "118",
+            "current_chamber": "lower", "email": "one@example.org", "links": "https://one.example;https://x.example",
+            "district_voice": "207-555-0101"},
+           {"id": "ocd-person/2", "name": "Sen Two", "current_party": "Republican", "current_district": "27",
+            "current_chamber": "upper", "capitol_voice": "207-555-0102", "image": "https://img.example/2.jpg"})
+    _write(tmp_path / "ne.csv",
+           {"id": "ocd-person/3", "name": "Sen Three", "current_party": "Nonpartisan", "current_district": "5",
+            "current_chamber": "legislature"})
+    index = load_state_legislators(str(tmp_path))
+    monkeypatch.setitem(state_legislators._state, "index", index)
+    monkeypatch.setitem(state_legislators._state, "states", frozenset({"ME", "NE"}))
+    return index
+
+
+@pytest.mark.parametrize("raw, key", [("001", "1"), ("1", "1"), ("000", "0"), (" Grafton 3 ", "GRAFTON 3"), (None, "")])
+def test_district_key(raw, key):
+    assert district_key(raw) == key
+
+
+def test_members_match_boundary_codes(index):
+    assert state_legislators.members_for("me", "state_house", "118", "State House District 118") == [{
+        "name": "Rep One", "role": "rep", "party": "Democratic", "openstates_id": "ocd-person/1",
+        "photo_url": None, "phone": "207-555-0101", "email": "one@example.org",
+        "website": "https://one.example", "district": "State House District 118"
+    }]
+    senate = state_legislators.members_for("ME", "state_senate", "027")
+    assert [(m["name"], m["role"], m["phone"], m["photo_url"]) for m in senate] == [
+        ("Sen Two", "sen", "207-555-0102", "https://img.example/2.jpg")
+    ]
+
+
+def test_unicameral_members_are_upper_house(index):
+    assert [m["name"] for m in state_legislators.members_for("NE", "state_senate", "005")] == ["Sen Three"]
+
+
+def test_unknown_districts_and_states(index):
+    assert state_legislators.members_for("ME", "state_house", "119") == []
+    assert state_legislators.members_for("ME", "state_house", None) == []
+    assert state_legislators.members_for("VT", "state_house", "1") == []
+    assert state_legislators.has_state("me") and not state_legislators.has_state("VT")
+
+
+def test_nothing_loaded(monkeypatch):
+    monkeypatch.setitem(state_legislators._state, "index", None)
+    assert state_legislators.members_for("ME", "state_house", "118") == []
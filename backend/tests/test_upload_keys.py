@@ -0,0 +1,78 @@
+import os
+import re
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(BACKEND_DIR), "data_processing", "scripts"))
+import upload_to_supabase as upload  # noqa: E402
+
+SQL_PATH = os.path.join(BACKEND_DIR, "database", "database_sql_functions.sql")
+
+
+def _unique_indexes():
+    """table -> key columns of each "<table>_natural_key" unique index in the SQL file"""
+    with open(SQL_PATH) as f:
+        sql = f.read()
+    indexes = re.findall(r"create unique index (?:if not exists )?(\w+)_natural_key\s+on \w+ \(([^)]*)\)", sql)
+    return {table: [column.strip().strip('"') for column in columns.split(",")] for table, columns in indexes}
+
+
+def test_natural_keys_match_the_unique_indexes():
+    # PostgREST's on_conflict needs a unique index on exactly these columns
+    assert _unique_indexes() == upload.NATURAL_KEYS
+
+
+def test_row_key_ignores_the_dtype_a_chunk_was_read_as():
+    key_columns = ["GEOID", "geography", "year"]
+    as_float = {"GEOID": "23005", "geography": "county", "year": 2022.0}
+    as_numpy = {"GEOID": "23005", "geography": "county", "year": np.int64(2022)}
+    as_int = {"GEOID": "23005", "geography": "county", "year": 2022, "total_pop": 1}
+    assert upload.row_key(as_float, key_columns) == upload.row_key(as_numpy, key_columns) == upload.row_key(as_int, key_columns)
+
+
+def test_row_key_keeps_geography_levels_apart():
+    key_columns = upload.NATURAL_KEYS["census_data"]
+    state = {"GEOID": "23", "geography": "state", "year": 2022}
+    district = {"GEOID": "23", "geography": "congressional district", "year": 2022}
+    assert upload.row_key(state, key_columns) != upload.row_key(district, key_columns)
+
+
+def test_row_hash_changes_with_any_value():
+    row = {"GEOID": "23005", "year": 2022, "total_pop": 1.0}
+    assert upload.row_hash(row) == upload.row_hash({**row, "total_pop": 1})
+    assert upload.row_hash(row) != upload.row_hash({**row, "total_pop": 2})
+
+
+def _write_census(tmp_path, rows):
+    path = tmp_path / "census_data.csv"
+    pd.DataFrame(rows, columns=["GEOID", "geography", "state", "year", "total_pop"]).to_csv(path, index=False)
+    return str(path)
+
+
+def test_check_natural_keys_accepts_unique_rows(tmp_path):
+    path = _write_census(tmp_path, [
+        ("23", "state", "ME", 2022, 1),
+        ("23005", "county", "ME", 2022, 2),
+        ("23005", "county", "ME", 2021, 3),
+    ])
+    assert len(upload.check_natural_keys(path, "census_data", batch_size=2)) == 3
+
+
+def test_check_natural_keys_rejects_duplicates_across_batches(tmp_path):
+    path = _write_census(tmp_path, [
+        ("23005", "county", "ME", 2022, 2),
+        ("23031", "county", "ME", 2022, 3),
+        ("23005", "county", "ME", 2022, 4),
+    ])
+    with pytest.raises(ValueError, match="1 duplicate natural keys"):
+        upload.check_natural_keys(path, "census_data", batch_size=2)
+
+
+def test_check_natural_keys_requires_the_key_columns(tmp_path):
+    path = tmp_path / "census_data.csv"
+    pd.DataFrame([("23005", 2022, 1)], columns=["GEOID", "year", "total_pop"]).to_csv(path, index=False)
+    with pytest.raises(ValueError, match="no geography column"):
+        upload.check_natural_keys(str(path), "census_data")
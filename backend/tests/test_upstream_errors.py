@@ -0,0 +1,65 @@
+"""
+Upstream failures must reach the payload's errors (which makes the response
+partial and no-store) rather than turning into empty data. The postgrest
+fixture (conftest.py) stands in for Supabase.
+"""
+import asyncio
+import pytest
+from database import queries
+from payloads import build_state_payload
+
+HEALTH_ROWS = [{"state": "ME", "county": "Maine", "year": 2022, "pct_uninsured": 7.1}]
+
+
+def test_failed_category_is_reported_not_empty(postgrest):
+    postgrest.routes["fetch_health_state"] = HEALTH_ROWS
+    postgrest.routes["fetch_economy_state"] = 500
+
+    payload = build_state_payload("ME", ["health", "economy"])
+    assert payload["data"] == {"health": HEALTH_ROWS, "economy": []}
+    assert payload["errors"] == {"economy": "fetch_economy_state failed"}
+
+
+def test_failures_are_not_cached(postgrest):
+    postgrest.routes["fetch_health_state"] = 503
+    assert build_state_payload("ME", ["health"])["errors"] == {"health": "fetch_health_state failed"}
+
+    postgrest.routes["fetch_health_state"] = HEALTH_ROWS
+    payload = build_state_payload("ME", ["health"])
+    assert payload["errors"] == {}
+    assert payload["data"]["health"] == HEALTH_ROWS
+
+
+def test_unreachable_upstream_fails_every_category(monkeypatch):
+    # conftest points Supabase at a closed port
+    queries.invalidate_rpc_cache()
+    payload = build_state_payload("ME", ["health", "demographics"])
+    assert set(payload["errors"]) == {"health", "demographics"}
+    assert payload["data"] == {"health": [], "demographics": []}
+
+
+def test_truncated_result_is_an_error(postgrest):
+    postgrest.routes["fetch_health_state"] = HEALTH_ROWS * queries.POSTGREST_MAX_ROWS
+    payload = build_state_payload("ME", ["health"])
+    assert payload["errors"] == {"health": "fetch_health_state failed"}
+
+
+def test_batch_calls_page_past_the_row_limit(postgrest):
+    rows = [{"county_fips": f"{23001 + i % 8:05d}", "year": 2000 + i // 8} for i in range(2500)]
+    postgrest.routes["fetch_health_batch"] = rows
+    grouped = queries.fetch_category_batch("health", ["23001"])
+    assert sum(len(group) for group in grouped.values()) == 2500
+    offsets = [int(query.get("offset", 0)) for function, query in postgrest.calls if function == "fetch_health_batch"]
+    assert offsets == [0, 1000, 2000]
+
+
+def test_county_lookup_failure_raises(postgrest):
+    postgrest.routes["fetch_counties"] = 500
+    with pytest.raises(queries.RPCError):
+        queries.resolve_county_fips("ME", "York")
+
+
+def test_async_rpc_failure_raises(postgrest):
+    postgrest.routes["fetch_health_state"] = 500
+    with pytest.raises(queries.RPCError):
+        asyncio.run(queries.fetch_state_category_async("health", "ME", "Maine"))
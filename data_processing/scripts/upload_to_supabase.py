@@ -1,66 +1,371 @@
 import pandas as pd
 from supabase import create_client
 import os
+import sys
 from dotenv import load_dotenv
 import numpy as np
 import json
+import hashlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 load_dotenv('../backend/.env')
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from constants import STATE_FIPS
+
+# refresh_election_results_by_state() is only granted to service_role, so uploads use the service key
 supabase = create_client(
     os.getenv("SUPABASE_URL"),
-    os.getenv("SUPABASE_KEY")
+    os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_KEY")
 )
 
-def upload_csv_in_batches(csv_path, table_name, batch_size=1000):
-    # Read CSV
-    df = pd.read_csv(csv_path, na_values=['', ' ', 'NA', 'N/A', 'null'])
-    
-    print(f"\nOriginal shape: {df.shape}")
-    print(f"Null counts:\n{df.isnull().sum()}\n")
-    
-    # CRITICAL: Fill NaN BEFORE converting to dict
-    # Option 1: Replace all NaN with None
-    df = df.replace({np.nan: None})
-    
-    # Option 2: Or use fillna (choose one approach)
-    # df = df.fillna(value=np.nan).replace({np.nan: None})
-    
-    # Verify NaN are gone
-    print(f"NaN remaining after cleaning: {df.isnull().sum().sum()}")
-    
-    # Convert to records
-    records = df.to_dict('records')
-    
-    # Debug first record
-    print("\nFirst record sample:")
-    print(json.dumps(records[0], indent=2, default=str))
-    
-    total_rows = len(records)
-    successful = 0
-    failed = 0
-    
-    for i in range(0, total_rows, batch_size):
-        batch = records[i:i + batch_size]
-        batch_num = i//batch_size + 1
-        
+# Natural key of each table, used as the on_conflict target for upserts.
+# Each needs a matching unique index (see backend/database/database_sql_functions.sql).
+NATURAL_KEYS = {
+    # The census CSVs identify places by GEOID; it's only unique within a geography level
+    "census_data": ["GEOID", "geography", "year"],
+    "census_economic_data": ["GEOID", "geography", "year"],
+    "county_health_ratings_trends": ["state", "county", "year_numeric"],
+    "election_results_by_county": ["year", "state_po", "county_name", "mode", "party", "candidate"]
+}
+
+# Tables that get a canonical 5-digit county_fips column at upload time.
+# State rows use the state FIPS + "000" and the national row "00000".
+COUNTY_FIPS_TABLES = ["census_data", "census_economic_data", "county_health_ratings_trends", "election_results_by_county"]
+US_FIPS = "00000"
+
+# Rollups rebuilt (via RPC) after rows are uploaded to their source table
+REFRESH_AFTER_UPLOAD = {
+    "election_results_by_county": ["refresh_election_results_by_state"]
+}
+
+# Content hash of every row last upserted, per table and natural key
+HASH_STORE_PATH = os.getenv("UPLOAD_HASH_STORE", "./cleaned_data/upload_hashes.sqlite3")
+
+def _checkpoint_path(csv_path, table_name):
+    return f"{csv_path}.{table_name}.checkpoint.json"
+
+def load_checkpoint(csv_path, table_name, batch_size):
+    """
+    Batch numbers already uploaded by a previous run of the same CSV/table.
+    Starts fresh if the CSV changed or the batch size differs.
+    """
+    stat = os.stat(csv_path)
+    fingerprint = {"csv_size": stat.st_size, "csv_mtime": stat.st_mtime, "batch_size": batch_size}
+    try:
+        with open(_checkpoint_path(csv_path, table_name)) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        checkpoint = {}
+
+    if {k: checkpoint.get(k) for k in fingerprint} != fingerprint:
+        checkpoint = {**fingerprint, "done": []}
+    return checkpoint
+
+def save_checkpoint(csv_path, table_name, checkpoint):
+    path = _checkpoint_path(csv_path, table_name)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(f"{path}.tmp", path)
+
+def refresh_rollups(table_name):
+    """Rebuild the rollups derived from table_name so they match the uploaded rows"""
+    for function_name in REFRESH_AFTER_UPLOAD.get(table_name, []):
+        started = time.monotonic()
         try:
-            response = supabase.table(table_name).insert(batch).execute()
-            successful += len(batch)
-            print(f"✓ Batch {batch_num}: {len(batch)} rows")
+            supabase.rpc(function_name).execute()
+            print(f"✓ {function_name} ({time.monotonic() - started:.1f}s)")
         except Exception as e:
-            failed += len(batch)
+            print(f"✗ {function_name} failed: {e}")
+
+def _submit_batches(executor, batches, upload_batch, workers):
+    """Hand (batch_num, batch) pairs to upload_batch, keeping at most two batches per worker in memory"""
+    in_flight = set()
+    for batch_num, batch in batches:
+        if len(in_flight) >= workers * 2:
+            _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        in_flight.add(executor.submit(upload_batch, batch_num, batch))
+    wait(in_flight)
+
+def _fips(value, width):
+    """Zero-padded FIPS string from a code pandas may have read as a number"""
+    if value is None:
+        return None
+    return str(int(float(value))).zfill(width)
+
+def _census_fips(record):
+    """census_data / census_economic_data: rows are tagged with the ACS geography they came from"""
+    geography = record.get("geography")
+    if geography == "us":
+        return US_FIPS
+    if geography == "state":
+        state_fips = STATE_FIPS.get(record.get("state")) or _fips(record.get("GEOID"), 2)
+        return state_fips and state_fips + "000"
+    if geography == "county":
+        return _fips(record.get("GEOID"), 5)
+    return None  # congressional districts aren't counties
+
+def _health_fips(record):
+    """county_health_ratings_trends: CHR statecode + countycode, with countycode 0 for state rows"""
+    if record.get("state") == "US":
+        return US_FIPS
+    state_fips = STATE_FIPS.get(record.get("state")) or _fips(record.get("statecode"), 2)
+    county_code = _fips(record.get("countycode"), 3)
+    return state_fips and county_code and state_fips + county_code
+
+def _election_fips_builder(csv_path):
+    """
+    election_results_by_county: MIT's county_fips, padded back to 5 digits.
+
+    Rows election_data_cleaning.R re-aggregated by party lost their county_fips,
+    so fill those from another row of the same county in the file.
+    """
+    known = {}
+    columns = pd.read_csv(csv_path, usecols=["state_po", "county_name", "county_fips"], dtype={"county_fips": "float"})
+    for row in columns.dropna().drop_duplicates(["state_po", "county_name"]).itertuples(index=False):
+        known[(row.state_po, row.county_name)] = _fips(row.county_fips, 5)
+
+    def build(record):
+        return _fips(record.get("county_fips"), 5) or known.get((record.get("state_po"), record.get("county_name")))
+    return build
+
+def county_fips_builder(csv_path, table_name):
+    """Return a function computing a record's county_fips, or None if the table doesn't have one"""
+    if table_name not in COUNTY_FIPS_TABLES:
+        return None
+    if table_name == "election_results_by_county":
+        return _election_fips_builder(csv_path)
+    if table_name == "county_health_ratings_trends":
+        return _health_fips
+    return _census_fips
+
+def read_records(csv_path, batch_size, table_name=None):
+    """Yield the CSV as lists of up to batch_size record dicts, with NaN as None and county_fips filled in"""
+    build_fips = county_fips_builder(csv_path, table_name)
+    chunks = pd.read_csv(csv_path, na_values=['', ' ', 'NA', 'N/A', 'null'], chunksize=batch_size)
+    for chunk in chunks:
+        # CRITICAL: Fill NaN BEFORE converting to dict
+        chunk = chunk.replace({np.nan: None})
+        records = chunk.to_dict('records')
+        if build_fips:
+            for record in records:
+                record["county_fips"] = build_fips(record)
+        yield records
+
+def upload_csv_in_batches(csv_path, table_name, batch_size=1000, workers=4, resume=True):
+    """
+    Stream a CSV into a Supabase table in batches.
+
+    The CSV is read batch_size rows at a time, so memory scales with the batch
+    size rather than the file. Batches are inserted by `workers` concurrent
+    threads. Finished batch numbers are saved to a checkpoint file next to the
+    CSV, so rerunning after a failure uploads only the batches that didn't
+    make it. The checkpoint is removed once every batch succeeds.
+    """
+    checkpoint = load_checkpoint(csv_path, table_name, batch_size)
+    if not resume:
+        checkpoint["done"] = []
+    done = set(checkpoint["done"])
+    if done:
+        print(f"Resuming: {len(done)} batches already uploaded")
+
+    lock = threading.Lock()
+    stats = {"successful": 0, "failed": 0, "skipped": 0}
+    started = time.monotonic()
+
+    def upload_batch(batch_num, batch):
+        try:
+            supabase.table(table_name).insert(batch).execute()
+        except Exception as e:
+            with lock:
+                stats["failed"] += len(batch)
             print(f"✗ Batch {batch_num} failed: {e}")
-            
-            # Show problematic record
+            print("\nFirst record in failed batch:")
+            print(json.dumps(batch[0], indent=2, default=str))
+            return
+
+        with lock:
+            stats["successful"] += len(batch)
+            checkpoint["done"].append(batch_num)
+            save_checkpoint(csv_path, table_name, checkpoint)
+            rate = stats["successful"] / (time.monotonic() - started)
+        print(f"✓ Batch {batch_num}: {len(batch)} rows ({rate:,.0f} rows/sec)")
+
+    def batches():
+        for batch_num, batch in enumerate(read_records(csv_path, batch_size, table_name), start=1):
+            if batch_num in done:
+                stats["skipped"] += len(batch)
+                continue
+
             if batch_num == 1:
-                print("\nFirst record in failed batch:")
+                print("\nFirst record sample:")
                 print(json.dumps(batch[0], indent=2, default=str))
-            
+            yield batch_num, batch
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        _submit_batches(executor, batches(), upload_batch, workers)
+
+    elapsed = time.monotonic() - started
+    total_rows = stats["successful"] + stats["failed"] + stats["skipped"]
     print(f"\n{'='*60}")
-    print(f"Total: {total_rows} | Success: {successful} | Failed: {failed}")
+    print(f"Total: {total_rows} | Success: {stats['successful']} | Failed: {stats['failed']} | Skipped (already uploaded): {stats['skipped']}")
+    print(f"{elapsed:.1f}s | {stats['successful'] / elapsed if elapsed else 0:,.0f} rows/sec")
     print(f"{'='*60}")
 
+    if stats["successful"]:
+        refresh_rollups(table_name)
+
+    if not stats["failed"]:
+        try:
+            os.remove(_checkpoint_path(csv_path, table_name))
+        except OSError:
+            pass
+    else:
+        print("Rerun to retry the failed batches")
+
+
+def _plain(value):
+    """Normalize a cell so the same value hashes the same whatever dtype its chunk was read as"""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return value
+
+def row_key(record, key_columns):
+    return json.dumps([_plain(record[column]) for column in key_columns], default=str)
+
+def row_hash(record):
+    row = {column: _plain(value) for column, value in record.items()}
+    return hashlib.sha256(json.dumps(row, sort_keys=True, default=str).encode()).hexdigest()
+
+def open_hash_store(path=HASH_STORE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("""
+        create table if not exists row_hashes (
+          table_name text not null,
+          key text not null,
+          hash text not null,
+          primary key (table_name, key)
+        )
+    """)
+    return conn
+
+def check_natural_keys(csv_path, table_name, batch_size=1000):
+    """
+    Read the whole CSV and check every row has a unique natural key, before anything is uploaded.
+
+    Returns:
+        Set of row keys (see row_key)
+
+    Raises:
+        ValueError: A key column is missing from the CSV, or keys repeat
+    """
+    key_columns = NATURAL_KEYS[table_name]
+    seen = set()
+    duplicates = []
+    for records in read_records(csv_path, batch_size, table_name):
+        missing = [column for column in key_columns if records and column not in records[0]]
+        if missing:
+            raise ValueError(f"{csv_path} has no {', '.join(missing)} column for the {table_name} natural key")
+        for record in records:
+            key = row_key(record, key_columns)
+            if key in seen:
+                duplicates.append(key)
+            seen.add(key)
+    if duplicates:
+        shown = ", ".join(duplicates[:5])
+        raise ValueError(f"{len(duplicates)} duplicate natural keys ({','.join(key_columns)}) in {csv_path}, e.g. {shown}")
+    return seen
+
+def upsert_csv_changes(csv_path, table_name, batch_size=1000, workers=4, full=False):
+    """
+    Upsert only the CSV rows that are new or changed since the last upload.
+
+    Each row is identified by the table's natural key (NATURAL_KEYS) and
+    compared against the content hash stored for that key in the local hash
+    store. Changed rows are upserted with on_conflict on the natural key, so
+    reloading a dataset never duplicates rows and a refresh costs only the
+    delta. Hashes are saved per successful batch, so rerunning after a
+    failure resends just the rows that didn't make it.
+
+    Rows removed from the CSV are reported but not deleted from the table.
+    The CSV's keys are checked first (check_natural_keys), so a file with
+    duplicate or missing keys fails before any batch is sent.
+
+    Args:
+        full: Ignore stored hashes and upsert every row (e.g. after the table was truncated)
+    """
+    key_columns = NATURAL_KEYS[table_name]
+    on_conflict = ",".join(key_columns)
+    seen = check_natural_keys(csv_path, table_name, batch_size)
+    store = open_hash_store()
+    stored = dict(store.execute("select key, hash from row_hashes where table_name = ?", (table_name,)))
+    print(f"{len(stored)} stored row hashes for {table_name}")
+
+    lock = threading.Lock()
+    stats = {"successful": 0, "failed": 0, "unchanged": 0}
+    started = time.monotonic()
+
+    def upload_batch(batch_num, batch):
+        records = [record for _, _, record in batch]
+        try:
+            supabase.table(table_name).upsert(records, on_conflict=on_conflict).execute()
+        except Exception as e:
+            with lock:
+                stats["failed"] += len(batch)
+            print(f"✗ Batch {batch_num} failed: {e}")
+            print("\nFirst record in failed batch:")
+            print(json.dumps(records[0], indent=2, default=str))
+            return
+
+        with lock:
+            with store:
+                store.executemany("insert or replace into row_hashes values (?, ?, ?)",
+                                  [(table_name, key, digest) for key, digest, _ in batch])
+            stats["successful"] += len(batch)
+            rate = stats["successful"] / (time.monotonic() - started)
+        print(f"✓ Batch {batch_num}: {len(batch)} rows ({rate:,.0f} rows/sec)")
+
+    def changed_batches():
+        pending = []
+        batch_num = 0
+        for records in read_records(csv_path, batch_size, table_name):
+            for record in records:
+                key = row_key(record, key_columns)
+                digest = row_hash(record)
+                if not full and stored.get(key) == digest:
+                    stats["unchanged"] += 1
+                    continue
+                pending.append((key, digest, record))
+
+                if len(pending) == batch_size:
+                    batch_num += 1
+                    yield batch_num, pending
+                    pending = []
+        if pending:
+            yield batch_num + 1, pending
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        _submit_batches(executor, changed_batches(), upload_batch, workers)
+
+    removed = len(stored.keys() - seen)
+    elapsed = time.monotonic() - started
+    print(f"\n{'='*60}")
+    print(f"Total: {len(seen)} | Upserted: {stats['successful']} | Failed: {stats['failed']} | Unchanged: {stats['unchanged']}")
+    if removed:
+        print(f"{removed} previously uploaded keys are no longer in the CSV (left in {table_name})")
+    print(f"{elapsed:.1f}s | {stats['successful'] / elapsed if elapsed else 0:,.0f} rows/sec")
+    print(f"{'='*60}")
+    if stats["successful"]:
+        refresh_rollups(table_name)
+    if stats["failed"]:
+        print("Rerun to retry the failed rows")
+    store.close()
 
 
 if __name__ == "__main__":
@@ -70,8 +375,16 @@ if __name__ == "__main__":
     #     batch_size=1000
     # )
 
-    upload_csv_in_batches(
+    # upload_csv_in_batches(
+    #     csv_path="./cleaned_data/cleaned_countypres_2000-2024.csv",
+    #     table_name="election_results_by_county",
+    #     batch_size=1000,
+    #     workers=4
+    # )
+
+    upsert_csv_changes(
         csv_path="./cleaned_data/cleaned_countypres_2000-2024.csv",
         table_name="election_results_by_county",
-        batch_size=1000
+        batch_size=1000,
+        workers=4
     )
\ No newline at end of file
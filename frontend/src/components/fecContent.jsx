@@ -76,42 +76,12 @@ export default function FECContent({ member, fecCache, setFecCache }) {
     setHasFecData(true);
 
     try {
-      // Get FEC IDs for this member
-      const idResp = await fetch(`${API_BASE}/api/member/${member.bio_id}`);
-      const idData = await idResp.json();
-
-      if (!idData.length) {
-        const noDataCache = {
-          hasFecData: false,
-          aggregatedData: null,
-          topState: null,
-          contributors: [],
-          dataState: null
-        };
-        
-        setFecCache(prev => ({
-          ...prev,
-          [member.bio_id]: noDataCache
-        }));
-
-        setHasFecData(false);
-        setAggregatedData(null);
-        setTopState(null);
-        setContributors([]);
-        setLoading(false);
-        return;
-      }
-
-      // Finance totals and contribution breakdown
-      const resp = await fetch(`${API_BASE}/api/member/fec_totals`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ fec_ids: idData }),
-      });
+      // Totals, top states and top contributors in one request
+      const resp = await fetch(`${API_BASE}/api/member/${member.bio_id}/finance`);
       const data = await resp.json();
-      const agg = data.aggregated || {};
+      const agg = data.totals?.aggregated || {};
 
-      if (!agg.receipts || agg.receipts === 0) {
+      if (!data.fec_ids?.length || !agg.receipts || agg.receipts === 0) {
         const noDataCache = {
           hasFecData: false,
           aggregatedData: null,
@@ -134,22 +104,11 @@ export default function FECContent({ member, fecCache, setFecCache }) {
       }
 
       // Top State Contributors
-      const respState = await fetch(`${API_BASE}/api/member/fec_state_top5`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ fec_ids: idData }),
-      });
-      const dataState = await respState.json();
+      const dataState = data.state_totals || {};
       const topStateValue = dataState.state_totals?.[0]?.state || null;
 
       // Top individual contributors
-      const respCont = await fetch(`${API_BASE}/api/member/top_contributors`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ fec_ids: idData }),
-      });
-      const dataCont = await respCont.json();
-      const contributorsData = dataCont.top_contributors || [];
+      const contributorsData = data.top_contributors?.top_contributors || [];
 
       // Cache all results
       setFecCache(prev => ({
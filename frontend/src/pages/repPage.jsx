@@ -26,6 +26,8 @@ export default function RepresentativesPage({ locationData }) {
     const houseReps = fedMembers.filter(m => m.role === "rep");
     const stateHouse = locationData.state_house_legislators || [];
     const stateSenate = locationData.state_senate_legislators || [];
+    // Offline reverse lookups have no state legislator contacts when Open States data isn't loaded
+    const stateAvailable = locationData.state_legislators_available !== false;
 
     const handleRepClick = (rep) => {
         setSelectedRep(rep);
@@ -112,7 +114,13 @@ export default function RepresentativesPage({ locationData }) {
                         ))}
                     </div>
 
-                    {(stateSenate.length === 0 && stateHouse.length === 0) && (
+                    {!stateAvailable && (
+                        <div className="text-center py-8 text-gray-500">
+                            State legislator details are unavailable for this location
+                        </div>
+                    )}
+
+                    {(stateAvailable && stateSenate.length === 0 && stateHouse.length === 0) && (
                         <div className="text-center py-8 text-gray-500">
                             No state legislators found for this location
                         </div>